@@ -0,0 +1,277 @@
+"""In-process catalog replica with an inverted index for ``/search``.
+
+The replica is built by paging through ``/catalog/items`` and kept fresh by a
+background loop that replays the same walk with the stored per-page ETag and
+Last-Modified validators, so unchanged pages come back as cheap ``304``s and
+only changed pages are re-indexed. Items that disappear from a completed walk
+are dropped.
+
+Queries are tokenized the same way as item names and brands. Every query term
+must match a token exactly or as a prefix; matches in the name weigh more than
+matches in the brand, and exact matches more than prefix ones. Scores are
+normalized to ``(0, 1]`` so they rank alongside other sources in the merge.
+"""
+import asyncio
+import bisect
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from config import Settings
+from http_client import request_with_retry
+
+logger = logging.getLogger(__name__)
+
+FIELD_WEIGHTS = {"name": 2.0, "brand": 1.0}
+PREFIX_FACTOR = 0.5
+LOCAL_TOKEN_PREFIX = "idx:"
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: Any) -> List[str]:
+    if not isinstance(text, str):
+        return []
+    return _TOKEN.findall(text.casefold())
+
+
+@dataclass
+class _PageState:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    ids: List[str]
+    next_token: Optional[str]
+
+
+@dataclass
+class CatalogIndex:
+    """Inverted index over catalog items, keyed by item id."""
+
+    items: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    postings: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    vocabulary: List[str] = field(default_factory=list)
+    version: int = 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def upsert(self, item: Dict[str, Any]) -> None:
+        item_id = item.get("id")
+        if not item_id:
+            return
+        item_id = str(item_id)
+        if self.items.get(item_id) == item:
+            return
+        self._unindex(item_id)
+        self.items[item_id] = item
+        for name, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(item.get(name)):
+                docs = self.postings.get(token)
+                if docs is None:
+                    docs = self.postings[token] = {}
+                    bisect.insort(self.vocabulary, token)
+                docs[item_id] = max(docs.get(item_id, 0.0), weight)
+        self.version += 1
+
+    def remove(self, item_id: str) -> None:
+        if item_id in self.items:
+            self._unindex(item_id)
+            del self.items[item_id]
+            self.version += 1
+
+    def search(self, q: str) -> List[Tuple[float, Dict[str, Any]]]:
+        terms = tokenize(q)
+        if not terms:
+            return []
+        scores: Optional[Dict[str, float]] = None
+        for term in terms:
+            matched = self._match(term)
+            if scores is None:
+                scores = matched
+            else:
+                scores = {
+                    item_id: score + matched[item_id]
+                    for item_id, score in scores.items()
+                    if item_id in matched
+                }
+            if not scores:
+                return []
+        best = len(terms) * max(FIELD_WEIGHTS.values())
+        ranked = sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))
+        return [(round(score / best, 4), self.items[item_id]) for item_id, score in ranked]
+
+    def _match(self, term: str) -> Dict[str, float]:
+        matched: Dict[str, float] = {}
+        start = bisect.bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            factor = 1.0 if token == term else PREFIX_FACTOR
+            for item_id, weight in self.postings[token].items():
+                matched[item_id] = max(matched.get(item_id, 0.0), weight * factor)
+        return matched
+
+    def _unindex(self, item_id: str) -> None:
+        previous = self.items.get(item_id)
+        if previous is None:
+            return
+        for name in FIELD_WEIGHTS:
+            for token in tokenize(previous.get(name)):
+                docs = self.postings.get(token)
+                if docs is None:
+                    continue
+                docs.pop(item_id, None)
+                if not docs:
+                    del self.postings[token]
+                    index = bisect.bisect_left(self.vocabulary, token)
+                    if index < len(self.vocabulary) and self.vocabulary[index] == token:
+                        del self.vocabulary[index]
+
+
+class CatalogReplica:
+    """Catalog index plus the sync state that keeps it current."""
+
+    def __init__(
+        self,
+        *,
+        base_url: str,
+        page_size: int,
+        retries: int,
+        sync_interval: float,
+        max_staleness: float,
+    ) -> None:
+        self.url = f"{base_url}/catalog/items"
+        self.page_size = page_size
+        self.retries = retries
+        self.sync_interval = sync_interval
+        self.max_staleness = max_staleness
+        self.index = CatalogIndex()
+        self._pages: Dict[str, _PageState] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.synced_at: Optional[float] = None
+        self.syncs = 0
+        self.sync_failures = 0
+        self.pages_fetched = 0
+        self.pages_not_modified = 0
+        self.last_error: Optional[str] = None
+        self.local_queries = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "CatalogReplica":
+        return cls(
+            base_url=settings.catalog_svc_base,
+            page_size=settings.catalog_index_page_size,
+            retries=settings.http_retries,
+            sync_interval=settings.catalog_index_sync_seconds,
+            max_staleness=settings.catalog_index_max_staleness_seconds,
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self.synced_at is not None
+
+    def is_fresh(self) -> bool:
+        return self.ready and time.monotonic() - self.synced_at <= self.max_staleness
+
+    def etag(self) -> str:
+        return f'"catalog-index-{self.index.version}"'
+
+    def search(self, q: str) -> List[Tuple[float, Dict[str, Any]]]:
+        self.local_queries += 1
+        return self.index.search(q)
+
+    async def sync(self, client: httpx.AsyncClient) -> None:
+        """Walk every catalog page once, re-indexing only pages that changed."""
+
+        seen: Set[str] = set()
+        pages: Dict[str, _PageState] = {}
+        token: Optional[str] = None
+        while True:
+            key = token or ""
+            previous = self._pages.get(key)
+            params: Dict[str, Any] = {"pageSize": self.page_size}
+            if token:
+                params["pageToken"] = token
+            headers = {}
+            if previous is not None and previous.etag:
+                headers["If-None-Match"] = previous.etag
+            if previous is not None and previous.last_modified:
+                headers["If-Modified-Since"] = previous.last_modified
+            upstream = await request_with_retry(
+                client, "GET", self.url, params=params, headers=headers, retries=self.retries
+            )
+            if upstream.status_code == 304 and previous is not None:
+                self.pages_not_modified += 1
+                state = previous
+            else:
+                upstream.raise_for_status()
+                self.pages_fetched += 1
+                body = upstream.json()
+                rows = body.get("items", [])
+                for row in rows:
+                    self.index.upsert(row)
+                state = _PageState(
+                    etag=upstream.headers.get("etag"),
+                    last_modified=upstream.headers.get("last-modified"),
+                    ids=[str(row["id"]) for row in rows if row.get("id")],
+                    next_token=body.get("nextPageToken"),
+                )
+            pages[key] = state
+            seen.update(state.ids)
+            if not state.next_token or state.next_token in pages:
+                break
+            token = state.next_token
+
+        for item_id in [item_id for item_id in self.index.items if item_id not in seen]:
+            self.index.remove(item_id)
+        self._pages = pages
+        self.synced_at = time.monotonic()
+        self.syncs += 1
+        self.last_error = None
+
+    async def run(self, client: httpx.AsyncClient) -> None:
+        while True:
+            try:
+                await self.sync(client)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001
+                self.sync_failures += 1
+                self.last_error = repr(exc)
+                logger.warning("catalog index sync failed: %r", exc)
+            await asyncio.sleep(self.sync_interval)
+
+    def start(self, client: httpx.AsyncClient) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run(client))
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "fresh": self.is_fresh(),
+            "items": len(self.index),
+            "terms": len(self.index.vocabulary),
+            "version": self.index.version,
+            "ageSeconds": (
+                round(time.monotonic() - self.synced_at, 3) if self.synced_at is not None else None
+            ),
+            "syncs": self.syncs,
+            "syncFailures": self.sync_failures,
+            "pagesFetched": self.pages_fetched,
+            "pagesNotModified": self.pages_not_modified,
+            "localQueries": self.local_queries,
+            "lastError": self.last_error,
+        }
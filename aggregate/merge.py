@@ -0,0 +1,282 @@
+"""Ranked k-way merge across paginated search sources.
+
+Each source is consumed in its own upstream order; the merge repeatedly emits
+the best-ranked head row across sources. The resulting cursor records, per
+source, which upstream page is being consumed and how many of its rows were
+already emitted, so the next page resumes exactly where this one stopped.
+
+Rows fetched but not emitted are parked in an ``OverflowBuffer`` so the next
+page can usually start without refetching. Upstream fetch sizes adapt to each
+source's recent share of merged pages so a page rarely needs more than one
+upstream call per source.
+"""
+import asyncio
+import heapq
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+SCORE_FIELDS = ("score", "relevance")
+SHARE_SMOOTHING = 0.5
+
+
+@dataclass
+class SourcePage:
+    rows: List[Dict[str, Any]]
+    next_token: Optional[str]
+    etag: Optional[str] = None
+    content: bytes = b""
+
+
+@dataclass
+class SourceCursor:
+    page_token: Optional[str] = None
+    page_size: int = 0
+    offset: int = 0
+    emitted: int = 0
+    share: Optional[float] = None
+    exhausted: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        state: Dict[str, Any] = {"o": self.offset, "i": self.emitted, "n": self.page_size}
+        if self.page_token:
+            state["t"] = self.page_token
+        if self.share is not None:
+            state["r"] = round(self.share, 3)
+        if self.exhausted:
+            state["x"] = 1
+        return state
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "SourceCursor":
+        """Inverse of ``to_dict``; raises ValueError/TypeError on tampered state."""
+        share = state.get("r")
+        if not isinstance(state.get("t", ""), str):
+            raise TypeError("page token must be a string")
+        return cls(
+            page_token=state.get("t"),
+            page_size=int(state.get("n", 0)),
+            offset=int(state.get("o", 0)),
+            emitted=int(state.get("i", 0)),
+            share=float(share) if share is not None else None,
+            exhausted=bool(state.get("x")),
+        )
+
+
+def rank_key(row: Dict[str, Any], position: int) -> float:
+    """Relevance of ``row``; rows without a score rank by position in their source."""
+    for name in SCORE_FIELDS:
+        value = row.get(name)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    return 1.0 / (1 + position)
+
+
+class OverflowBuffer:
+    """Short-lived LRU of fetched source pages whose rows were not all emitted."""
+
+    def __init__(self, *, max_entries: int = 512, ttl: float = 60.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._pages: "OrderedDict[Hashable, Tuple[float, SourcePage]]" = OrderedDict()
+        self.hits = 0
+
+    def get(self, key: Hashable) -> Optional[SourcePage]:
+        found = self._pages.get(key)
+        if found is None:
+            return None
+        stored_at, page = found
+        if time.monotonic() - stored_at > self.ttl:
+            del self._pages[key]
+            return None
+        self._pages.move_to_end(key)
+        self.hits += 1
+        return page
+
+    def put(self, key: Hashable, page: SourcePage) -> None:
+        self._pages[key] = (time.monotonic(), page)
+        self._pages.move_to_end(key)
+        while len(self._pages) > self.max_entries:
+            self._pages.popitem(last=False)
+
+    def clear(self) -> None:
+        self._pages.clear()
+        self.hits = 0
+
+
+Loader = Callable[[str, Optional[str], int], Awaitable[SourcePage]]
+
+
+@dataclass
+class _Lane:
+    name: str
+    order: int
+    cursor: SourceCursor
+    page: SourcePage
+    taken: int = 0
+
+    def head(self) -> Optional[Tuple[float, int, int]]:
+        if self.cursor.offset >= len(self.page.rows):
+            return None
+        row = self.page.rows[self.cursor.offset]
+        return (-rank_key(row, self.cursor.emitted), self.order, self.cursor.emitted)
+
+
+@dataclass
+class MergeResult:
+    rows: List[Tuple[str, Dict[str, Any]]]
+    cursors: Dict[str, SourceCursor]
+    pages: List[SourcePage] = field(default_factory=list)
+    failures: Dict[str, BaseException] = field(default_factory=dict)
+    upstream_calls: int = 0
+    truncated: bool = False
+
+
+class KWayMerge:
+    def __init__(
+        self,
+        load: Loader,
+        *,
+        size: int,
+        max_fetch_size: int,
+        overfetch: float = 2.0,
+        overflow: Optional[OverflowBuffer] = None,
+        overflow_scope: Hashable = None,
+    ) -> None:
+        self._load = load
+        self.size = size
+        self.max_fetch_size = max_fetch_size
+        self.overfetch = overfetch
+        self.overflow = overflow
+        self.overflow_scope = overflow_scope
+        self._calls = 0
+
+    def fetch_size(self, cursor: SourceCursor, sources: int) -> int:
+        share = cursor.share if cursor.share is not None else 1.0 / sources
+        wanted = math.ceil(self.size * max(share, 1.0 / sources) * self.overfetch)
+        return max(1, min(self.max_fetch_size, wanted))
+
+    async def page(
+        self, cursors: Dict[str, SourceCursor], *, timeout: Optional[float] = None
+    ) -> MergeResult:
+        result = MergeResult(rows=[], cursors=dict(cursors))
+        active = [name for name, cursor in cursors.items() if not cursor.exhausted]
+        lanes = await self._open(active, cursors, result, timeout)
+
+        heap = []
+        for lane in lanes.values():
+            self._push(heap, lane)
+        while heap and len(result.rows) < self.size:
+            _, _, _, name = heapq.heappop(heap)
+            lane = lanes[name]
+            row = lane.page.rows[lane.cursor.offset]
+            result.rows.append((name, row))
+            lane.cursor.offset += 1
+            lane.cursor.emitted += 1
+            lane.taken += 1
+            if lane.cursor.offset >= len(lane.page.rows):
+                if len(result.rows) >= self.size:
+                    break
+                try:
+                    refilled = await self._next_page(lane, len(lanes), result)
+                except Exception as exc:  # noqa: BLE001
+                    # The lane may still hold better-ranked rows than the other
+                    # heads, so end the page short rather than emit out of order.
+                    # Its cursor already points past the consumed page. The
+                    # source counts as failed so the page is reported partial.
+                    result.failures[name] = exc
+                    result.truncated = True
+                    break
+                if not refilled:
+                    continue
+            self._push(heap, lane)
+
+        for lane in lanes.values():
+            if lane.cursor.offset >= len(lane.page.rows):
+                self._advance_past_page(lane)
+            elif self.overflow is not None:
+                self.overflow.put(self._overflow_key(lane.name, lane.cursor), lane.page)
+            observed = lane.taken / self.size
+            previous = lane.cursor.share
+            lane.cursor.share = (
+                observed
+                if previous is None
+                else SHARE_SMOOTHING * observed + (1 - SHARE_SMOOTHING) * previous
+            )
+            result.cursors[lane.name] = lane.cursor
+        result.upstream_calls = self._calls
+        return result
+
+    async def _open(
+        self,
+        names: List[str],
+        cursors: Dict[str, SourceCursor],
+        result: MergeResult,
+        timeout: Optional[float],
+    ) -> Dict[str, _Lane]:
+        order = {name: index for index, name in enumerate(cursors)}
+        opened: Dict[str, SourceCursor] = {}
+        tasks = {}
+        for name in names:
+            cursor = SourceCursor(**vars(cursors[name]))
+            if not cursor.page_size:
+                cursor.page_size = self.fetch_size(cursor, len(cursors))
+            opened[name] = cursor
+            tasks[name] = asyncio.ensure_future(self._get(name, cursor))
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=timeout)
+
+        lanes: Dict[str, _Lane] = {}
+        for name, task in tasks.items():
+            if not task.done():
+                task.cancel()
+                result.failures[name] = asyncio.TimeoutError()
+            elif task.exception() is not None:
+                result.failures[name] = task.exception()
+            else:
+                page = task.result()
+                result.pages.append(page)
+                lanes[name] = _Lane(name, order[name], opened[name], page)
+        return lanes
+
+    async def _get(self, name: str, cursor: SourceCursor) -> SourcePage:
+        if self.overflow is not None:
+            page = self.overflow.get(self._overflow_key(name, cursor))
+            if page is not None:
+                return page
+        self._calls += 1
+        return await self._load(name, cursor.page_token, cursor.page_size)
+
+    async def _next_page(self, lane: _Lane, sources: int, result: MergeResult) -> bool:
+        """Move ``lane`` onto its following upstream page; False once it has no rows."""
+        if not lane.page.next_token:
+            lane.cursor.exhausted = True
+            return False
+        cursor = SourceCursor(
+            page_token=lane.page.next_token,
+            page_size=self.fetch_size(lane.cursor, sources),
+            emitted=lane.cursor.emitted,
+            share=lane.cursor.share,
+        )
+        page = await self._get(lane.name, cursor)
+        result.pages.append(page)
+        lane.cursor, lane.page = cursor, page
+        return lane.cursor.offset < len(page.rows)
+
+    def _advance_past_page(self, lane: _Lane) -> None:
+        if lane.page.next_token:
+            lane.cursor.page_token = lane.page.next_token
+            lane.cursor.offset = 0
+            lane.cursor.page_size = 0
+        else:
+            lane.cursor.exhausted = True
+
+    def _push(self, heap: list, lane: _Lane) -> None:
+        head = lane.head()
+        if head is not None:
+            heapq.heappush(heap, (*head, lane.name))
+
+    def _overflow_key(self, name: str, cursor: SourceCursor) -> Hashable:
+        return (self.overflow_scope, name, cursor.page_token, cursor.page_size)
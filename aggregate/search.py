@@ -1,17 +1,79 @@
 import asyncio
-from typing import Optional
+from typing import Any, Dict, Optional
 
-from fastapi import APIRouter, Depends, Query, Response
+import httpx
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
 from httpx import AsyncClient
 
+import deadline
+import server_timing
+from aggregate.catalog_index import LOCAL_TOKEN_PREFIX, CatalogReplica
+from aggregate.merge import SCORE_FIELDS, KWayMerge, OverflowBuffer, SourceCursor, SourcePage
+from aggregate.search_cache import SearchCache, normalize_query, search_key
+from conditional import check_not_modified
 from config import Settings
-from deps import get_http_client, get_settings_from_app
+from deps import (
+    get_catalog_replica,
+    get_http_client,
+    get_search_cache,
+    get_search_overflow,
+    get_settings_from_app,
+)
+from error_model import http_error
 from etag import combined_etag, strong_etag_bytes
+from fields import parse_fields
 from http_client import request_with_retry
-from pagination import extract_tokens, merge_tokens
+from pagination import (
+    extract_cursor,
+    extract_only,
+    invalid_page_token,
+    merge_tokens,
+    resume_token,
+)
 
 router = APIRouter(tags=["search"])
 
+# source name -> (settings attribute for the base URL, path, body key, result label)
+SOURCES = {
+    "items": ("catalog_svc_base", "/catalog/items", "items", "catalog"),
+    "orders": ("order_svc_base", "/orders", "orders", "order"),
+}
+# source name -> service name in FIELDS_PUSHDOWN
+SERVICES = {"items": "catalog", "orders": "orders"}
+
+
+def _failure_reason(exc: BaseException) -> str:
+    if isinstance(exc, HTTPException) and isinstance(exc.detail, dict):
+        return exc.detail.get("code", "UPSTREAM_ERROR")
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"UPSTREAM_{exc.response.status_code}"
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return "DEADLINE_EXCEEDED"
+    return "UPSTREAM_ERROR"
+
+
+def _local_catalog_page(
+    replica: CatalogReplica, q: str, token: Optional[str], size: int
+) -> Optional[SourcePage]:
+    """Serve the catalog half from the replica, or ``None`` to go upstream.
+
+    A walk that started upstream stays upstream, and a fresh walk only starts
+    locally while the replica is within its staleness bound.
+    """
+    if token and not token.startswith(LOCAL_TOKEN_PREFIX):
+        return None
+    if not replica.ready or (token is None and not replica.is_fresh()):
+        return None
+    offset = int(token[len(LOCAL_TOKEN_PREFIX):]) if token else 0
+    ranked = replica.search(q)
+    end = offset + size
+    return SourcePage(
+        rows=[{**item, "score": score} for score, item in ranked[offset:end]],
+        next_token=f"{LOCAL_TOKEN_PREFIX}{end}" if end < len(ranked) else None,
+        etag=replica.etag(),
+    )
+
 
 @router.get("/search")
 async def search(
@@ -19,69 +81,158 @@ async def search(
     response: Response,
     page_size: Optional[int] = Query(default=None, alias="pageSize"),
     page_token: Optional[str] = Query(default=None, alias="pageToken"),
+    fields: Optional[str] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None),
     client: AsyncClient = Depends(get_http_client),
+    overflow: Optional[OverflowBuffer] = Depends(get_search_overflow),
+    cache: Optional[SearchCache] = Depends(get_search_cache),
+    replica: Optional[CatalogReplica] = Depends(get_catalog_replica),
     settings: Settings = Depends(get_settings_from_app),
 ):
     size = settings.clamp_page_size(page_size)
-    per_source_tokens = extract_tokens(page_token)
-
-    async def fetch_items():
-        params = {
-            "q": q,
-            "pageSize": size,
-        }
-        if token := per_source_tokens.get("items"):
-            params["pageToken"] = token
-        return await request_with_retry(
-            client,
-            "GET",
-            f"{settings.catalog_svc_base}/catalog/items",
-            params=params,
-            retries=settings.http_retries,
+    fieldset = parse_fields(fields)
+    # Upstreams, the overflow buffer and the cache all see the same normalized
+    # query, so a cached page is only ever reused for the query it was built from.
+    q = normalize_query(q)
+    key = search_key(q, size, page_token, fieldset.param if fieldset else "")
+    if cache is not None and (entry := cache.get(key)) is not None:
+        if unchanged := check_not_modified(if_none_match, entry.etag):
+            return unchanged
+        return Response(
+            content=entry.body,
+            media_type="application/json",
+            headers={
+                "ETag": entry.etag,
+                "X-Cache": "HIT",
+                "X-Search-Upstream-Calls": "0",
+            },
         )
 
-    async def fetch_orders():
+    # The merge still ranks on the score fields. Parked overflow pages are keyed
+    # on what was pushed down, so a projected page never answers a full request.
+    pushed_fields = fieldset.upstream_param(SCORE_FIELDS) if fieldset is not None else None
+    pushed = {
+        name for name in SOURCES if pushed_fields and settings.pushes_fields(SERVICES[name])
+    }
+    states = extract_cursor(page_token)
+    wanted = extract_only(page_token) or list(SOURCES)
+
+    async def load(name: str, token: Optional[str], fetch_size: int) -> SourcePage:
+        if name == "items" and replica is not None:
+            local = _local_catalog_page(replica, q, token, fetch_size)
+            if local is not None:
+                return local
+        if token and token.startswith(LOCAL_TOKEN_PREFIX):
+            # The replica this walk started on is gone (e.g. after a restart).
+            token = None
+        base_attr, path, body_key, _ = SOURCES[name]
         params = {
             "q": q,
-            "pageSize": size,
+            "pageSize": fetch_size,
         }
-        if token := per_source_tokens.get("orders"):
+        if token:
             params["pageToken"] = token
-        return await request_with_retry(
+        if name in pushed:
+            params["fields"] = pushed_fields
+        upstream = await request_with_retry(
             client,
             "GET",
-            f"{settings.order_svc_base}/orders",
+            f"{getattr(settings, base_attr)}{path}",
             params=params,
             retries=settings.http_retries,
         )
+        upstream.raise_for_status()
+        body = server_timing.json_body(upstream)
+        return SourcePage(
+            rows=body.get(body_key, []),
+            next_token=body.get("nextPageToken"),
+            etag=upstream.headers.get("etag"),
+            content=upstream.content,
+        )
 
-    items_resp, orders_resp = await asyncio.gather(fetch_items(), fetch_orders())
-    items_resp.raise_for_status()
-    orders_resp.raise_for_status()
-
-    items_body = items_resp.json()
-    orders_body = orders_resp.json()
+    try:
+        cursors = {
+            name: SourceCursor.from_dict(states.get(name, {}))
+            for name in SOURCES
+            if name in wanted
+        }
+    except (TypeError, ValueError):
+        raise invalid_page_token() from None
+    merge = KWayMerge(
+        load,
+        size=size,
+        max_fetch_size=settings.max_page_size,
+        overfetch=settings.search_overfetch_factor,
+        overflow=overflow,
+        overflow_scope=(q, pushed_fields if pushed else None),
+    )
+    with deadline.scope(settings.search_deadline_ms / 1000 or None, override=False):
+        result = await merge.page(cursors, timeout=deadline.remaining())
 
-    merged = []
-    for item in items_body.get("items", []):
-        merged.append({"source": "catalog", **item})
-    for order in orders_body.get("orders", []):
-        merged.append({"source": "order", **order})
+    missing = {name: _failure_reason(exc) for name, exc in result.failures.items()}
+    if missing and not result.pages:
+        timed_out = any(reason == "DEADLINE_EXCEEDED" for reason in missing.values())
+        raise http_error(
+            504 if timed_out else 502,
+            code="SEARCH_SOURCES_UNAVAILABLE",
+            message="No search source answered in time",
+            details={"missingSources": missing},
+        )
 
-    merged = merged[:size]
+    if fieldset is not None:
+        merged = [
+            {"source": SOURCES[name][3], **fieldset.project(row)} for name, row in result.rows
+        ]
+    else:
+        merged = [{"source": SOURCES[name][3], **row} for name, row in result.rows]
+    offsets = {name: cursor.to_dict() for name, cursor in result.cursors.items()}
+    # Missing sources stay at their current cursor so paging on never skips them.
     next_token = merge_tokens(
         {
-            "items": items_body.get("nextPageToken"),
-            "orders": orders_body.get("nextPageToken"),
-        }
+            name: cursor.page_token
+            for name, cursor in result.cursors.items()
+            if not cursor.exhausted
+        },
+        offsets,
     )
 
     etag = combined_etag(
-        [items_resp.headers.get("etag"), orders_resp.headers.get("etag")]
+        [page.etag for page in result.pages] + [f"missing:{name}" for name in sorted(missing)]
     )
     if not etag:
-        etag = strong_etag_bytes(
-            (items_resp.content + b"|" + orders_resp.content)
+        etag = strong_etag_bytes(b"|".join(page.content for page in result.pages))
+    if fieldset is not None:
+        etag = fieldset.etag(etag)
+    payload: Dict[str, Any] = {"results": merged, "nextPageToken": next_token, "pageSize": size}
+    if cache is not None and not missing:
+        # Only complete pages are cached; partial ones must be retried upstream.
+        body = JSONResponse(payload).body
+        cache.store(key, body, etag, cursors)
+        if unchanged := check_not_modified(if_none_match, etag):
+            return unchanged
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={
+                "ETag": etag,
+                "X-Cache": "MISS",
+                "X-Search-Upstream-Calls": str(result.upstream_calls),
+            },
         )
+
+    if unchanged := check_not_modified(if_none_match, etag):
+        return unchanged
     response.headers["ETag"] = etag
-    return {"results": merged, "nextPageToken": next_token, "pageSize": size}
+    response.headers["X-Search-Upstream-Calls"] = str(result.upstream_calls)
+    if missing:
+        response.headers["Cache-Control"] = "no-store"
+        payload["partial"] = True
+        payload["missingSources"] = [
+            {"source": name, "reason": reason} for name, reason in sorted(missing.items())
+        ]
+        payload["resumeToken"] = resume_token(
+            {name: cursor.page_token for name, cursor in result.cursors.items()},
+            list(missing),
+            offsets,
+        )
+    return payload
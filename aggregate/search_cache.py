@@ -0,0 +1,137 @@
+"""Short-lived cache of aggregated ``/search`` pages.
+
+Pages are keyed by the normalized query, page size, page token and ``fields``
+projection, and kept in LRU order under an entry-count and byte cap. Each
+entry stores the rendered
+body with its combined ETag, so repeated and conditional requests for a popular
+query are answered without touching catalog or orders. Entries remember which
+sources they merged so writes to one source (e.g. ``POST /orders``) drop only
+the pages that could have changed.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional, Tuple
+
+from config import Settings
+
+SearchKey = Tuple[str, int, str, str]
+
+
+def normalize_query(q: str) -> str:
+    return " ".join(q.casefold().split())
+
+
+def search_key(q: str, size: int, page_token: Optional[str], fields: str = "") -> SearchKey:
+    return (normalize_query(q), size, page_token or "", fields)
+
+
+@dataclass
+class SearchCacheEntry:
+    body: bytes
+    etag: str
+    sources: FrozenSet[str]
+    stored_at: float
+    expires_at: float
+    size: int = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.size = len(self.body) + len(self.etag)
+
+
+class SearchCache:
+    def __init__(
+        self,
+        *,
+        ttl: float,
+        max_entries: int,
+        max_bytes: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: "OrderedDict[SearchKey, SearchCacheEntry]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "SearchCache":
+        return cls(
+            ttl=settings.search_cache_ttl_seconds,
+            max_entries=settings.search_cache_max_entries,
+            max_bytes=settings.search_cache_max_bytes,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: SearchKey) -> Optional[SearchCacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None and self._clock() >= entry.expires_at:
+            self._drop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def store(
+        self, key: SearchKey, body: bytes, etag: str, sources: Iterable[str]
+    ) -> Optional[SearchCacheEntry]:
+        now = self._clock()
+        entry = SearchCacheEntry(body, etag, frozenset(sources), now, now + self.ttl)
+        self._drop(key)
+        if self.ttl <= 0 or entry.size > self.max_bytes:
+            return None
+        self._entries[key] = entry
+        self.total_bytes += entry.size
+        self._evict()
+        return entry
+
+    def invalidate(self, source: Optional[str] = None) -> int:
+        """Drop pages that merged ``source`` (every page when ``None``)."""
+
+        stale = [
+            key
+            for key, entry in self._entries.items()
+            if source is None or source in entry.sources
+        ]
+        for key in stale:
+            self._drop(key)
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.total_bytes = 0
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _drop(self, key: SearchKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self.total_bytes -= entry.size
+            self.evictions += 1
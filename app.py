@@ -1,46 +1,148 @@
+import asyncio
+import logging
 from contextlib import asynccontextmanager
-import uuid
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+import compression
+import deadline
+import metrics
+import server_timing
+import tracing
 from aggregate import search
+from aggregate.catalog_index import CatalogReplica
+from aggregate.merge import OverflowBuffer
+from aggregate.search_cache import SearchCache
+from cache_backend import create_cache_backend
+from circuit_breaker import UPSTREAMS
 from config import get_settings
+from fanout import FanoutEngine
+from hedging import HEDGER
 from http_client import create_async_client
-from routers import health, items, jobs, orders, users
+from idempotency import create_idempotency_store
+from job_poller import JobPoller
+from negative_cache import NegativeCache
+from response_cache import ResponseCache
+from singleflight import SingleFlight
+from warmup import UpstreamWarmer
+from routers import admin, health, items, jobs, orders, users
+from routers import metrics as metrics_router
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     settings = get_settings()
+    UPSTREAMS.configure(settings)
+    HEDGER.configure(settings)
+    compression.configure(settings)
+    metrics.configure(
+        {
+            settings.user_svc_base: "users",
+            settings.catalog_svc_base: "catalog",
+            settings.order_svc_base: "orders",
+        }
+    )
     http_client = create_async_client(settings)
     app.state.settings = settings
     app.state.http_client = http_client
+    singleflight = SingleFlight() if settings.singleflight_enabled else None
+    app.state.singleflight = singleflight
+    cache_backend = create_cache_backend(settings) if settings.response_cache_enabled else None
+    response_cache = (
+        ResponseCache.from_settings(settings, cache_backend)
+        if settings.response_cache_enabled
+        else None
+    )
+    app.state.response_cache = response_cache
+    fanout = FanoutEngine(settings, http_client, singleflight=singleflight, cache=response_cache)
+    app.state.fanout = fanout
+    app.state.fk_negative_cache = (
+        NegativeCache.from_settings(settings) if settings.fk_negative_cache_enabled else None
+    )
+    idempotency = create_idempotency_store(settings) if settings.idempotency_enabled else None
+    app.state.idempotency_store = idempotency
+    app.state.search_overflow = OverflowBuffer(
+        max_entries=settings.search_overflow_max_entries,
+        ttl=settings.search_overflow_ttl_seconds,
+    )
+    app.state.search_cache = (
+        SearchCache.from_settings(settings) if settings.search_cache_enabled else None
+    )
+    poller = JobPoller.from_settings(settings, http_client) if settings.job_poller_enabled else None
+    app.state.job_poller = poller
+    replica = CatalogReplica.from_settings(settings) if settings.catalog_index_enabled else None
+    app.state.catalog_replica = replica
+    if replica is not None:
+        replica.start(http_client)
+    warmer = (
+        UpstreamWarmer.from_settings(settings, {"async": http_client, "fanout": fanout.sync_client})
+        if settings.warmup_enabled
+        else None
+    )
+    app.state.warmer = warmer
+    if warmer is not None:
+        # Open the pools before accepting traffic; /readyz stays 503 until a round succeeds.
+        try:
+            await asyncio.wait_for(warmer.warm(), settings.warmup_timeout_seconds)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "upstream warm-up did not finish within %.1fs", settings.warmup_timeout_seconds
+            )
+        warmer.start()
     try:
         yield
     finally:
+        if warmer is not None:
+            await warmer.stop()
+        if replica is not None:
+            await replica.stop()
+        if poller is not None:
+            await poller.close()
+        if response_cache is not None:
+            await response_cache.close()
+        fanout.close()
+        if idempotency is not None:
+            idempotency.close()
+        if cache_backend is not None:
+            await cache_backend.close()
         await http_client.aclose()
 
 
-app = FastAPI(title="Composite Service", lifespan=lifespan)
+app = FastAPI(
+    title="Composite Service",
+    lifespan=lifespan,
+    default_response_class=server_timing.TimedJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"], 
+    allow_headers=["*"],
+    expose_headers=[tracing.TRACE_HEADER, "ETag", "Location", "Server-Timing"],
 )
 
-@app.middleware("http")
-async def add_trace_id(request: Request, call_next):
-    trace_id = request.headers.get("X-Trace-Id", str(uuid.uuid4()))
-    response = await call_next(request)
-    response.headers["X-Trace-Id"] = trace_id
-    return response
-
+# Inside Server-Timing so the compress phase is reported.
+app.add_middleware(compression.CompressionMiddleware, settings=get_settings)
+app.add_middleware(
+    deadline.DeadlineMiddleware,
+    default_ms=lambda: get_settings().request_deadline_ms,
+)
+app.add_middleware(tracing.TraceMiddleware)
+app.add_middleware(
+    server_timing.ServerTimingMiddleware,
+    enabled=lambda: get_settings().server_timing_enabled,
+)
+# Outermost, so route latency covers every other middleware.
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(health.router)
+app.include_router(admin.router)
+app.include_router(metrics_router.router)
 app.include_router(users.router)
 app.include_router(items.router)
 app.include_router(orders.router)
@@ -0,0 +1,89 @@
+"""Shared fan-out for the ``:batchGet`` endpoints.
+
+IDs are deduplicated in request order and fetched over the shared client with
+at most ``concurrency`` lookups in flight. Every ID ends up either in
+``results`` (body plus its own ETag) or in ``errors`` (an ``ErrorEnvelope``),
+so one missing or failing entry never fails the whole batch.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+import server_timing
+from error_model import ErrorEnvelope, http_error
+from etag import strong_etag_bytes
+
+Fetch = Callable[[str], Awaitable[httpx.Response]]
+
+
+def unique_ids(ids: List[str], max_ids: int) -> List[str]:
+    unique = list(dict.fromkeys(i for i in ids if i))
+    if len(unique) > max_ids:
+        raise http_error(
+            422,
+            code="BATCH_TOO_LARGE",
+            message=f"At most {max_ids} distinct ids per batch",
+            details={"maxIds": max_ids, "received": len(unique)},
+        )
+    return unique
+
+
+def _error_entry(exc: BaseException) -> Dict[str, Any]:
+    if isinstance(exc, HTTPException) and isinstance(exc.detail, dict):
+        entry = dict(exc.detail)
+        # The batch response carries the trace id once, in X-Trace-Id.
+        entry.pop("traceId", None)
+        details = entry.get("details")
+        if details is None or isinstance(details, dict):
+            entry["details"] = {"status": exc.status_code, **(details or {})}
+        return entry
+    if isinstance(exc, HTTPException):
+        return ErrorEnvelope(
+            code="UPSTREAM_ERROR", message=str(exc.detail), details={"status": exc.status_code}
+        ).as_dict()
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return ErrorEnvelope(
+            code=f"UPSTREAM_{status}",
+            message="Upstream request failed",
+            details={"status": status},
+        ).as_dict()
+    return ErrorEnvelope(code="UPSTREAM_ERROR", message=type(exc).__name__).as_dict()
+
+
+async def batch_get(
+    ids: List[str],
+    fetch: Fetch,
+    *,
+    concurrency: int,
+    not_found_code: str,
+    not_found_message: str,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Return ``(results, errors)`` maps keyed by id."""
+
+    gate = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(entity_id: str) -> Dict[str, Any]:
+        async with gate:
+            upstream = await fetch(entity_id)
+        if upstream.status_code == 404:
+            raise http_error(404, code=not_found_code, message=not_found_message)
+        upstream.raise_for_status()
+        return {
+            "etag": upstream.headers.get("etag") or strong_etag_bytes(upstream.content),
+            "data": server_timing.json_body(upstream),
+        }
+
+    outcomes = await asyncio.gather(*(one(i) for i in ids), return_exceptions=True)
+    results: Dict[str, Any] = {}
+    errors: Dict[str, Any] = {}
+    for entity_id, outcome in zip(ids, outcomes):
+        if isinstance(outcome, asyncio.CancelledError):
+            raise outcome
+        if isinstance(outcome, BaseException):
+            errors[entity_id] = _error_entry(outcome)
+        else:
+            results[entity_id] = outcome
+    return results, errors
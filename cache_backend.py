@@ -0,0 +1,352 @@
+"""Shared second-tier stores for the response cache.
+
+``ResponseCache`` keeps its own in-process LRU; a backend sits behind it so
+several uvicorn workers (or hosts) see each other's upstream responses instead
+of each warming a private copy. Values are opaque bytes with a TTL:
+
+- ``InProcessBackend`` – a bounded dict; one process only, mostly for tests.
+- ``SqliteBackend`` – a WAL-mode SQLite file shared by every worker on a host.
+- ``RedisBackend`` – ``GET``/``SET PX``/``DEL`` over the Redis protocol
+  (Redis, Valkey, KeyDB or any RESP-speaking stand-in).
+
+Backend failures are logged and counted but never fail a request: a broken
+shared tier degrades to a miss.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+from config import Settings
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("none", "memory", "sqlite", "redis")
+
+
+class CacheBackend(ABC):
+    name = ""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            value = await self._get(key)
+        except Exception as exc:  # noqa: BLE001
+            self._failed("get", exc)
+            return None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        try:
+            await self._set(key, value, ttl)
+            self.writes += 1
+        except Exception as exc:  # noqa: BLE001
+            self._failed("set", exc)
+
+    async def delete(self, key: str) -> None:
+        try:
+            await self._delete(key)
+        except Exception as exc:  # noqa: BLE001
+            self._failed("delete", exc)
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "errors": self.errors,
+        }
+
+    @abstractmethod
+    async def _get(self, key: str) -> Optional[bytes]: ...
+
+    @abstractmethod
+    async def _set(self, key: str, value: bytes, ttl: float) -> None: ...
+
+    @abstractmethod
+    async def _delete(self, key: str) -> None: ...
+
+    def _failed(self, operation: str, exc: Exception) -> None:
+        self.errors += 1
+        logger.warning("%s cache backend %s failed: %r", self.name, operation, exc)
+
+
+class InProcessBackend(CacheBackend):
+    name = "memory"
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        super().__init__()
+        self.max_entries = max_entries
+        self._values: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    async def _get(self, key: str) -> Optional[bytes]:
+        item = self._values.get(key)
+        if item is None:
+            return None
+        if time.monotonic() >= item[1]:
+            del self._values[key]
+            return None
+        self._values.move_to_end(key)
+        return item[0]
+
+    async def _set(self, key: str, value: bytes, ttl: float) -> None:
+        self._values[key] = (value, time.monotonic() + ttl)
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_entries:
+            self._values.popitem(last=False)
+
+    async def _delete(self, key: str) -> None:
+        self._values.pop(key, None)
+
+
+class SqliteBackend(CacheBackend):
+    """Host-shared tier in a WAL-mode SQLite file.
+
+    Expired rows are dropped and the oldest rows (by insertion) trimmed to
+    ``max_entries``/``max_bytes`` every ``TRIM_EVERY`` writes, so the file
+    stays bounded however many distinct URLs pass through it.
+    """
+
+    name = "sqlite"
+    TRIM_EVERY = 64
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """
+
+    def __init__(
+        self, path: str, *, max_entries: int = 20000, max_bytes: int = 256 * 1024 * 1024
+    ) -> None:
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.trimmed = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=5.0, check_same_thread=False, isolation_level=None
+        )
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(self._SCHEMA)
+            self._trim_locked()
+
+    async def _get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get_sync, key)
+
+    async def _set(self, key: str, value: bytes, ttl: float) -> None:
+        await asyncio.to_thread(self._set_sync, key, value, ttl)
+
+    async def _delete(self, key: str) -> None:
+        await asyncio.to_thread(self._execute, "DELETE FROM response_cache WHERE key = ?", (key,))
+
+    async def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "trimmed": self.trimmed}
+
+    def _set_sync(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            # REPLACE deletes and reinserts, so rowid order is write order.
+            self._db.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl),
+            )
+            self._writes += 1
+            if self._writes % self.TRIM_EVERY == 0:
+                self._trim_locked()
+
+    def _trim_locked(self) -> None:
+        self.trimmed += self._db.execute(
+            "DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),)
+        ).rowcount
+        count, size = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length(value)), 0) FROM response_cache"
+        ).fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+        cutoff = None
+        for rowid, length in self._db.execute(
+            "SELECT rowid, length(value) FROM response_cache ORDER BY rowid"
+        ):
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            cutoff = rowid
+            count -= 1
+            size -= length
+        self.trimmed += self._db.execute(
+            "DELETE FROM response_cache WHERE rowid <= ?", (cutoff,)
+        ).rowcount
+
+    def _get_sync(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= time.time():
+                self._db.execute(
+                    "DELETE FROM response_cache WHERE key = ? AND expires_at <= ?",
+                    (key, time.time()),
+                )
+                return None
+            return bytes(row[0])
+
+    def _execute(self, sql: str, params: Tuple[Any, ...]) -> None:
+        with self._lock:
+            self._db.execute(sql, params)
+
+
+class RedisProtocolError(Exception):
+    pass
+
+
+RespValue = Union[None, int, bytes, List[Any]]
+
+
+class RedisBackend(CacheBackend):
+    """Minimal RESP2 client: one connection, commands serialized by a lock."""
+
+    name = "redis"
+
+    def __init__(self, url: str, *, prefix: str = "composite:", timeout: float = 0.5) -> None:
+        super().__init__()
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _get(self, key: str) -> Optional[bytes]:
+        value = await self.command(b"GET", self.prefix + key)
+        return value if isinstance(value, bytes) else None
+
+    async def _set(self, key: str, value: bytes, ttl: float) -> None:
+        await self.command(b"SET", self.prefix + key, value, b"PX", str(max(1, int(ttl * 1000))))
+
+    async def _delete(self, key: str) -> None:
+        await self.command(b"DEL", self.prefix + key)
+
+    async def close(self) -> None:
+        await self._disconnect()
+
+    async def command(self, *args: Union[str, bytes]) -> RespValue:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            try:
+                return await asyncio.wait_for(self._roundtrip(args), self.timeout)
+            except BaseException:
+                # A half-read reply would desynchronize the stream.
+                await self._disconnect()
+                raise
+
+    async def _roundtrip(self, args: Tuple[Union[str, bytes], ...]) -> RespValue:
+        if self._writer is None:
+            await self._connect()
+        assert self._reader is not None and self._writer is not None
+        self._writer.write(encode_command(*args))
+        await self._writer.drain()
+        return await read_reply(self._reader)
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            self._writer.write(encode_command(b"AUTH", self.password))
+            await read_reply(self._reader)
+        if self.db:
+            self._writer.write(encode_command(b"SELECT", str(self.db)))
+            await read_reply(self._reader)
+
+    async def _disconnect(self) -> None:
+        writer, self._writer, self._reader = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:  # noqa: BLE001
+                pass
+
+
+def encode_command(*args: Union[str, bytes]) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg.encode("utf-8") if isinstance(arg, str) else arg
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> RespValue:
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("connection closed mid-reply")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload
+    if kind == b"-":
+        raise RedisProtocolError(payload.decode("utf-8", "replace"))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        count = int(payload)
+        if count < 0:
+            return None
+        return [await read_reply(reader) for _ in range(count)]
+    raise RedisProtocolError(f"unexpected reply type {kind!r}")
+
+
+def create_cache_backend(settings: Settings) -> Optional[CacheBackend]:
+    backend = settings.cache_backend.lower()
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return InProcessBackend(settings.response_cache_max_entries)
+    if backend == "sqlite":
+        return SqliteBackend(
+            settings.cache_sqlite_path,
+            max_entries=settings.cache_sqlite_max_entries,
+            max_bytes=settings.cache_sqlite_max_bytes,
+        )
+    if backend == "redis":
+        return RedisBackend(settings.cache_redis_url, prefix=settings.cache_redis_prefix)
+    raise ValueError(f"unknown cache backend: {backend!r} (expected one of {BACKENDS})")
@@ -0,0 +1,264 @@
+"""Per-upstream circuit breakers and retry budgets for ``request_with_retry``.
+
+Each upstream host gets a count-based sliding window of call outcomes. The
+breaker opens when the failure rate (transport errors and 5xx) or the slow-call
+rate crosses its threshold, fails fast while open, and lets a few probe calls
+through once the cool-down elapses (half-open). The retry budget caps retries
+to a fraction of the successful calls seen over the last few seconds.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+import httpx
+
+from config import Settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_FAILED = 1
+_SLOW = 2
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, upstream: str, retry_after: float) -> None:
+        super().__init__(f"circuit open for {upstream}")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        *,
+        window_size: int = 20,
+        minimum_calls: int = 10,
+        failure_rate_threshold: float = 0.5,
+        slow_call_rate_threshold: float = 0.8,
+        slow_call_seconds: float = 2.0,
+        open_seconds: float = 15.0,
+        half_open_calls: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.minimum_calls = minimum_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._window: Deque[int] = deque(maxlen=window_size)
+        self._failures = 0
+        self._slow = 0
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        self.rejected = 0
+
+    def before_call(self) -> None:
+        """Raise ``CircuitOpenError`` unless a call may go upstream now."""
+
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.open_seconds - self._clock()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self.state = HALF_OPEN
+                self._probes_started = self._probes_succeeded = 0
+            if self.state == HALF_OPEN:
+                if self._probes_started >= self.half_open_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.open_seconds)
+                self._probes_started += 1
+
+    def release(self) -> None:
+        """Hand back a probe slot taken by a call that never produced an outcome
+        (cancelled, or failed before reaching the upstream)."""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes_started > 0:
+                self._probes_started -= 1
+
+    def record(self, *, failed: bool, elapsed: float) -> None:
+        slow = elapsed >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._trip()
+                else:
+                    self._probes_succeeded += 1
+                    if self._probes_succeeded >= self.half_open_calls:
+                        self._reset(CLOSED)
+                return
+            if self.state == OPEN:
+                return
+            if len(self._window) == self._window.maxlen:
+                evicted = self._window[0]
+                self._failures -= evicted & _FAILED
+                self._slow -= (evicted & _SLOW) >> 1
+            self._window.append((_FAILED if failed else 0) | (_SLOW if slow else 0))
+            self._failures += int(failed)
+            self._slow += int(slow)
+            calls = len(self._window)
+            if calls >= self.minimum_calls and (
+                self._failures / calls >= self.failure_rate_threshold
+                or self._slow / calls >= self.slow_call_rate_threshold
+            ):
+                self._trip()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = len(self._window)
+            snapshot: Dict[str, Any] = {
+                "state": self.state,
+                "calls": calls,
+                "failureRate": round(self._failures / calls, 3) if calls else 0.0,
+                "slowCallRate": round(self._slow / calls, 3) if calls else 0.0,
+                "rejected": self.rejected,
+            }
+            if self.state == OPEN:
+                snapshot["retryAfterSeconds"] = round(
+                    max(0.0, self._opened_at + self.open_seconds - self._clock()), 3
+                )
+            return snapshot
+
+    def _trip(self) -> None:
+        self._reset(OPEN)
+        self._opened_at = self._clock()
+
+    def _reset(self, state: str) -> None:
+        self.state = state
+        self._window.clear()
+        self._failures = self._slow = 0
+
+
+class RetryBudget:
+    """Allow retries up to ``ratio`` of recent successes plus a small floor."""
+
+    def __init__(
+        self,
+        *,
+        ratio: float = 0.2,
+        min_retries: int = 5,
+        window_seconds: int = 10,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._epochs = [0] * window_seconds
+        self._successes = [0] * window_seconds
+        self._retries = [0] * window_seconds
+        self.exhausted = 0
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._successes[self._bucket()] += 1
+
+    def try_retry(self) -> bool:
+        with self._lock:
+            bucket = self._bucket()
+            allowed = self.min_retries + self.ratio * sum(self._successes)
+            if sum(self._retries) >= allowed:
+                self.exhausted += 1
+                return False
+            self._retries[bucket] += 1
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._bucket()
+            return {
+                "successes": sum(self._successes),
+                "retries": sum(self._retries),
+                "exhausted": self.exhausted,
+            }
+
+    def _bucket(self) -> int:
+        now = int(self._clock())
+        size = len(self._epochs)
+        for offset in range(size):
+            index = (now - offset) % size
+            if self._epochs[index] != now - offset:
+                self._epochs[index] = now - offset
+                self._successes[index] = self._retries[index] = 0
+        return now % size
+
+
+class UpstreamGuard:
+    def __init__(self, breaker: CircuitBreaker, budget: RetryBudget) -> None:
+        self.breaker = breaker
+        self.budget = budget
+
+    def record(self, *, failed: bool, elapsed: float) -> None:
+        self.breaker.record(failed=failed, elapsed=elapsed)
+        if not failed:
+            self.budget.record_success()
+
+
+class UpstreamRegistry:
+    """Process-wide breakers and budgets, one pair per upstream host."""
+
+    def __init__(self, settings: Optional[Settings] = None) -> None:
+        self._lock = threading.Lock()
+        self._guards: Dict[str, UpstreamGuard] = {}
+        self.enabled = True
+        self._breaker_options: Dict[str, Any] = {}
+        self._budget_options: Dict[str, Any] = {}
+        if settings is not None:
+            self.configure(settings)
+
+    def configure(self, settings: Settings) -> None:
+        self.enabled = settings.breaker_enabled
+        self._breaker_options = {
+            "window_size": settings.breaker_window_size,
+            "minimum_calls": settings.breaker_minimum_calls,
+            "failure_rate_threshold": settings.breaker_failure_rate,
+            "slow_call_rate_threshold": settings.breaker_slow_call_rate,
+            "slow_call_seconds": settings.breaker_slow_call_seconds,
+            "open_seconds": settings.breaker_open_seconds,
+            "half_open_calls": settings.breaker_half_open_calls,
+        }
+        self._budget_options = {
+            "ratio": settings.retry_budget_ratio,
+            "min_retries": settings.retry_budget_min_retries,
+            "window_seconds": settings.retry_budget_window_seconds,
+        }
+        self.clear()
+
+    def for_url(self, url: str) -> Optional[UpstreamGuard]:
+        if not self.enabled:
+            return None
+        host = httpx.URL(url).netloc.decode("ascii")
+        guard = self._guards.get(host)
+        if guard is None:
+            with self._lock:
+                guard = self._guards.get(host)
+                if guard is None:
+                    guard = UpstreamGuard(
+                        CircuitBreaker(host, **self._breaker_options),
+                        RetryBudget(**self._budget_options),
+                    )
+                    self._guards[host] = guard
+        return guard
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            host: {**guard.breaker.snapshot(), "retryBudget": guard.budget.snapshot()}
+            for host, guard in sorted(self._guards.items())
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._guards.clear()
+
+
+UPSTREAMS = UpstreamRegistry()
@@ -0,0 +1,337 @@
+"""Response compression with a cache of precompressed variants.
+
+``CompressionMiddleware`` negotiates ``Accept-Encoding`` (q-values honoured)
+against the configured encodings that are importable here: ``gzip`` always,
+``br`` with the ``brotli`` package, ``zstd`` with ``zstandard``. Complete
+bodies of a compressible type above ``COMPRESSION_MIN_BYTES`` are compressed;
+responses that already carry a ``Content-Encoding`` (e.g. the ``/items``
+stream relaying the upstream's gzip bytes) and streamed bodies pass through
+untouched.
+
+Compressed bodies of responses with an ETag are kept in ``VARIANTS`` keyed by
+path, ETag, length and encoding, so a hot representation is compressed once
+rather than per request. Streamed bodies such as the ``/items`` passthrough
+from an identity-encoding upstream are compressed chunk by chunk as they are
+relayed, so streaming keeps its time to first byte; a tagged stream also keeps
+its compressed chunks (up to ``MAX_VARIANT_BYTES``) and stores them in
+``VARIANTS`` once complete, after which the same page is served whole from the
+cache. The ETag itself is left unchanged; ``Vary: Accept-Encoding`` keeps
+shared caches from mixing variants.
+"""
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+import metrics
+import server_timing
+from config import Settings
+
+try:  # optional
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+try:  # optional
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+_COMPRESSORS: Dict[str, Callable[[bytes, int], bytes]] = {
+    "gzip": lambda body, level: gzip.compress(body, compresslevel=level, mtime=0),
+}
+if brotli is not None:
+    _COMPRESSORS["br"] = lambda body, level: brotli.compress(body, quality=level)
+if zstandard is not None:
+    _COMPRESSORS["zstd"] = lambda body, level: zstandard.ZstdCompressor(level=level).compress(
+        body
+    )
+
+
+class _BrotliStream:
+    def __init__(self, level: int) -> None:
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+# encoding -> factory of objects with ``compress(chunk)`` / ``flush()``
+_STREAM_COMPRESSORS: Dict[str, Callable[[int], Any]] = {
+    "gzip": lambda level: zlib.compressobj(level, zlib.DEFLATED, 31),
+}
+if brotli is not None:
+    _STREAM_COMPRESSORS["br"] = _BrotliStream
+if zstandard is not None:
+    _STREAM_COMPRESSORS["zstd"] = lambda level: zstandard.ZstdCompressor(level=level).compressobj()
+
+# Compressed streams larger than this are not kept as variants.
+MAX_VARIANT_BYTES = 4 * 1024 * 1024
+
+COMPRESSION_BYTES = metrics.REGISTRY.register(
+    metrics.Counter(
+        "composite_compression_bytes_total",
+        "Response body bytes before and after compression.",
+        ("encoding", "stage"),
+    )
+)
+
+VariantKey = Tuple[str, str, int, str]
+
+
+def available_encodings(preferred: str) -> List[str]:
+    """Configured encodings (in preference order) that can be produced here."""
+    names = [name.strip().lower() for name in preferred.split(",")]
+    return [name for name in names if name in _COMPRESSORS]
+
+
+def negotiate(accept_encoding: Optional[str], offered: List[str]) -> Optional[str]:
+    """Best of ``offered`` for an ``Accept-Encoding`` header, or ``None``."""
+    if not accept_encoding or not offered:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    wildcard = weights.get("*", 0.0)
+    best: Optional[str] = None
+    best_q = 0.0
+    for name in offered:
+        q = weights.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    media = content_type.split(";", 1)[0].strip().lower()
+    return (
+        media.startswith("text/")
+        or media.endswith("json")
+        or media.endswith("xml")
+        or media == "application/javascript"
+    )
+
+
+class VariantCache:
+    """LRU of compressed bodies bounded by total bytes."""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self._variants: "OrderedDict[VariantKey, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def compress(
+        self, body: bytes, encoding: str, level: int, key: Optional[VariantKey] = None
+    ) -> bytes:
+        if key is not None and (cached := self.get(key)) is not None:
+            return cached
+        with server_timing.phase("compress", encoding):
+            compressed = _COMPRESSORS[encoding](body, level)
+        if key is not None:
+            self.store(key, compressed)
+        return compressed
+
+    def get(self, key: VariantKey) -> Optional[bytes]:
+        with self._lock:
+            cached = self._variants.get(key)
+            if cached is not None:
+                self._variants.move_to_end(key)
+                self.hits += 1
+            return cached
+
+    def clear(self) -> None:
+        with self._lock:
+            self._variants.clear()
+            self.total_bytes = self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "variants": len(self._variants),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def store(self, key: VariantKey, compressed: bytes) -> None:
+        with self._lock:
+            self.misses += 1
+            if len(compressed) > self.max_bytes:
+                return
+            previous = self._variants.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous)
+            self._variants[key] = compressed
+            self.total_bytes += len(compressed)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._variants.popitem(last=False)
+                self.total_bytes -= len(evicted)
+                self.evictions += 1
+
+
+VARIANTS = VariantCache()
+
+
+def configure(settings: Settings) -> None:
+    VARIANTS.max_bytes = settings.compression_cache_max_bytes
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing complete, compressible response bodies."""
+
+    def __init__(self, app: Callable, *, settings: Callable[[], Settings]) -> None:
+        self.app = app
+        self.settings = settings
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        settings = self.settings()
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "HEAD"
+            or not settings.compression_enabled
+        ):
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(
+            Headers(scope=scope).get("accept-encoding"),
+            available_encodings(settings.compression_encodings),
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        level = _level(settings, encoding)
+        start: Optional[Dict[str, Any]] = None
+        headers = MutableHeaders()
+        # None until the first body message decides: "pass", "stream" or "drain"
+        mode: Optional[str] = None
+        stream: Any = None
+        # Compressed chunks of a tagged stream, stored as a variant once complete.
+        kept: Optional[List[bytes]] = None
+        kept_bytes = 0
+        kept_key: Optional[VariantKey] = None
+
+        def variant_key(length: int) -> Optional[VariantKey]:
+            etag = headers.get("etag")
+            if not etag:
+                return None
+            path = scope["path"] + "?" + scope.get("query_string", b"").decode("latin-1")
+            return (path, etag, length, encoding)
+
+        async def send_compressed(compressed: bytes) -> None:
+            assert start is not None
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send({**start, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": compressed})
+
+        async def send_whole(body: bytes) -> None:
+            assert start is not None
+            if len(body) < settings.compression_min_bytes:
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+            compressed = VARIANTS.compress(body, encoding, level, variant_key(len(body)))
+            COMPRESSION_BYTES.labels(encoding, "original").inc(len(body))
+            COMPRESSION_BYTES.labels(encoding, "sent").inc(len(compressed))
+            await send_compressed(compressed)
+
+        async def start_stream() -> None:
+            nonlocal stream
+            assert start is not None
+            stream = _STREAM_COMPRESSORS[encoding](level)
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            headers["Content-Encoding"] = encoding
+            headers.add_vary_header("Accept-Encoding")
+            await send({**start, "headers": headers.raw})
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal start, headers, mode, kept, kept_bytes, kept_key
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if mode == "pass" or message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if mode == "drain":
+                # Already answered from a cached variant.
+                return
+            if mode is None:
+                headers = MutableHeaders(raw=list(start["headers"]))
+                if (
+                    start["status"] < 200
+                    or start["status"] in (204, 206, 304)
+                    or "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type"))
+                    or (not more and len(body) < settings.compression_min_bytes)
+                ):
+                    mode = "pass"
+                    await send(start)
+                    await send(message)
+                    return
+                if not more:
+                    await send_whole(body)
+                    return
+                # A tagged stream (e.g. the /items passthrough) is keyed on its
+                # declared length, or -1 for chunked pages.
+                kept_key = variant_key(int(headers.get("content-length", -1)))
+                if kept_key is not None and (cached := VARIANTS.get(kept_key)) is not None:
+                    mode = "drain"
+                    await send_compressed(cached)
+                    return
+                mode = "stream"
+                kept = [] if kept_key is not None else None
+                await start_stream()
+
+            with server_timing.phase("compress", encoding):
+                chunk = stream.compress(body)
+                if not more:
+                    chunk += stream.flush()
+            COMPRESSION_BYTES.labels(encoding, "original").inc(len(body))
+            COMPRESSION_BYTES.labels(encoding, "sent").inc(len(chunk))
+            if kept is not None:
+                kept.append(chunk)
+                kept_bytes += len(chunk)
+                if kept_bytes > MAX_VARIANT_BYTES:
+                    kept = None
+                elif not more:
+                    VARIANTS.store(kept_key, b"".join(kept))
+            await send({"type": "http.response.body", "body": chunk, "more_body": more})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _level(settings: Settings, encoding: str) -> int:
+    if encoding == "br":
+        return settings.compression_brotli_quality
+    if encoding == "zstd":
+        return settings.compression_zstd_level
+    return settings.compression_gzip_level
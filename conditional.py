@@ -0,0 +1,37 @@
+"""Helpers for answering conditional GETs (If-None-Match) with 304."""
+from typing import Mapping, Optional
+
+from fastapi import Response
+
+from etag import etag_matches
+from http_client import copy_headers
+
+# Headers a 304 must repeat so caches can refresh their stored response.
+NOT_MODIFIED_HEADERS = ["Cache-Control", "Expires", "Vary", "Last-Modified"]
+
+
+def not_modified(
+    etag: Optional[str], source_headers: Optional[Mapping[str, str]] = None
+) -> Response:
+    response = Response(status_code=304)
+    if etag:
+        response.headers["ETag"] = etag
+    if source_headers is not None:
+        copy_headers(source_headers, response.headers, allow=NOT_MODIFIED_HEADERS)
+    return response
+
+
+def conditional_headers(if_none_match: Optional[str]) -> dict[str, str]:
+    """Client validators worth forwarding upstream."""
+    return {"If-None-Match": if_none_match} if if_none_match else {}
+
+
+def check_not_modified(
+    if_none_match: Optional[str],
+    etag: Optional[str],
+    source_headers: Optional[Mapping[str, str]] = None,
+) -> Optional[Response]:
+    """Return a 304 when the client's validators match ``etag``, else ``None``."""
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, source_headers)
+    return None
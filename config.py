@@ -21,9 +21,92 @@ class Settings(BaseSettings):
         'https://order-and-rental-service-314897419193.europe-west1.run.app'
     )
     http_timeout_seconds: float = float(os.getenv('HTTP_TIMEOUT_SECONDS', '5'))
+    http_keepalive_expiry_seconds: float = float(os.getenv('HTTP_KEEPALIVE_EXPIRY_SECONDS', '5'))
     http_retries: int = int(os.getenv('RETRY_ATTEMPTS', '2'))
     max_page_size: int = int(os.getenv('MAX_PAGE_SIZE', '100'))
     default_page_size: int = int(os.getenv('DEFAULT_PAGE_SIZE', '10'))
+    request_deadline_ms: float = float(os.getenv('REQUEST_DEADLINE_MS', '0'))
+    search_deadline_ms: float = float(os.getenv('SEARCH_DEADLINE_MS', '3000'))
+    search_overfetch_factor: float = float(os.getenv('SEARCH_OVERFETCH_FACTOR', '2'))
+    search_overflow_max_entries: int = int(os.getenv('SEARCH_OVERFLOW_MAX_ENTRIES', '512'))
+    search_overflow_ttl_seconds: float = float(os.getenv('SEARCH_OVERFLOW_TTL_SECONDS', '60'))
+    search_cache_enabled: bool = os.getenv('SEARCH_CACHE_ENABLED', 'true').lower() == 'true'
+    search_cache_ttl_seconds: float = float(os.getenv('SEARCH_CACHE_TTL_SECONDS', '15'))
+    search_cache_max_entries: int = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '1024'))
+    search_cache_max_bytes: int = int(os.getenv('SEARCH_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+    catalog_index_enabled: bool = os.getenv('CATALOG_INDEX_ENABLED', 'false').lower() == 'true'
+    catalog_index_page_size: int = int(os.getenv('CATALOG_INDEX_PAGE_SIZE', '100'))
+    catalog_index_sync_seconds: float = float(os.getenv('CATALOG_INDEX_SYNC_SECONDS', '30'))
+    catalog_index_max_staleness_seconds: float = float(os.getenv('CATALOG_INDEX_MAX_STALENESS_SECONDS', '120'))
+    fk_negative_cache_enabled: bool = os.getenv('FK_NEGATIVE_CACHE_ENABLED', 'true').lower() == 'true'
+    fk_negative_cache_ttl_seconds: float = float(os.getenv('FK_NEGATIVE_CACHE_TTL_SECONDS', '30'))
+    fk_negative_cache_max_entries: int = int(os.getenv('FK_NEGATIVE_CACHE_MAX_ENTRIES', '10000'))
+    idempotency_enabled: bool = os.getenv('IDEMPOTENCY_ENABLED', 'true').lower() == 'true'
+    idempotency_backend: str = os.getenv('IDEMPOTENCY_BACKEND', 'memory')
+    idempotency_sqlite_path: str = os.getenv('IDEMPOTENCY_SQLITE_PATH', '/tmp/composite-idempotency.sqlite3')
+    idempotency_ttl_seconds: float = float(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+    idempotency_lease_seconds: float = float(os.getenv('IDEMPOTENCY_LEASE_SECONDS', '30'))
+    idempotency_wait_seconds: float = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '10'))
+    idempotency_max_entries: int = int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', '10000'))
+    batch_get_max_ids: int = int(os.getenv('BATCH_GET_MAX_IDS', '100'))
+    batch_get_concurrency: int = int(os.getenv('BATCH_GET_CONCURRENCY', '8'))
+    job_poller_enabled: bool = os.getenv('JOB_POLLER_ENABLED', 'true').lower() == 'true'
+    job_poll_min_interval_ms: float = float(os.getenv('JOB_POLL_MIN_INTERVAL_MS', '250'))
+    job_poll_max_interval_ms: float = float(os.getenv('JOB_POLL_MAX_INTERVAL_MS', '5000'))
+    job_poll_idle_seconds: float = float(os.getenv('JOB_POLL_IDLE_SECONDS', '30'))
+    job_terminal_ttl_seconds: float = float(os.getenv('JOB_TERMINAL_TTL_SECONDS', '60'))
+    job_wait_max_seconds: float = float(os.getenv('JOB_WAIT_MAX_SECONDS', '60'))
+    warmup_enabled: bool = os.getenv('WARMUP_ENABLED', 'false').lower() == 'true'
+    warmup_connections: int = int(os.getenv('WARMUP_CONNECTIONS', '4'))
+    warmup_interval_seconds: float = float(os.getenv('WARMUP_INTERVAL_SECONDS', '4'))
+    warmup_timeout_seconds: float = float(os.getenv('WARMUP_TIMEOUT_SECONDS', '10'))
+    warmup_probe_path: str = os.getenv('WARMUP_PROBE_PATH', '/')
+    warmup_probe_timeout_seconds: float = float(os.getenv('WARMUP_PROBE_TIMEOUT_SECONDS', '2'))
+    readiness_max_age_seconds: float = float(os.getenv('READINESS_MAX_AGE_SECONDS', '15'))
+    compression_enabled: bool = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    compression_min_bytes: int = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+    compression_encodings: str = os.getenv('COMPRESSION_ENCODINGS', 'br,zstd,gzip')
+    compression_gzip_level: int = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+    compression_brotli_quality: int = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
+    compression_zstd_level: int = int(os.getenv('COMPRESSION_ZSTD_LEVEL', '3'))
+    compression_cache_max_bytes: int = int(os.getenv('COMPRESSION_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+    server_timing_enabled: bool = os.getenv('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+    items_stream_passthrough: bool = os.getenv('ITEMS_STREAM_PASSTHROUGH', 'true').lower() == 'true'
+    items_stream_etag_fallback: str = os.getenv('ITEMS_STREAM_ETAG_FALLBACK', 'precompute')
+    fk_fanout_mode: str = os.getenv('FK_FANOUT_MODE', 'threaded')
+    fk_fanout_workers: int = int(os.getenv('FK_FANOUT_WORKERS', '16'))
+    breaker_enabled: bool = os.getenv('BREAKER_ENABLED', 'true').lower() == 'true'
+    breaker_window_size: int = int(os.getenv('BREAKER_WINDOW_SIZE', '20'))
+    breaker_minimum_calls: int = int(os.getenv('BREAKER_MINIMUM_CALLS', '10'))
+    breaker_failure_rate: float = float(os.getenv('BREAKER_FAILURE_RATE', '0.5'))
+    breaker_slow_call_rate: float = float(os.getenv('BREAKER_SLOW_CALL_RATE', '0.8'))
+    breaker_slow_call_seconds: float = float(os.getenv('BREAKER_SLOW_CALL_SECONDS', '2'))
+    breaker_open_seconds: float = float(os.getenv('BREAKER_OPEN_SECONDS', '15'))
+    breaker_half_open_calls: int = int(os.getenv('BREAKER_HALF_OPEN_CALLS', '3'))
+    retry_budget_ratio: float = float(os.getenv('RETRY_BUDGET_RATIO', '0.2'))
+    retry_budget_min_retries: int = int(os.getenv('RETRY_BUDGET_MIN_RETRIES', '5'))
+    retry_budget_window_seconds: int = int(os.getenv('RETRY_BUDGET_WINDOW_SECONDS', '10'))
+    hedging_enabled: bool = os.getenv('HEDGING_ENABLED', 'false').lower() == 'true'
+    hedge_percentile: float = float(os.getenv('HEDGE_PERCENTILE', '95'))
+    hedge_min_delay_ms: float = float(os.getenv('HEDGE_MIN_DELAY_MS', '10'))
+    hedge_max_delay_ms: float = float(os.getenv('HEDGE_MAX_DELAY_MS', '1000'))
+    hedge_min_samples: int = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+    hedge_budget_ratio: float = float(os.getenv('HEDGE_BUDGET_RATIO', '0.1'))
+    singleflight_enabled: bool = os.getenv('SINGLEFLIGHT_ENABLED', 'true').lower() == 'true'
+    response_cache_enabled: bool = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    response_cache_max_entries: int = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '2048'))
+    response_cache_max_bytes: int = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+    response_cache_default_ttl_seconds: float = float(os.getenv('RESPONSE_CACHE_DEFAULT_TTL_SECONDS', '0'))
+    cache_backend: str = os.getenv('CACHE_BACKEND', 'none')
+    cache_backend_ttl_seconds: float = float(os.getenv('CACHE_BACKEND_TTL_SECONDS', '300'))
+    cache_sqlite_path: str = os.getenv('CACHE_SQLITE_PATH', '/tmp/composite-cache.sqlite3')
+    cache_sqlite_max_entries: int = int(os.getenv('CACHE_SQLITE_MAX_ENTRIES', '20000'))
+    cache_sqlite_max_bytes: int = int(os.getenv('CACHE_SQLITE_MAX_BYTES', str(256 * 1024 * 1024)))
+    cache_redis_url: str = os.getenv('CACHE_REDIS_URL', 'redis://127.0.0.1:6379/0')
+    cache_redis_prefix: str = os.getenv('CACHE_REDIS_PREFIX', 'composite:')
+    response_cache_stale_while_revalidate_seconds: float = float(os.getenv('RESPONSE_CACHE_STALE_WHILE_REVALIDATE_SECONDS', '0'))
+    response_cache_stale_if_error_seconds: float = float(os.getenv('RESPONSE_CACHE_STALE_IF_ERROR_SECONDS', '300'))
+    fields_pushdown: str = os.getenv('FIELDS_PUSHDOWN', '')
 
     def clamp_page_size(self, size: Optional[int]) -> int:
         """Clamp page size to valid range."""
@@ -31,6 +114,10 @@ class Settings(BaseSettings):
             return self.default_page_size
         return min(max(1, size), self.max_page_size)
 
+    def pushes_fields(self, service: str) -> bool:
+        """Whether ``service`` (users, catalog, orders) understands ``?fields=``."""
+        return service in {name.strip() for name in self.fields_pushdown.split(",")}
+
     class Config:
         """Pydantic configuration."""
         case_sensitive = False
@@ -0,0 +1,104 @@
+"""Dependency-graph executor for composite calls.
+
+Each step names the steps it needs and starts as soon as they have finished,
+receiving their results. The first step to fail cancels everything still in
+flight and its error is re-raised, so a fatal FK error does not wait for
+sibling lookups. Per-step timings are kept so callers can report the critical
+path that actually bounded the request.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Sequence, Tuple
+
+StepFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    run: StepFn
+    after: Tuple[str, ...] = ()
+
+
+@dataclass
+class StepTiming:
+    started: float
+    finished: float
+
+    @property
+    def duration_ms(self) -> int:
+        return int((self.finished - self.started) * 1000)
+
+
+@dataclass
+class DagResult:
+    results: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, StepTiming] = field(default_factory=dict)
+    started: float = 0.0
+
+    def finished_ms(self, names: Iterable[str]) -> int:
+        """Milliseconds from the start of the run until all ``names`` finished."""
+        return int((max(self.timings[name].finished for name in names) - self.started) * 1000)
+
+    def critical_path(self, steps: Sequence[Step]) -> List[str]:
+        """Steps on the chain that ended last, following each step's slowest dependency."""
+        if not self.timings:
+            return []
+        after = {step.name: step.after for step in steps}
+        name = max(self.timings, key=lambda step: self.timings[step].finished)
+        path = [name]
+        while after.get(name):
+            name = max(after[name], key=lambda dep: self.timings[dep].finished)
+            path.append(name)
+        return path[::-1]
+
+
+def _check(steps: Sequence[Step]) -> None:
+    names = [step.name for step in steps]
+    if len(set(names)) != len(names):
+        raise ValueError("duplicate step names")
+    done: set = set()
+    pending = list(steps)
+    while pending:
+        ready = [step for step in pending if set(step.after) <= done]
+        if not ready:
+            unknown = {dep for step in pending for dep in step.after} - set(names)
+            raise ValueError(
+                f"unknown dependencies: {sorted(unknown)}" if unknown else "dependency cycle"
+            )
+        done.update(step.name for step in ready)
+        pending = [step for step in pending if step.name not in done]
+
+
+async def run_dag(steps: Sequence[Step]) -> DagResult:
+    _check(steps)
+    result = DagResult(started=time.perf_counter())
+    waiting = list(steps)
+    running: Dict["asyncio.Task[Any]", str] = {}
+    started: Dict[str, float] = {}
+
+    def launch() -> None:
+        for step in [s for s in waiting if all(dep in result.results for dep in s.after)]:
+            waiting.remove(step)
+            started[step.name] = time.perf_counter()
+            inputs = {dep: result.results[dep] for dep in step.after}
+            running[asyncio.ensure_future(step.run(inputs))] = step.name
+
+    launch()
+    try:
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                finished = time.perf_counter()
+                result.timings[name] = StepTiming(started[name], finished)
+                # Raising here cancels the siblings in the finally block below.
+                result.results[name] = task.result()
+            launch()
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    return result
@@ -0,0 +1,78 @@
+"""Request-scoped deadlines shared with every upstream call.
+
+The absolute deadline lives in a contextvar so ``request_with_retry`` can cap
+each attempt and skip retries that would overrun the caller's budget without
+the deadline being threaded through every signature.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from typing import Any, Callable, Dict, Iterator, Optional
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+_DEADLINE_HEADER_KEY = DEADLINE_HEADER.lower().encode("latin-1")
+
+_deadline: ContextVar[Optional[float]] = ContextVar("composite_deadline", default=None)
+
+
+def budget_from_header(value: Optional[str], default_ms: float) -> Optional[float]:
+    """Seconds of budget from a header value in ms, falling back to ``default_ms``."""
+    if value:
+        try:
+            ms = float(value)
+        except ValueError:
+            ms = default_ms
+    else:
+        ms = default_ms
+    return ms / 1000 if ms > 0 else None
+
+
+def remaining() -> Optional[float]:
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def without_deadline() -> Context:
+    """A copy of the current context with no deadline, for work shared by requests."""
+    context = copy_context()
+    context.run(_deadline.set, None)
+    return context
+
+
+@contextmanager
+def scope(seconds: Optional[float], *, override: bool = True) -> Iterator[None]:
+    """Run the block under a ``seconds`` budget.
+
+    With ``override=False`` an already-active deadline is left untouched, which
+    lets endpoints apply their own default only when the caller gave none.
+    """
+    if seconds is None or (not override and _deadline.get() is not None):
+        yield
+        return
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware scoping each request to its deadline budget."""
+
+    def __init__(self, app: Callable, *, default_ms: Callable[[], float]) -> None:
+        self.app = app
+        self.default_ms = default_ms
+
+    async def __call__(self, asgi_scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if asgi_scope["type"] != "http":
+            await self.app(asgi_scope, receive, send)
+            return
+        header = None
+        for name, value in asgi_scope.get("headers", ()):
+            if name == _DEADLINE_HEADER_KEY:
+                header = value.decode("latin-1")
+                break
+        with scope(budget_from_header(header, self.default_ms())):
+            await self.app(asgi_scope, receive, send)
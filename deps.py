@@ -10,6 +10,49 @@ def get_http_client(request: Request):
     return client
 
 
+def get_fanout_engine(request: Request):
+    engine = getattr(request.app.state, "fanout", None)
+    if engine is None:
+        raise RuntimeError("Fan-out engine not configured on application state")
+    return engine
+
+
+def get_response_cache(request: Request):
+    return getattr(request.app.state, "response_cache", None)
+
+
+def get_singleflight(request: Request):
+    return getattr(request.app.state, "singleflight", None)
+
+
+def get_negative_cache(request: Request):
+    return getattr(request.app.state, "fk_negative_cache", None)
+
+
+def get_idempotency_store(request: Request):
+    return getattr(request.app.state, "idempotency_store", None)
+
+
+def get_search_overflow(request: Request):
+    return getattr(request.app.state, "search_overflow", None)
+
+
+def get_search_cache(request: Request):
+    return getattr(request.app.state, "search_cache", None)
+
+
+def get_catalog_replica(request: Request):
+    return getattr(request.app.state, "catalog_replica", None)
+
+
+def get_job_poller(request: Request):
+    return getattr(request.app.state, "job_poller", None)
+
+
+def get_warmer(request: Request):
+    return getattr(request.app.state, "warmer", None)
+
+
 def get_settings_from_app(request: Request) -> Settings:
     settings = getattr(request.app.state, "settings", None)
     if settings is None:
@@ -3,6 +3,8 @@ from typing import Any, Optional
 from fastapi import HTTPException
 from pydantic import BaseModel
 
+import tracing
+
 
 class ErrorEnvelope(BaseModel):
     code: str
@@ -21,11 +23,14 @@ def http_error(
     message: str,
     details: Any | None = None,
     trace_id: str | None = None,
+    headers: dict[str, str] | None = None,
 ) -> HTTPException:
     envelope = ErrorEnvelope(
         code=code,
         message=message,
         details=details,
-        traceId=trace_id,
+        traceId=trace_id or tracing.current_trace_id(),
+    )
+    return HTTPException(
+        status_code=status_code, detail=envelope.as_dict(), headers=headers
     )
-    return HTTPException(status_code=status_code, detail=envelope.as_dict())
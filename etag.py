@@ -12,3 +12,12 @@ def combined_etag(etags: list[str]) -> str | None:
         return None
     canon=",".join(sorted(parts))
     return strong_etag_bytes(canon.encode())
+
+def etag_matches(if_none_match: str | None, etag: str | None) -> bool:
+    """Weak comparison of an If-None-Match header against a current ETag."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip()=="*":
+        return True
+    current=etag.strip().removeprefix("W/")
+    return any(c.strip().removeprefix("W/")==current for c in if_none_match.split(","))
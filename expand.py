@@ -0,0 +1,86 @@
+"""``?expand=`` support for order reads.
+
+Orders only carry ``userId``/``itemId``. ``expand_orders`` fetches the
+referenced users and items (each distinct ID once, all kinds in parallel,
+through the same ``batch_get`` fan-out as the ``:batchGet`` endpoints) and
+embeds them under ``user``/``item``. A reference that cannot be fetched is
+embedded as ``null`` with its error envelope under ``expandErrors`` instead of
+failing the read.
+
+For every order it also returns the parts its combined ETag is built from: the
+embedded entities' ETags plus a ``missing:`` marker per failed reference, so
+the expanded representation validates independently of the bare order.
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from batch import Fetch, batch_get
+from error_model import http_error
+from negative_cache import NegativeCache
+
+# expand name -> (order field, negative-cache kind, not-found code, message)
+EXPANSIONS = {
+    "user": ("userId", "users", "USER_NOT_FOUND", "User not found"),
+    "item": ("itemId", "items", "ITEM_NOT_FOUND", "Item not found"),
+}
+
+
+def parse_expand(value: Optional[str]) -> List[str]:
+    """Requested expansions in canonical order; unknown names are a 400."""
+    if not value:
+        return []
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = sorted(names - EXPANSIONS.keys())
+    if unknown:
+        raise http_error(
+            400,
+            code="INVALID_EXPAND",
+            message=f"expand accepts {', '.join(EXPANSIONS)}",
+            details={"unknown": unknown},
+        )
+    return [name for name in EXPANSIONS if name in names]
+
+
+def reference_fields(names: List[str]) -> List[str]:
+    """Order fields the requested expansions read."""
+    return [EXPANSIONS[name][0] for name in names]
+
+
+async def expand_orders(
+    orders: List[Dict[str, Any]],
+    names: List[str],
+    fetchers: Dict[str, Fetch],
+    *,
+    concurrency: int,
+    negative: Optional[NegativeCache] = None,
+) -> List[List[str]]:
+    """Embed ``names`` into ``orders`` in place; return each order's ETag parts."""
+
+    async def fetch(name: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        field, kind, code, message = EXPANSIONS[name]
+        ids = list(dict.fromkeys(order[field] for order in orders if order.get(field)))
+        results, errors = await batch_get(
+            ids,
+            fetchers[name],
+            concurrency=concurrency,
+            not_found_code=code,
+            not_found_message=message,
+        )
+        if negative is not None:
+            negative.observe_batch(kind, results, errors)
+        return results, errors
+
+    outcomes = await asyncio.gather(*(fetch(name) for name in names))
+    parts: List[List[str]] = [[] for _ in orders]
+    for name, (results, errors) in zip(names, outcomes):
+        field = EXPANSIONS[name][0]
+        for order, order_parts in zip(orders, parts):
+            ref = order.get(field)
+            entry = results.get(ref) if ref else None
+            order[name] = entry["data"] if entry else None
+            if entry:
+                order_parts.append(entry["etag"])
+            elif ref in errors:
+                order.setdefault("expandErrors", {})[name] = errors[ref]
+                order_parts.append(f"missing:{name}:{ref}")
+    return parts
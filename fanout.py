@@ -0,0 +1,108 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+import httpx
+
+from config import Settings
+from http_client import create_sync_client, request_with_retry, request_with_retry_sync
+from response_cache import ResponseCache
+from singleflight import SingleFlight, request_key
+
+FANOUT_MODES = ("threaded", "async")
+
+
+class FanoutEngine:
+    """Run FK lookups over connection pools that live for the whole process.
+
+    ``threaded`` mode dispatches onto a dedicated, sized executor backed by one
+    long-lived sync client; ``async`` mode reuses the shared AsyncClient. With a
+    ``cache`` the lookups share the response cache, including its stale serving.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        async_client: httpx.AsyncClient,
+        *,
+        mode: Optional[str] = None,
+        singleflight: Optional[SingleFlight] = None,
+        cache: Optional[ResponseCache] = None,
+    ) -> None:
+        self.settings = settings
+        self.singleflight = singleflight
+        self.cache = cache
+        self.mode = (mode or settings.fk_fanout_mode).lower()
+        if self.mode not in FANOUT_MODES:
+            raise ValueError(f"unknown fan-out mode: {self.mode!r}")
+        self._async_client = async_client
+        self._sync_client: Optional[httpx.Client] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if self.threaded:
+            workers = max(1, settings.fk_fanout_workers)
+            self._sync_client = create_sync_client(
+                settings,
+                max_keepalive_connections=workers,
+                max_connections=workers,
+            )
+            self._executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="fk-fanout"
+            )
+
+    @property
+    def threaded(self) -> bool:
+        return self.mode == "threaded"
+
+    @property
+    def sync_client(self) -> Optional[httpx.Client]:
+        return self._sync_client
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        if self.cache is not None and set(kwargs) <= {"headers"}:
+            return await self.cache.fetch_with(
+                url,
+                lambda headers, retries: self._shared_get(url, retries, headers=headers),
+                retries=self.settings.http_retries,
+                headers=kwargs.get("headers"),
+            )
+        return await self._shared_get(url, self.settings.http_retries, **kwargs)
+
+    async def _shared_get(self, url: str, retries: int, **kwargs: Any) -> httpx.Response:
+        if self.singleflight is None:
+            return await self._get(url, retries, **kwargs)
+        key = request_key(
+            "GET", url, params=kwargs.get("params"), headers=kwargs.get("headers")
+        )
+        return await self.singleflight.do(key, lambda: self._get(url, retries, **kwargs))
+
+    async def _get(self, url: str, retries: int, **kwargs: Any) -> httpx.Response:
+        if not self.threaded:
+            return await request_with_retry(
+                self._async_client,
+                "GET",
+                url,
+                retries=retries,
+                **kwargs,
+            )
+        call = functools.partial(
+            request_with_retry_sync,
+            self._sync_client,
+            "GET",
+            url,
+            retries=retries,
+            **kwargs,
+        )
+        # Run in a copy of the caller's context so the request deadline and
+        # timing collector follow the lookup onto the worker thread.
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(context.run, call)
+        )
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._sync_client is not None:
+            self._sync_client.close()
@@ -0,0 +1,139 @@
+"""Sparse fieldsets: ``?fields=`` projection of composite responses.
+
+``fields`` is a comma-separated list of names; dotted paths reach into nested
+objects (``user.email`` on an expanded order) and lists are projected element
+by element. ``id`` is always kept so clients can still address what they got.
+
+The projection runs on the decoded body before it is serialized, so both the
+payload and the serialization time shrink with the fields removed. Services
+listed in ``FIELDS_PUSHDOWN`` also get ``fields=`` on the upstream call and can
+skip the work themselves; the composite projects again either way, so a
+service that ignores the parameter is harmless.
+
+A projected representation has its own ETag: the full representation's ETag
+combined with the canonical field list.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import httpx
+from fastapi import Response
+
+import server_timing
+from conditional import check_not_modified
+from config import Settings
+from error_model import http_error
+from etag import combined_etag
+from http_client import copy_headers
+
+ALWAYS = ("id",)
+
+
+@dataclass(frozen=True)
+class Fieldset:
+    paths: Tuple[str, ...]
+    tree: Dict[str, Any]
+
+    @property
+    def param(self) -> str:
+        return ",".join(self.paths)
+
+    def project(self, doc: Any) -> Any:
+        return _project(doc, self.tree)
+
+    def project_rows(self, body: Dict[str, Any], key: str) -> Dict[str, Any]:
+        """Project the rows of a list page, keeping its paging fields."""
+        rows = body.get(key)
+        if not isinstance(rows, list):
+            return body
+        return {**body, key: [self.project(row) for row in rows]}
+
+    def project_results(self, results: Dict[str, Dict[str, Any]]) -> None:
+        """Project ``batch_get`` results in place, re-keying their ETags."""
+        for entry in results.values():
+            entry["data"] = self.project(entry["data"])
+            entry["etag"] = self.etag(entry["etag"])
+
+    def etag(self, etag: Optional[str]) -> Optional[str]:
+        return combined_etag([etag, f"fields:{self.param}"]) if etag else None
+
+    def upstream_param(self, required: Iterable[str] = ()) -> str:
+        return ",".join(sorted({path.split(".", 1)[0] for path in self.paths} | set(required)))
+
+
+def parse_fields(value: Optional[str]) -> Optional[Fieldset]:
+    if value is None:
+        return None
+    requested = {path.strip() for path in value.split(",") if path.strip()}
+    invalid = sorted(path for path in requested if not all(path.split(".")))
+    if invalid or not requested:
+        raise http_error(
+            400,
+            code="INVALID_FIELDS",
+            message="fields must be a comma-separated list of names or dotted paths",
+            details={"invalid": invalid},
+        )
+    paths = sorted(requested | set(ALWAYS))
+    tree: Dict[str, Any] = {}
+    # Shorter paths sort first, so "user" wins over "user.email".
+    for path in sorted(paths, key=lambda p: p.count(".")):
+        node: Optional[Dict[str, Any]] = tree
+        *parents, leaf = path.split(".")
+        for part in parents:
+            if part in node and node[part] is None:
+                node = None
+                break
+            node = node.setdefault(part, {})
+        if node is not None:
+            node[leaf] = None
+    return Fieldset(tuple(paths), tree)
+
+
+def upstream_url(
+    url: str,
+    fieldset: Optional[Fieldset],
+    settings: Settings,
+    service: str,
+    required: Iterable[str] = (),
+) -> str:
+    """``url`` with the top-level names pushed down when ``service`` supports it.
+
+    ``required`` names are fields the composite itself needs (e.g. foreign
+    keys to expand) even if the client did not ask for them.
+    """
+    if fieldset is None or not settings.pushes_fields(service):
+        return url
+    return str(httpx.URL(url, params={"fields": fieldset.upstream_param(required)}))
+
+
+def projected_response(
+    upstream: httpx.Response,
+    etag: str,
+    fieldset: Fieldset,
+    if_none_match: Optional[str],
+    *,
+    rows: Optional[str] = None,
+    allow: Sequence[str] = (),
+) -> Response:
+    """Answer a GET with the projected upstream body (or a 304 on its ETag)."""
+    etag = fieldset.etag(etag)
+    if unchanged := check_not_modified(if_none_match, etag, upstream.headers):
+        return unchanged
+    body = server_timing.json_body(upstream)
+    payload = fieldset.project_rows(body, rows) if rows else fieldset.project(body)
+    response = server_timing.TimedJSONResponse(payload, status_code=upstream.status_code)
+    response.headers["ETag"] = etag
+    copy_headers(upstream.headers, response.headers, allow=list(allow))
+    return response
+
+
+def _project(doc: Any, tree: Dict[str, Any]) -> Any:
+    if isinstance(doc, list):
+        return [_project(item, tree) for item in doc]
+    if not isinstance(doc, dict):
+        return doc
+    projected: Dict[str, Any] = {}
+    for name, subtree in tree.items():
+        if name in doc:
+            projected[name] = doc[name] if subtree is None else _project(doc[name], subtree)
+    return projected
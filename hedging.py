@@ -0,0 +1,169 @@
+"""Hedged requests for idempotent upstream reads.
+
+If a GET has not answered within a per-upstream latency percentile, a second
+copy is sent and whichever returns first wins. Hedges are paid for from a token
+bucket that refills by ``budget_ratio`` per request, so at most that fraction
+of traffic is ever duplicated.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from config import Settings
+from singleflight import IDEMPOTENT_METHODS
+
+_SAMPLES = 256
+_RECOMPUTE_EVERY = 16
+
+
+class LatencyWindow:
+    """Fixed ring of recent latencies with a lazily refreshed percentile."""
+
+    __slots__ = ("_samples", "_index", "_count", "_since_recompute", "_cached")
+
+    def __init__(self) -> None:
+        self._samples: List[float] = [0.0] * _SAMPLES
+        self._index = 0
+        self._count = 0
+        self._since_recompute = 0
+        self._cached: Dict[float, float] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def observe(self, seconds: float) -> None:
+        self._samples[self._index] = seconds
+        self._index = (self._index + 1) % _SAMPLES
+        self._count = min(self._count + 1, _SAMPLES)
+        self._since_recompute += 1
+        if self._since_recompute >= _RECOMPUTE_EVERY:
+            self._cached.clear()
+            self._since_recompute = 0
+
+    def percentile(self, pct: float) -> float:
+        value = self._cached.get(pct)
+        if value is None:
+            ordered = sorted(self._samples[: self._count])
+            rank = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+            value = self._cached[pct] = ordered[rank]
+        return value
+
+
+class Hedger:
+    def __init__(
+        self,
+        *,
+        enabled: bool = False,
+        percentile: float = 95.0,
+        min_delay: float = 0.01,
+        max_delay: float = 1.0,
+        min_samples: int = 20,
+        budget_ratio: float = 0.1,
+        budget_cap: float = 10.0,
+    ) -> None:
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.budget_ratio = budget_ratio
+        self.budget_cap = budget_cap
+        self._tokens = budget_cap
+        self._windows: Dict[str, LatencyWindow] = {}
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+    def configure(self, settings: Settings) -> None:
+        self.enabled = settings.hedging_enabled
+        self.percentile = settings.hedge_percentile
+        self.min_delay = settings.hedge_min_delay_ms / 1000
+        self.max_delay = settings.hedge_max_delay_ms / 1000
+        self.min_samples = settings.hedge_min_samples
+        self.budget_ratio = settings.hedge_budget_ratio
+        self.clear()
+
+    def clear(self) -> None:
+        self._windows.clear()
+        self._tokens = self.budget_cap
+        self.hedged = self.hedge_wins = self.budget_denied = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "hedged": self.hedged,
+            "hedgeWins": self.hedge_wins,
+            "budgetDenied": self.budget_denied,
+            "delaysMs": {
+                host: round(delay * 1000, 2)
+                for host in sorted(self._windows)
+                if (delay := self.delay_for(host)) is not None
+            },
+        }
+
+    def delay_for(self, host: str) -> Optional[float]:
+        window = self._windows.get(host)
+        if window is None or len(window) < self.min_samples:
+            return None
+        return min(self.max_delay, max(self.min_delay, window.percentile(self.percentile)))
+
+    def observe(self, host: str, seconds: float) -> None:
+        window = self._windows.get(host)
+        if window is None:
+            window = self._windows[host] = LatencyWindow()
+        window.observe(seconds)
+
+    async def request(
+        self, client: httpx.AsyncClient, method: str, url: str, **kwargs: Any
+    ) -> httpx.Response:
+        if not self.enabled or method.upper() not in IDEMPOTENT_METHODS:
+            return await client.request(method, url, **kwargs)
+
+        host = httpx.URL(url).netloc.decode("ascii")
+        self._tokens = min(self.budget_cap, self._tokens + self.budget_ratio)
+        delay = self.delay_for(host)
+        started = time.perf_counter()
+        if delay is None:
+            response = await client.request(method, url, **kwargs)
+            self.observe(host, time.perf_counter() - started)
+            return response
+
+        primary = asyncio.ensure_future(client.request(method, url, **kwargs))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or self._tokens < 1:
+                if not done:
+                    self.budget_denied += 1
+                response = await primary
+                self.observe(host, time.perf_counter() - started)
+                return response
+
+            self._tokens -= 1
+            self.hedged += 1
+            backup = asyncio.ensure_future(client.request(method, url, **kwargs))
+            pending.add(backup)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge_wins += 1
+                            self.observe(host, time.perf_counter() - started - delay)
+                        else:
+                            self.observe(host, time.perf_counter() - started)
+                        return task.result()
+                    error = error or task.exception()
+            assert error is not None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+HEDGER = Hedger()
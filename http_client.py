@@ -1,10 +1,19 @@
 import asyncio
 import random
-from typing import Any, Mapping, MutableMapping, Sequence
+import time
+from typing import Any, Awaitable, Callable, Mapping, MutableMapping, Optional, Sequence
 
 import httpx
 
+import deadline
+import metrics
+import server_timing
+import tracing
+from circuit_breaker import UPSTREAMS, CircuitOpenError, UpstreamGuard
 from config import Settings
+from error_model import http_error
+from hedging import HEDGER
+from singleflight import IDEMPOTENT_METHODS, SingleFlight, request_key
 
 DEFAULT_BACKOFF_SECONDS = 0.05
 
@@ -14,14 +23,27 @@ def create_async_client(settings: Settings) -> httpx.AsyncClient:
 
     return httpx.AsyncClient(
         timeout=settings.http_timeout_seconds,
-        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        limits=httpx.Limits(
+            max_keepalive_connections=20,
+            max_connections=100,
+            keepalive_expiry=settings.http_keepalive_expiry_seconds,
+        ),
     )
 
 
-def create_sync_client(settings: Settings) -> httpx.Client:
+def create_sync_client(
+    settings: Settings,
+    *,
+    max_keepalive_connections: int = 10,
+    max_connections: int = 40,
+) -> httpx.Client:
     return httpx.Client(
         timeout=settings.http_timeout_seconds,
-        limits=httpx.Limits(max_keepalive_connections=10, max_connections=40),
+        limits=httpx.Limits(
+            max_keepalive_connections=max_keepalive_connections,
+            max_connections=max_connections,
+            keepalive_expiry=settings.http_keepalive_expiry_seconds,
+        ),
     )
 
 
@@ -32,21 +54,126 @@ async def request_with_retry(
     *,
     retries: int,
     backoff: float = DEFAULT_BACKOFF_SECONDS,
+    singleflight: Optional[SingleFlight] = None,
     **kwargs: Any,
 ) -> httpx.Response:
+    if singleflight is not None and method.upper() in IDEMPOTENT_METHODS:
+        key = request_key(
+            method, url, params=kwargs.get("params"), headers=kwargs.get("headers")
+        )
+        return await _within_deadline(
+            singleflight.do(
+                key,
+                lambda: request_with_retry(
+                    client, method, url, retries=retries, backoff=backoff, **kwargs
+                ),
+            )
+        )
+
+    kwargs = tracing.with_trace_header(kwargs)
+    guard = UPSTREAMS.for_url(url)
+    upstream = metrics.upstream_name(url)
     attempt = 0
     while True:
+        _admit(guard)
+        started = time.perf_counter()
         try:
-            response = await client.request(method, url, **kwargs)
+            response = await _within_deadline(
+                _timed(
+                    lambda: HEDGER.request(
+                        client,
+                        method,
+                        url,
+                        **server_timing.trace_kwargs(kwargs, upstream, is_async=True),
+                    ),
+                    upstream,
+                    method,
+                    attempt,
+                ),
+                on_timeout=lambda: _record(guard, failed=True, started=started),
+            )
         except httpx.RequestError:
-            if attempt >= retries:
+            _record(guard, failed=True, started=started)
+            delay = _backoff_delay(backoff, attempt)
+            if not _may_retry(guard, attempt, retries, delay):
                 raise
-            await asyncio.sleep(_backoff_delay(backoff, attempt))
+            metrics.UPSTREAM_RETRIES.labels(upstream, "transport").inc()
+            await asyncio.sleep(delay)
             attempt += 1
             continue
+        except BaseException:
+            _release(guard)
+            raise
 
-        if response.status_code >= 500 and attempt < retries:
-            await asyncio.sleep(_backoff_delay(backoff, attempt))
+        _record(guard, failed=response.status_code >= 500, started=started)
+        delay = _backoff_delay(backoff, attempt)
+        if response.status_code >= 500 and _may_retry(guard, attempt, retries, delay):
+            metrics.UPSTREAM_RETRIES.labels(upstream, "5xx").inc()
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+
+        return response
+
+
+async def open_stream(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    *,
+    retries: int,
+    backoff: float = DEFAULT_BACKOFF_SECONDS,
+    **kwargs: Any,
+) -> httpx.Response:
+    """Like ``request_with_retry`` but return as soon as headers arrive.
+
+    The body is left unread; the caller owns the response and must ``aclose`` it.
+    Retries only happen before any body bytes have been handed out.
+    """
+
+    kwargs = tracing.with_trace_header(kwargs)
+    guard = UPSTREAMS.for_url(url)
+    upstream = metrics.upstream_name(url)
+    attempt = 0
+    while True:
+        _admit(guard)
+        started = time.perf_counter()
+        try:
+            response = await _within_deadline(
+                _timed(
+                    lambda: client.send(
+                        client.build_request(
+                            method,
+                            url,
+                            **server_timing.trace_kwargs(kwargs, upstream, is_async=True),
+                        ),
+                        stream=True,
+                    ),
+                    upstream,
+                    method,
+                    attempt,
+                ),
+                on_timeout=lambda: _record(guard, failed=True, started=started),
+            )
+        except httpx.RequestError:
+            _record(guard, failed=True, started=started)
+            delay = _backoff_delay(backoff, attempt)
+            if not _may_retry(guard, attempt, retries, delay):
+                raise
+            metrics.UPSTREAM_RETRIES.labels(upstream, "transport").inc()
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        except BaseException:
+            _release(guard)
+            raise
+
+        _record(guard, failed=response.status_code >= 500, started=started)
+        delay = _backoff_delay(backoff, attempt)
+        if response.status_code >= 500 and _may_retry(guard, attempt, retries, delay):
+            metrics.UPSTREAM_RETRIES.labels(upstream, "5xx").inc()
+            await response.aclose()
+            await asyncio.sleep(delay)
             attempt += 1
             continue
 
@@ -62,24 +189,86 @@ def request_with_retry_sync(
     backoff: float = DEFAULT_BACKOFF_SECONDS,
     **kwargs: Any,
 ) -> httpx.Response:
+    kwargs = tracing.with_trace_header(kwargs)
+    guard = UPSTREAMS.for_url(url)
+    upstream = metrics.upstream_name(url)
     attempt = 0
     while True:
+        _admit(guard)
+        budget = deadline.remaining()
+        if budget is not None:
+            if budget <= 0:
+                raise _deadline_error()
+            kwargs["timeout"] = _capped_timeout(client, budget)
+        started = time.perf_counter()
         try:
-            response = client.request(method, url, **kwargs)
+            response = _timed_sync(
+                lambda: client.request(
+                    method, url, **server_timing.trace_kwargs(kwargs, upstream, is_async=False)
+                ),
+                upstream,
+                method,
+                attempt,
+            )
         except httpx.RequestError:
-            if attempt >= retries:
+            _record(guard, failed=True, started=started)
+            delay = _backoff_delay(backoff, attempt)
+            if not _may_retry(guard, attempt, retries, delay):
                 raise
-            _sleep(_backoff_delay(backoff, attempt))
+            metrics.UPSTREAM_RETRIES.labels(upstream, "transport").inc()
+            _sleep(delay)
             attempt += 1
             continue
+        except BaseException:
+            _release(guard)
+            raise
 
-        if response.status_code >= 500 and attempt < retries:
-            _sleep(_backoff_delay(backoff, attempt))
+        _record(guard, failed=response.status_code >= 500, started=started)
+        delay = _backoff_delay(backoff, attempt)
+        if response.status_code >= 500 and _may_retry(guard, attempt, retries, delay):
+            metrics.UPSTREAM_RETRIES.labels(upstream, "5xx").inc()
+            _sleep(delay)
             attempt += 1
             continue
         return response
 
 
+async def _timed(
+    call: Callable[[], Awaitable[httpx.Response]], upstream: str, method: str, attempt: int
+) -> httpx.Response:
+    in_flight = metrics.UPSTREAM_IN_FLIGHT.labels(upstream)
+    started = time.perf_counter()
+    status: Optional[int] = None
+    in_flight.inc()
+    try:
+        response = await call()
+        status = response.status_code
+        return response
+    finally:
+        in_flight.dec()
+        elapsed = time.perf_counter() - started
+        metrics.observe_upstream(upstream, method, status, attempt, elapsed)
+        server_timing.record_upstream(upstream, method, status, attempt, elapsed)
+
+
+def _timed_sync(
+    call: Callable[[], httpx.Response], upstream: str, method: str, attempt: int
+) -> httpx.Response:
+    in_flight = metrics.UPSTREAM_IN_FLIGHT.labels(upstream)
+    started = time.perf_counter()
+    status: Optional[int] = None
+    in_flight.inc()
+    try:
+        response = call()
+        status = response.status_code
+        return response
+    finally:
+        in_flight.dec()
+        elapsed = time.perf_counter() - started
+        metrics.observe_upstream(upstream, method, status, attempt, elapsed)
+        server_timing.record_upstream(upstream, method, status, attempt, elapsed)
+
+
 def copy_headers(
     src: Mapping[str, str],
     dest: MutableMapping[str, str],
@@ -92,6 +281,83 @@ def copy_headers(
             dest[name] = value
 
 
+def _admit(guard: Optional[UpstreamGuard]) -> None:
+    if guard is None:
+        return
+    try:
+        guard.breaker.before_call()
+    except CircuitOpenError as exc:
+        retry_after = max(1, round(exc.retry_after))
+        raise http_error(
+            503,
+            code="UPSTREAM_CIRCUIT_OPEN",
+            message="Upstream service is temporarily unavailable",
+            details={"upstream": exc.upstream, "retryAfterSeconds": retry_after},
+            headers={"Retry-After": str(retry_after)},
+        ) from exc
+
+
+def _record(guard: Optional[UpstreamGuard], *, failed: bool, started: float) -> None:
+    if guard is not None:
+        guard.record(failed=failed, elapsed=time.perf_counter() - started)
+
+
+def _release(guard: Optional[UpstreamGuard]) -> None:
+    # Cancelled (DAG siblings, search deadlines, singleflight) or failed outside
+    # the transport: no outcome to record, but a half-open probe slot must not
+    # leak. A deadline timeout was already recorded by ``on_timeout`` and
+    # tripped a half-open breaker, so releasing after it is a no-op.
+    if guard is not None:
+        guard.breaker.release()
+
+
+def _may_retry(
+    guard: Optional[UpstreamGuard], attempt: int, retries: int, delay: float
+) -> bool:
+    if attempt >= retries:
+        return False
+    budget = deadline.remaining()
+    if budget is not None and delay >= budget:
+        return False
+    return guard is None or guard.budget.try_retry()
+
+
+def _deadline_error() -> Exception:
+    return http_error(
+        504,
+        code="DEADLINE_EXCEEDED",
+        message="Request deadline exceeded before the upstream answered",
+    )
+
+
+async def _within_deadline(
+    call: Awaitable[httpx.Response],
+    *,
+    on_timeout: Optional[Callable[[], None]] = None,
+) -> httpx.Response:
+    """Await ``call`` but give up once the request's deadline passes."""
+
+    budget = deadline.remaining()
+    if budget is None:
+        return await call
+    if budget <= 0:
+        if asyncio.iscoroutine(call):
+            call.close()
+        raise _deadline_error()
+    try:
+        async with asyncio.timeout(budget):
+            return await call
+    except TimeoutError:
+        if on_timeout is not None:
+            on_timeout()
+        raise _deadline_error() from None
+
+
+def _capped_timeout(client: httpx.Client, budget: float) -> httpx.Timeout:
+    configured = client.timeout.read
+    return httpx.Timeout(budget if configured is None else min(configured, budget))
+
+
 def _backoff_delay(base: float, attempt: int) -> float:
     jitter = random.uniform(0.0, base)
     return base * (2**attempt) + jitter
@@ -100,7 +366,5 @@ def _backoff_delay(base: float, attempt: int) -> float:
 def _sleep(seconds: float) -> None:
     """Separate function purely to help with monkeypatching in tests."""
 
-    import time
-
     time.sleep(seconds)
 
@@ -0,0 +1,424 @@
+"""``Idempotency-Key`` handling for ``POST /orders``.
+
+The first request with a key claims it and runs the pipeline; its successful
+response (status, body, ``Location``, ``ETag``) is stored for ``ttl`` seconds
+and replayed to every later request with the same key. Duplicates that arrive
+while the first is still running wait for it. A claim is a lease that the
+request holding it renews (``hold``) for as long as its pipeline runs, however
+slow; if the worker dies, the key becomes claimable again after ``lease``
+seconds. Attempts that fail before the order service accepted anything
+release the key so the client can retry; once the create call has been sent
+and its outcome is unknown (timeout, 5xx, a failure after the 201), the
+failure is stored and replayed like a success, so a retry can never create a
+second order.
+
+Reusing a key with a different request body is rejected with
+``422 IDEMPOTENCY_KEY_REUSED``; a duplicate that outwaits ``wait`` seconds gets
+``409 IDEMPOTENCY_KEY_IN_PROGRESS`` with ``Retry-After``.
+
+``MemoryIdempotencyStore`` serves one process. ``SqliteIdempotencyStore`` keeps
+keys in a WAL-mode SQLite file so every uvicorn worker on a host shares them.
+"""
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Response
+
+from config import Settings
+from error_model import http_error
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+STORED_HEADERS = ("Location", "ETag")
+MAX_KEY_LENGTH = 255
+
+CLAIMED = "claimed"
+PENDING = "pending"
+DONE = "done"
+
+
+def request_fingerprint(body: Any) -> str:
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class StoredResponse:
+    status_code: int
+    body: bytes
+    headers: Dict[str, str]
+    media_type: str = "application/json"
+
+    @classmethod
+    def capture(cls, response: Response) -> "StoredResponse":
+        return cls(
+            status_code=response.status_code,
+            body=bytes(response.body),
+            headers={
+                name: response.headers[name] for name in STORED_HEADERS if name in response.headers
+            },
+            media_type=response.media_type or "application/json",
+        )
+
+    @classmethod
+    def from_exception(cls, exc: BaseException) -> "StoredResponse":
+        if not isinstance(exc, HTTPException):
+            exc = http_error(
+                502,
+                code="ORDER_OUTCOME_UNKNOWN",
+                message="The order service did not confirm whether the order was created",
+            )
+        return cls(
+            status_code=exc.status_code,
+            body=json.dumps({"detail": exc.detail}).encode("utf-8"),
+            headers={},
+        )
+
+    def to_response(self) -> Response:
+        response = Response(
+            content=self.body,
+            status_code=self.status_code,
+            media_type=self.media_type,
+            headers=self.headers,
+        )
+        response.headers[REPLAYED_HEADER] = "true"
+        return response
+
+    def dumps(self) -> str:
+        return json.dumps(
+            {
+                "status": self.status_code,
+                "body": self.body.decode("utf-8"),
+                "headers": self.headers,
+                "mediaType": self.media_type,
+            }
+        )
+
+    @classmethod
+    def loads(cls, raw: str) -> "StoredResponse":
+        data = json.loads(raw)
+        return cls(
+            data["status"], data["body"].encode("utf-8"), data["headers"], data["mediaType"]
+        )
+
+
+class IdempotencyStore(ABC):
+    """Claim/complete/release protocol shared by the backends."""
+
+    poll_interval = 0.05
+
+    def __init__(
+        self,
+        *,
+        ttl: float,
+        lease: float,
+        wait: float,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl = ttl
+        self.lease = lease
+        self.wait = wait
+        self._clock = clock
+        self.claims = 0
+        self.replays = 0
+        self.waits = 0
+        self.conflicts = 0
+
+    async def acquire(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """Claim ``key`` (returns ``None``) or return the response stored under it."""
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise http_error(
+                400,
+                code="INVALID_IDEMPOTENCY_KEY",
+                message=f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters",
+            )
+        deadline = time.monotonic() + self.wait
+        waited = False
+        while True:
+            state, stored_fingerprint, stored = await self._claim(key, fingerprint)
+            if stored_fingerprint is not None and stored_fingerprint != fingerprint:
+                self.conflicts += 1
+                raise http_error(
+                    422,
+                    code="IDEMPOTENCY_KEY_REUSED",
+                    message=f"{IDEMPOTENCY_HEADER} was already used with a different request",
+                )
+            if state == CLAIMED:
+                self.claims += 1
+                return None
+            if state == DONE:
+                self.replays += 1
+                return stored
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise http_error(
+                    409,
+                    code="IDEMPOTENCY_KEY_IN_PROGRESS",
+                    message="A request with this Idempotency-Key is still being processed",
+                    headers={"Retry-After": "1"},
+                )
+            if not waited:
+                self.waits += 1
+                waited = True
+            await self._wait_for_change(key, remaining)
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        """Keep renewing the claim on ``key`` while the block runs."""
+        heartbeat = asyncio.get_running_loop().create_task(self._heartbeat(key))
+        try:
+            yield
+        finally:
+            heartbeat.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await heartbeat
+
+    @abstractmethod
+    async def renew(self, key: str) -> None:
+        """Extend an uncompleted claim on ``key`` by another ``lease``."""
+
+    @abstractmethod
+    async def complete(self, key: str, response: StoredResponse) -> None:
+        """Store ``response`` for replay under ``key``."""
+
+    @abstractmethod
+    async def release(self, key: str) -> None:
+        """Drop an uncompleted claim so the key can be retried."""
+
+    def clear(self) -> None:
+        self.claims = self.replays = self.waits = self.conflicts = 0
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "claims": self.claims,
+            "replays": self.replays,
+            "waits": self.waits,
+            "conflicts": self.conflicts,
+        }
+
+    @abstractmethod
+    async def _claim(
+        self, key: str, fingerprint: str
+    ) -> Tuple[str, Optional[str], Optional[StoredResponse]]:
+        """``(state, fingerprint of the existing entry, stored response)``."""
+
+    async def _wait_for_change(self, key: str, timeout: float) -> None:
+        await asyncio.sleep(min(self.poll_interval, timeout))
+
+    async def _heartbeat(self, key: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await self.renew(key)
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("renewing idempotency claim failed: %r", exc)
+
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    expires_at: float
+    response: Optional[StoredResponse] = None
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    def __init__(self, *, max_entries: int = 10000, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.max_entries = max_entries
+        self._entries: Dict[str, _Entry] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def renew(self, key: str) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.response is None:
+            entry.expires_at = self._clock() + self.lease
+
+    async def complete(self, key: str, response: StoredResponse) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.response = response
+            entry.expires_at = self._clock() + self.ttl
+        self._notify(key)
+
+    async def release(self, key: str) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.response is None:
+            del self._entries[key]
+        self._notify(key)
+
+    def clear(self) -> None:
+        super().clear()
+        self._entries.clear()
+        self._changed.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"keys": len(self._entries), **super().stats()}
+
+    async def _claim(
+        self, key: str, fingerprint: str
+    ) -> Tuple[str, Optional[str], Optional[StoredResponse]]:
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self._sweep(now)
+            self._entries[key] = _Entry(fingerprint, now + self.lease)
+            return CLAIMED, None, None
+        if entry.response is not None:
+            return DONE, entry.fingerprint, entry.response
+        return PENDING, entry.fingerprint, None
+
+    async def _wait_for_change(self, key: str, timeout: float) -> None:
+        event = self._changed.setdefault(key, asyncio.Event())
+        try:
+            # Bounded so an expired lease is noticed even without a notification.
+            await asyncio.wait_for(event.wait(), min(timeout, self.lease))
+        except asyncio.TimeoutError:
+            pass
+
+    def _notify(self, key: str) -> None:
+        event = self._changed.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def _sweep(self, now: float) -> None:
+        if len(self._entries) < self.max_entries:
+            return
+        for key in [k for k, e in self._entries.items() if e.expires_at <= now]:
+            del self._entries[key]
+        while len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+
+class SqliteIdempotencyStore(IdempotencyStore):
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            response TEXT,
+            expires_at REAL NOT NULL
+        )
+    """
+
+    def __init__(self, path: str, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=5.0, check_same_thread=False, isolation_level=None
+        )
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(self._SCHEMA)
+
+    async def renew(self, key: str) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE idempotency_keys SET expires_at = ? WHERE key = ? AND response IS NULL",
+            (self._clock() + self.lease, key),
+        )
+
+    async def complete(self, key: str, response: StoredResponse) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE idempotency_keys SET response = ?, expires_at = ? WHERE key = ?",
+            (response.dumps(), self._clock() + self.ttl, key),
+        )
+
+    async def release(self, key: str) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "DELETE FROM idempotency_keys WHERE key = ? AND response IS NULL",
+            (key,),
+        )
+
+    def clear(self) -> None:
+        super().clear()
+        self._execute("DELETE FROM idempotency_keys", ())
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (keys,) = self._db.execute("SELECT COUNT(*) FROM idempotency_keys").fetchone()
+        return {"keys": keys, "path": self.path, **super().stats()}
+
+    async def _claim(
+        self, key: str, fingerprint: str
+    ) -> Tuple[str, Optional[str], Optional[StoredResponse]]:
+        return await asyncio.to_thread(self._claim_sync, key, fingerprint)
+
+    def _claim_sync(
+        self, key: str, fingerprint: str
+    ) -> Tuple[str, Optional[str], Optional[StoredResponse]]:
+        now = self._clock()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two workers cannot
+            # both see the key as free.
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "DELETE FROM idempotency_keys WHERE key = ? AND expires_at <= ?", (key, now)
+                )
+                row = self._db.execute(
+                    "SELECT fingerprint, response FROM idempotency_keys WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self._db.execute(
+                        "INSERT INTO idempotency_keys (key, fingerprint, expires_at)"
+                        " VALUES (?, ?, ?)",
+                        (key, fingerprint, now + self.lease),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                # SQLite may already have ended the transaction (an interrupt,
+                # a full disk); a ROLLBACK then would mask the real error.
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return CLAIMED, None, None
+        stored_fingerprint, response = row
+        if response is not None:
+            return DONE, stored_fingerprint, StoredResponse.loads(response)
+        return PENDING, stored_fingerprint, None
+
+    def _execute(self, sql: str, params: Tuple[Any, ...]) -> None:
+        with self._lock:
+            self._db.execute(sql, params)
+
+
+def create_idempotency_store(settings: Settings) -> IdempotencyStore:
+    options = {
+        "ttl": settings.idempotency_ttl_seconds,
+        "lease": settings.idempotency_lease_seconds,
+        "wait": settings.idempotency_wait_seconds,
+    }
+    backend = settings.idempotency_backend.lower()
+    if backend == "sqlite":
+        return SqliteIdempotencyStore(settings.idempotency_sqlite_path, **options)
+    if backend == "memory":
+        return MemoryIdempotencyStore(max_entries=settings.idempotency_max_entries, **options)
+    raise ValueError(f"unknown idempotency backend: {backend!r}")
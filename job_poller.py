@@ -0,0 +1,272 @@
+"""Shared upstream polling for async order jobs.
+
+Every job that a client is interested in gets exactly one background loop that
+polls the order service, backing off while the status is unchanged and
+stopping once the job reaches a terminal state or nobody has asked about it
+for ``idle_timeout`` seconds. Clients read the latest snapshot from memory,
+long-poll for the next change, or subscribe to a stream of changes, so
+upstream traffic grows with the number of jobs rather than the number of
+clients.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from config import Settings
+from error_model import http_error
+from etag import etag_matches, strong_etag_bytes
+from http_client import request_with_retry
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"SUCCEEDED", "COMPLETED", "FAILED", "ERROR", "CANCELLED", "CANCELED"}
+
+
+def parse_wait(value: Optional[str], max_seconds: float) -> float:
+    """Seconds from ``30s``/``500ms``/``30``, clamped to ``[0, max_seconds]``."""
+    if not value:
+        return 0.0
+    text = value.strip().lower()
+    try:
+        if text.endswith("ms"):
+            seconds = float(text[:-2]) / 1000
+        elif text.endswith("s"):
+            seconds = float(text[:-1])
+        else:
+            seconds = float(text)
+    except ValueError:
+        raise http_error(
+            400, code="INVALID_WAIT", message="wait must look like 30s, 500ms or 30"
+        ) from None
+    return min(max(0.0, seconds), max_seconds)
+
+
+@dataclass
+class JobSnapshot:
+    body: Dict[str, Any]
+    etag: str
+    version: int
+
+    @property
+    def terminal(self) -> bool:
+        return str(self.body.get("status", "")).upper() in TERMINAL_STATUSES
+
+
+@dataclass
+class _Watch:
+    job_id: str
+    snapshot: Optional[JobSnapshot] = None
+    error: Optional[BaseException] = None
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    last_access: float = field(default_factory=time.monotonic)
+    waiters: int = 0
+    task: Optional["asyncio.Task[None]"] = None
+    finished_at: Optional[float] = None
+
+    def publish(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class JobPoller:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        base_url: str,
+        *,
+        retries: int,
+        min_interval: float = 0.25,
+        max_interval: float = 5.0,
+        idle_timeout: float = 30.0,
+        terminal_ttl: float = 60.0,
+    ) -> None:
+        self._client = client
+        self.base_url = base_url
+        self.retries = retries
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_timeout = idle_timeout
+        self.terminal_ttl = terminal_ttl
+        self._watches: Dict[str, _Watch] = {}
+        self.upstream_polls = 0
+        self.reads = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings, client: httpx.AsyncClient) -> "JobPoller":
+        return cls(
+            client,
+            settings.order_svc_base,
+            retries=settings.http_retries,
+            min_interval=settings.job_poll_min_interval_ms / 1000,
+            max_interval=settings.job_poll_max_interval_ms / 1000,
+            idle_timeout=settings.job_poll_idle_seconds,
+            terminal_ttl=settings.job_terminal_ttl_seconds,
+        )
+
+    async def current(self, job_id: str) -> JobSnapshot:
+        """Latest known status, waiting for the first poll if there is none yet."""
+        return await self._current(self._watch(job_id))
+
+    async def wait(
+        self, job_id: str, if_none_match: Optional[str], timeout: float
+    ) -> JobSnapshot:
+        """Return once the status no longer matches ``if_none_match`` (or the
+        status seen on arrival), the job ends, or ``timeout`` passes."""
+        watch = self._watch(job_id)
+        snapshot = await self._current(watch)
+        known = if_none_match or snapshot.etag
+        deadline = time.monotonic() + timeout
+        while not snapshot.terminal and etag_matches(known, snapshot.etag):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await self._await_change(watch, remaining)
+            snapshot = self._result(watch)
+        return snapshot
+
+    async def subscribe(
+        self, job_id: str, last_version: int = 0, *, heartbeat: float = 15.0
+    ) -> AsyncIterator[Optional[JobSnapshot]]:
+        """Yield every new snapshot until the job reaches a terminal state.
+
+        ``None`` is yielded after ``heartbeat`` seconds without a change so
+        streaming callers can keep idle connections alive.
+        """
+        watch = self._watch(job_id)
+        snapshot = await self._current(watch)
+        while True:
+            if snapshot.version > last_version:
+                last_version = snapshot.version
+                yield snapshot
+            if snapshot.terminal:
+                return
+            if not await self._await_change(watch, heartbeat):
+                yield None
+            watch.last_access = time.monotonic()
+            snapshot = self._result(watch)
+
+    def clear(self) -> None:
+        for watch in self._watches.values():
+            if watch.task is not None:
+                watch.task.cancel()
+        self._watches.clear()
+        self.upstream_polls = self.reads = 0
+
+    async def close(self) -> None:
+        tasks = [w.task for w in self._watches.values() if w.task is not None]
+        self.clear()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "jobs": len(self._watches),
+            "polling": sum(1 for w in self._watches.values() if w.task and not w.task.done()),
+            "waiters": sum(w.waiters for w in self._watches.values()),
+            "upstreamPolls": self.upstream_polls,
+            "reads": self.reads,
+        }
+
+    def _watch(self, job_id: str) -> _Watch:
+        self._sweep()
+        self.reads += 1
+        watch = self._watches.get(job_id)
+        if watch is None:
+            watch = self._watches[job_id] = _Watch(job_id)
+        watch.last_access = time.monotonic()
+        if watch.finished_at is None and (watch.task is None or watch.task.done()):
+            # Start from an empty context so the loop does not inherit the
+            # triggering request's deadline.
+            watch.task = asyncio.get_running_loop().create_task(
+                self._poll(watch), context=contextvars.Context()
+            )
+        return watch
+
+    async def _current(self, watch: _Watch) -> JobSnapshot:
+        while watch.snapshot is None and watch.error is None:
+            await self._await_change(watch, None)
+        return self._result(watch)
+
+    def _result(self, watch: _Watch) -> JobSnapshot:
+        if watch.snapshot is None and watch.error is not None:
+            raise watch.error
+        assert watch.snapshot is not None
+        return watch.snapshot
+
+    async def _await_change(self, watch: _Watch, timeout: Optional[float]) -> bool:
+        watch.waiters += 1
+        try:
+            await asyncio.wait_for(watch.changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            watch.waiters -= 1
+
+    async def _poll(self, watch: _Watch) -> None:
+        interval = self.min_interval
+        while True:
+            try:
+                self.upstream_polls += 1
+                upstream = await request_with_retry(
+                    self._client,
+                    "GET",
+                    f"{self.base_url}/jobs/{watch.job_id}",
+                    retries=self.retries,
+                )
+                if upstream.status_code == 404:
+                    watch.snapshot = None
+                    watch.error = http_error(404, code="JOB_NOT_FOUND", message="Job not found")
+                    self._finish(watch)
+                    return
+                upstream.raise_for_status()
+                body = upstream.json()
+                etag = upstream.headers.get("etag") or strong_etag_bytes(
+                    json.dumps(body, sort_keys=True, separators=(",", ":")).encode("utf-8")
+                )
+                if watch.snapshot is None or watch.snapshot.etag != etag:
+                    version = watch.snapshot.version + 1 if watch.snapshot else 1
+                    watch.snapshot = JobSnapshot(body, etag, version)
+                    watch.error = None
+                    interval = self.min_interval
+                    watch.publish()
+                    if watch.snapshot.terminal:
+                        self._finish(watch)
+                        return
+                else:
+                    interval = min(self.max_interval, interval * 2)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("job %s poll failed: %r", watch.job_id, exc)
+                interval = min(self.max_interval, interval * 2)
+                if watch.snapshot is None:
+                    watch.error = exc
+                    watch.publish()
+            idle = time.monotonic() - watch.last_access
+            if watch.waiters == 0 and idle > self.idle_timeout:
+                return
+            await asyncio.sleep(interval)
+
+    def _finish(self, watch: _Watch) -> None:
+        watch.finished_at = time.monotonic()
+        watch.publish()
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        for job_id, watch in list(self._watches.items()):
+            if watch.finished_at is not None and now - watch.finished_at > self.terminal_ttl:
+                del self._watches[job_id]
+            elif (
+                watch.finished_at is None
+                and watch.task is not None
+                and watch.task.done()
+                and now - watch.last_access > self.idle_timeout
+            ):
+                del self._watches[job_id]
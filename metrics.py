@@ -0,0 +1,305 @@
+"""Minimal Prometheus metrics for the composite service.
+
+Counters, gauges and histograms keep one small child object per label set,
+created once under a lock and then updated in place: recording is a dict
+lookup plus a few attribute increments, with histogram buckets found by
+``bisect`` over preallocated bounds. Updates rely on the GIL rather than a
+lock, so a concurrent increment from a fan-out thread can very rarely be lost;
+that trade keeps the hot path cheap and is fine for monitoring.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_ATTEMPT_LABEL = 5
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> Any:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self) -> Any: ...
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: LabelValues, child: Any) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, values: LabelValues, child: _HistogramChild) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), list(child.counts)):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.register(
+    Histogram(
+        "composite_request_duration_seconds",
+        "Latency of composite requests by route template.",
+        ("method", "route", "status_class"),
+    )
+)
+REQUESTS_IN_FLIGHT = REGISTRY.register(
+    Gauge("composite_requests_in_flight", "Composite requests currently being served.")
+).labels()
+UPSTREAM_DURATION = REGISTRY.register(
+    Histogram(
+        "composite_upstream_request_duration_seconds",
+        "Latency of individual upstream attempts.",
+        ("upstream", "method", "status_class", "attempt"),
+    )
+)
+UPSTREAM_IN_FLIGHT = REGISTRY.register(
+    Gauge(
+        "composite_upstream_requests_in_flight",
+        "Upstream attempts currently waiting on a response.",
+        ("upstream",),
+    )
+)
+UPSTREAM_RETRIES = REGISTRY.register(
+    Counter(
+        "composite_upstream_retries_total",
+        "Upstream attempts that were retried.",
+        ("upstream", "reason"),
+    )
+)
+
+_upstream_names: Dict[str, str] = {}
+
+
+def configure(services: Dict[str, str]) -> None:
+    """Name upstream hosts after the service they belong to (``base URL -> name``)."""
+    _upstream_names.clear()
+    for base_url, name in services.items():
+        _upstream_names[httpx.URL(base_url).netloc.decode("ascii")] = name
+
+
+def upstream_name(url: str) -> str:
+    # Cheap split instead of full URL parsing: absolute URLs are "scheme://host/...".
+    parts = url.split("/", 3)
+    host = parts[2] if len(parts) > 2 else url
+    return _upstream_names.get(host, host)
+
+
+_STATUS_CLASSES = tuple(f"{n}xx" for n in range(6))
+_ATTEMPT_LABELS = tuple(str(n) for n in range(MAX_ATTEMPT_LABEL + 1))
+
+
+def status_class(status: Optional[int]) -> str:
+    if status is None or not 0 <= status < 600:
+        return "error"
+    return _STATUS_CLASSES[status // 100]
+
+
+def attempt_label(attempt: int) -> str:
+    return _ATTEMPT_LABELS[min(attempt, MAX_ATTEMPT_LABEL)]
+
+
+def observe_upstream(
+    upstream: str, method: str, status: Optional[int], attempt: int, elapsed: float
+) -> None:
+    UPSTREAM_DURATION.labels(
+        upstream, method, status_class(status), attempt_label(attempt)
+    ).observe(elapsed)
+
+
+def pool_lines(pools: Dict[str, Any]) -> List[str]:
+    """Connection-pool gauges for httpx clients (``name -> client``).
+
+    Reads httpcore pool internals at scrape time; pools that do not expose
+    them (e.g. mocked transports) are skipped.
+    """
+    lines = [
+        "# HELP composite_http_pool_connections Connections held by each httpx pool.",
+        "# TYPE composite_http_pool_connections gauge",
+    ]
+    limits = [
+        "# HELP composite_http_pool_max_connections Configured pool size.",
+        "# TYPE composite_http_pool_max_connections gauge",
+    ]
+    queued = [
+        "# HELP composite_http_pool_queued_requests Requests waiting for a pooled connection.",
+        "# TYPE composite_http_pool_queued_requests gauge",
+    ]
+    for name, client in sorted(pools.items()):
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        if pool is None or not hasattr(pool, "connections"):
+            continue
+        connections = list(pool.connections)
+        idle = sum(1 for conn in connections if conn.is_idle())
+        active = sum(1 for conn in connections if not conn.is_idle() and not conn.is_closed())
+        for state, count in (("active", active), ("idle", idle)):
+            lines.append(
+                f'composite_http_pool_connections{{pool="{name}",state="{state}"}} {count}'
+            )
+        maximum = getattr(pool, "_max_connections", None)
+        if maximum is not None:
+            limits.append(f'composite_http_pool_max_connections{{pool="{name}"}} {maximum}')
+        waiting = sum(1 for request in list(getattr(pool, "_requests", [])) if request.is_queued())
+        queued.append(f'composite_http_pool_queued_requests{{pool="{name}"}} {waiting}')
+    return lines + limits + queued
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency and in-flight requests."""
+
+    def __init__(self, app: Callable) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status: List[int] = []
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            REQUEST_DURATION.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status_class(status[0] if status else 500),
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,7 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class BatchGetRequest(BaseModel):
+    ids: List[str] = Field(default_factory=list)
@@ -0,0 +1,100 @@
+"""Short-lived memory of IDs an upstream just reported as missing.
+
+``POST /orders`` consults it before its FK lookups, so repeated requests for a
+user or item that was confirmed missing a moment ago are rejected without any
+upstream traffic. Entries expire after ``ttl`` seconds and are bounded in LRU
+order; any successful lookup of the same ID drops its entry at once.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+from config import Settings
+
+NegativeKey = Tuple[str, str]
+
+
+class NegativeCache:
+    def __init__(
+        self,
+        *,
+        ttl: float,
+        max_entries: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._expiry: "OrderedDict[NegativeKey, float]" = OrderedDict()
+        self.hits = 0
+        self.stored = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "NegativeCache":
+        return cls(
+            ttl=settings.fk_negative_cache_ttl_seconds,
+            max_entries=settings.fk_negative_cache_max_entries,
+        )
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def is_missing(self, kind: str, entity_id: str) -> bool:
+        key = (kind, entity_id)
+        expires_at = self._expiry.get(key)
+        if expires_at is None:
+            return False
+        if self._clock() >= expires_at:
+            del self._expiry[key]
+            return False
+        self.hits += 1
+        return True
+
+    def observe(self, kind: str, entity_id: str, status: int) -> None:
+        """Record an upstream answer for ``entity_id``: 404/410 remembers it as
+        missing, any success forgets it."""
+        if status in (404, 410):
+            self.add(kind, entity_id)
+        elif status < 400:
+            self.discard(kind, entity_id)
+
+    def observe_batch(
+        self, kind: str, results: Dict[str, Any], errors: Dict[str, Dict[str, Any]]
+    ) -> None:
+        """``observe`` every ID of a ``batch_get`` outcome."""
+        for entity_id in results:
+            self.discard(kind, entity_id)
+        for entity_id, error in errors.items():
+            status = (error.get("details") or {}).get("status")
+            if status in (404, 410):
+                self.add(kind, entity_id)
+
+    def add(self, kind: str, entity_id: str) -> None:
+        if self.ttl <= 0:
+            return
+        key = (kind, entity_id)
+        self._expiry[key] = self._clock() + self.ttl
+        self._expiry.move_to_end(key)
+        self.stored += 1
+        while len(self._expiry) > self.max_entries:
+            self._expiry.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, kind: str, entity_id: str) -> None:
+        if self._expiry.pop((kind, entity_id), None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._expiry.clear()
+        self.hits = self.stored = self.invalidations = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._expiry),
+            "hits": self.hits,
+            "stored": self.stored,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
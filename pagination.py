@@ -1,6 +1,10 @@
 import base64
 import json
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+
+from error_model import http_error
 
 
 def encode_token(payload: Dict[str, object]) -> str:
@@ -8,21 +12,79 @@ def encode_token(payload: Dict[str, object]) -> str:
     return base64.urlsafe_b64encode(packed).decode("utf-8")
 
 
+def invalid_page_token() -> HTTPException:
+    return http_error(
+        400, code="INVALID_PAGE_TOKEN", message="pageToken is not a token this API issued"
+    )
+
+
 def decode_token(token: str) -> Dict[str, object]:
-    raw = base64.urlsafe_b64decode(token.encode("utf-8"))
-    return json.loads(raw.decode("utf-8"))
+    """The payload packed into ``token``; anything malformed is a 400."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("utf-8")).decode("utf-8"))
+    except ValueError:  # bad base64, UTF-8 or JSON
+        raise invalid_page_token() from None
+    if not isinstance(payload, dict):
+        raise invalid_page_token()
+    return payload
+
 
+def merge_tokens(
+    tokens: Dict[str, Optional[str]],
+    offsets: Optional[Dict[str, Dict[str, object]]] = None,
+) -> Optional[str]:
+    """Pack per-source page tokens, plus optional per-source cursor state.
 
-def merge_tokens(tokens: Dict[str, Optional[str]]) -> Optional[str]:
+    ``offsets`` maps each source to where it stopped inside the upstream page
+    named by its token, so the next merged page resumes mid-page exactly.
+    """
     compact = {k: v for k, v in tokens.items() if v}
-    if not compact:
+    live = {k: v for k, v in (offsets or {}).items() if not v.get("x")}
+    if not compact and not live:
         return None
-    return encode_token({"sources": compact})
+    payload: Dict[str, object] = {"sources": compact}
+    if offsets:
+        payload["cursor"] = offsets
+    return encode_token(payload)
 
 
 def extract_tokens(token: Optional[str]) -> Dict[str, str]:
     if not token:
         return {}
-    payload = decode_token(token)
-    sources = payload.get("sources", {})
+    sources = decode_token(token).get("sources")
+    if not isinstance(sources, dict):
+        return {}
     return {k: v for k, v in sources.items() if isinstance(v, str)}
+
+
+def extract_cursor(token: Optional[str]) -> Dict[str, Dict[str, object]]:
+    """Per-source cursor state; tokens without one resume at page starts."""
+    if not token:
+        return {}
+    payload = decode_token(token)
+    cursor = payload.get("cursor")
+    if isinstance(cursor, dict):
+        return {k: v for k, v in cursor.items() if isinstance(v, dict)}
+    return {k: {"t": v} for k, v in extract_tokens(token).items()}
+
+
+def resume_token(
+    tokens: Dict[str, Optional[str]],
+    only: List[str],
+    offsets: Optional[Dict[str, Dict[str, object]]] = None,
+) -> str:
+    """Token that re-requests just ``only`` sources at their given cursors."""
+    compact = {k: v for k, v in tokens.items() if v and k in only}
+    payload: Dict[str, object] = {"sources": compact, "only": sorted(only)}
+    if offsets:
+        payload["cursor"] = {k: v for k, v in offsets.items() if k in only}
+    return encode_token(payload)
+
+
+def extract_only(token: Optional[str]) -> Optional[List[str]]:
+    if not token:
+        return None
+    only = decode_token(token).get("only")
+    if not isinstance(only, list):
+        return None
+    return [name for name in only if isinstance(name, str)]
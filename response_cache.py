@@ -0,0 +1,476 @@
+"""Bounded in-process cache for upstream GET responses.
+
+Entries are kept in LRU order and bounded by entry count and total body bytes.
+Freshness follows upstream ``Cache-Control`` (``s-maxage``/``max-age``, falling
+back to a configured default); stale entries that carry an ETag are revalidated
+with ``If-None-Match`` so a ``304`` extends them without re-downloading the body.
+
+Past freshness an entry may still be served (RFC 5861): within its
+``stale-while-revalidate`` window it is answered at once while one background
+request refreshes it, and within its ``stale-if-error`` window it stands in for
+an upstream failure (transport error, 5xx, open breaker or spent deadline).
+Both windows come from upstream ``Cache-Control`` or the configured defaults.
+Stale answers carry ``Age``, ``Warning`` and ``X-Cache: STALE``/``STALE-IF-ERROR``.
+
+With a shared ``backend`` (see ``cache_backend``) every stored or revalidated
+entry, ETag included, is written through to it, and local misses are looked up
+there before going upstream, so all workers share one warm copy.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Set, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from cache_backend import CacheBackend
+from config import Settings
+from http_client import request_with_retry
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+STORED_HEADERS = ("content-type", "etag", "cache-control", "last-modified")
+STALE_WARNING = '110 - "Response is Stale"'
+REVALIDATION_FAILED_WARNING = '111 - "Revalidation Failed"'
+
+# ``send(headers, retries)`` performs one upstream GET for the cached URL.
+Send = Callable[[Dict[str, str], int], Awaitable[httpx.Response]]
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    directives: Dict[str, Optional[str]] = {}
+    if not value:
+        return directives
+    for part in value.split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else None
+    return directives
+
+
+def freshness_lifetime(headers: Mapping[str, str], default_ttl: float) -> Optional[float]:
+    """Seconds an upstream response stays fresh, or ``None`` if it must not be stored."""
+
+    directives = parse_cache_control(headers.get("cache-control"))
+    if "no-store" in directives or "private" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    for name in ("s-maxage", "max-age"):
+        raw = directives.get(name)
+        if raw is not None:
+            try:
+                lifetime = float(raw)
+            except ValueError:
+                continue
+            try:
+                lifetime -= float(headers.get("age", 0))
+            except ValueError:
+                pass
+            return max(0.0, lifetime)
+    return default_ttl
+
+
+def stale_window(headers: Mapping[str, str], directive: str, default: float) -> float:
+    raw = parse_cache_control(headers.get("cache-control")).get(directive)
+    if raw is not None:
+        try:
+            return max(0.0, float(raw))
+        except ValueError:
+            pass
+    return default
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    headers: Dict[str, str]
+    stored_at: float
+    expires_at: float
+    stale_while_revalidate: float = 0.0
+    stale_if_error: float = 0.0
+    size: int = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.size = len(self.body) + sum(len(k) + len(v) for k, v in self.headers.items())
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.headers.get("etag")
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.expires_at
+
+    def may_serve_while_revalidating(self, now: float) -> bool:
+        return now < self.expires_at + self.stale_while_revalidate
+
+    def may_serve_on_error(self, now: float) -> bool:
+        return now < self.expires_at + self.stale_if_error
+
+    def encode(self, now: float) -> bytes:
+        """Bytes for a shared backend; times are made wall-clock relative."""
+        meta = {
+            "headers": self.headers,
+            "storedAt": time.time() - (now - self.stored_at),
+            "lifetime": self.expires_at - self.stored_at,
+            "swr": self.stale_while_revalidate,
+            "sie": self.stale_if_error,
+        }
+        return json.dumps(meta, separators=(",", ":")).encode("utf-8") + b"\n" + self.body
+
+    @classmethod
+    def decode(cls, raw: bytes, now: float) -> "CacheEntry":
+        meta, _, body = raw.partition(b"\n")
+        data = json.loads(meta)
+        stored_at = now - max(0.0, time.time() - data["storedAt"])
+        return cls(
+            body,
+            data["headers"],
+            stored_at,
+            stored_at + data["lifetime"],
+            data["swr"],
+            data["sie"],
+        )
+
+    def to_response(
+        self, url: str, now: float, status: str, warning: Optional[str] = None
+    ) -> httpx.Response:
+        headers = dict(self.headers)
+        headers["age"] = str(int(max(0.0, now - self.stored_at)))
+        headers["x-cache"] = status
+        if warning:
+            headers["warning"] = warning
+        return httpx.Response(
+            200, content=self.body, headers=headers, request=httpx.Request("GET", url)
+        )
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        *,
+        max_entries: int,
+        max_bytes: int,
+        default_ttl: float = 0.0,
+        stale_while_revalidate: float = 0.0,
+        stale_if_error: float = 0.0,
+        backend: Optional[CacheBackend] = None,
+        backend_ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.backend = backend
+        self.backend_ttl = backend_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._refreshing: Set[str] = set()
+        self._background: Set["asyncio.Task[None]"] = set()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.stale_hits = 0
+        self.stale_if_error_hits = 0
+        self.background_refreshes = 0
+        self.shared_hits = 0
+
+    @classmethod
+    def from_settings(
+        cls, settings: Settings, backend: Optional[CacheBackend] = None
+    ) -> "ResponseCache":
+        return cls(
+            max_entries=settings.response_cache_max_entries,
+            max_bytes=settings.response_cache_max_bytes,
+            default_ttl=settings.response_cache_default_ttl_seconds,
+            stale_while_revalidate=settings.response_cache_stale_while_revalidate_seconds,
+            stale_if_error=settings.response_cache_stale_if_error_seconds,
+            backend=backend,
+            backend_ttl=settings.cache_backend_ttl_seconds,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry) -> Optional[CacheEntry]:
+        self.invalidate(key)
+        if entry.size > self.max_bytes:
+            return None
+        self._entries[key] = entry
+        self.total_bytes += entry.size
+        self._evict()
+        return entry
+
+    def store(self, key: str, response: httpx.Response) -> Optional[CacheEntry]:
+        lifetime = freshness_lifetime(response.headers, self.default_ttl)
+        etag = response.headers.get("etag")
+        swr, sie = self._stale_windows(response.headers)
+        if lifetime is None or (lifetime <= 0 and not etag and not swr and not sie):
+            self.invalidate(key)
+            return None
+        headers = {
+            name: response.headers[name] for name in STORED_HEADERS if name in response.headers
+        }
+        now = self._clock()
+        entry = CacheEntry(response.content, headers, now, now + lifetime, swr, sie)
+        return self.put(key, entry)
+
+    def refresh(self, key: str, entry: CacheEntry, not_modified: httpx.Response) -> CacheEntry:
+        """Extend ``entry`` from a 304 without touching the stored body."""
+
+        for name in ("etag", "cache-control", "last-modified"):
+            if name in not_modified.headers:
+                entry.headers[name] = not_modified.headers[name]
+        lifetime = freshness_lifetime(entry.headers, self.default_ttl)
+        now = self._clock()
+        entry.stored_at = now
+        entry.expires_at = now + (lifetime or 0.0)
+        entry.stale_while_revalidate, entry.stale_if_error = self._stale_windows(entry.headers)
+        if self._entries.get(key) is entry:
+            previous = entry.size
+            entry.__post_init__()
+            self.total_bytes += entry.size - previous
+            self._entries.move_to_end(key)
+        return entry
+
+    def invalidate(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    def clear(self) -> None:
+        for task in self._background:
+            task.cancel()
+        self._background.clear()
+        self._refreshing.clear()
+        self._entries.clear()
+        self.total_bytes = 0
+        self.hits = self.misses = self.revalidations = self.evictions = 0
+        self.stale_hits = self.stale_if_error_hits = self.background_refreshes = 0
+        self.shared_hits = 0
+
+    async def close(self) -> None:
+        tasks = list(self._background)
+        self.clear()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "evictions": self.evictions,
+            "staleHits": self.stale_hits,
+            "staleIfErrorHits": self.stale_if_error_hits,
+            "backgroundRefreshes": self.background_refreshes,
+            "sharedHits": self.shared_hits,
+            "shared": self.backend.stats() if self.backend is not None else None,
+        }
+
+    async def fetch(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        *,
+        retries: int,
+        headers: Optional[Mapping[str, str]] = None,
+        singleflight: Optional[SingleFlight] = None,
+        stale: bool = True,
+    ) -> httpx.Response:
+        """GET ``url`` through the cache over ``client``."""
+
+        async def send(request_headers: Dict[str, str], attempts: int) -> httpx.Response:
+            return await request_with_retry(
+                client,
+                "GET",
+                url,
+                headers=request_headers,
+                retries=attempts,
+                singleflight=singleflight,
+            )
+
+        return await self.fetch_with(url, send, retries=retries, headers=headers, stale=stale)
+
+    async def fetch_with(
+        self,
+        url: str,
+        send: Send,
+        *,
+        retries: int,
+        headers: Optional[Mapping[str, str]] = None,
+        stale: bool = True,
+    ) -> httpx.Response:
+        """GET ``url`` through the cache, calling upstream with ``send``.
+
+        Fresh entries are answered locally; stale ones are revalidated with the
+        stored ETag (replacing any client validator, which the caller compares
+        against the returned representation instead). ``stale=False`` never
+        serves an expired copy, neither while revalidating nor on errors, for
+        resources whose state clients act on (orders).
+        """
+
+        now = self._clock()
+        entry = self.get(url)
+        if entry is None and self.backend is not None:
+            entry = await self._load_shared(url, now)
+        if entry is not None and entry.is_fresh(now):
+            self.hits += 1
+            return entry.to_response(url, now, "HIT")
+        if stale and entry is not None and entry.may_serve_while_revalidating(now):
+            self.stale_hits += 1
+            self._revalidate_in_background(url, entry, send, retries)
+            return entry.to_response(url, now, "STALE", STALE_WARNING)
+
+        fallback = entry if stale and entry is not None and entry.may_serve_on_error(now) else None
+        request_headers = dict(headers or {})
+        if entry is not None and entry.etag:
+            request_headers["If-None-Match"] = entry.etag
+        try:
+            # With a copy to fall back on, fail over at once instead of
+            # sitting through the retry chain.
+            upstream = await send(request_headers, 0 if fallback is not None else retries)
+        except (httpx.RequestError, HTTPException) as exc:
+            if fallback is None or (
+                isinstance(exc, HTTPException) and exc.status_code not in (503, 504)
+            ):
+                raise
+            return self._serve_on_error(url, fallback)
+        if upstream.status_code >= 500 and fallback is not None:
+            return self._serve_on_error(url, fallback)
+        return await self._apply(url, entry, upstream)
+
+    async def _apply(
+        self, url: str, entry: Optional[CacheEntry], upstream: httpx.Response
+    ) -> httpx.Response:
+        if entry is not None and entry.etag and upstream.status_code == 304:
+            self.revalidations += 1
+            entry = self.refresh(url, entry, upstream)
+            await self._save_shared(url, entry)
+            return entry.to_response(url, self._clock(), "REVALIDATED")
+
+        self.misses += 1
+        if upstream.status_code == 200:
+            stored = self.store(url, upstream)
+            if stored is not None:
+                await self._save_shared(url, stored)
+            upstream.headers["x-cache"] = "MISS"
+        elif upstream.status_code in (404, 410):
+            self.invalidate(url)
+            if self.backend is not None:
+                await self.backend.delete(url)
+        return upstream
+
+    async def _load_shared(self, url: str, now: float) -> Optional[CacheEntry]:
+        assert self.backend is not None
+        raw = await self.backend.get(url)
+        if raw is None:
+            return None
+        try:
+            entry = CacheEntry.decode(raw, now)
+        except (ValueError, KeyError) as exc:
+            logger.warning("undecodable shared cache entry for %s: %r", url, exc)
+            return None
+        self.shared_hits += 1
+        return self.put(url, entry)
+
+    async def _save_shared(self, url: str, entry: CacheEntry) -> None:
+        if self.backend is None:
+            return
+        now = self._clock()
+        windows = max(entry.stale_while_revalidate, entry.stale_if_error)
+        usable_for = entry.expires_at - now + windows
+        # Entries past all windows are still worth sharing for ETag revalidation.
+        ttl = max(usable_for, self.backend_ttl if entry.etag else 0.0)
+        await self.backend.set(url, entry.encode(now), ttl)
+
+    def _serve_on_error(self, url: str, entry: CacheEntry) -> httpx.Response:
+        self.stale_if_error_hits += 1
+        return entry.to_response(
+            url, self._clock(), "STALE-IF-ERROR", REVALIDATION_FAILED_WARNING
+        )
+
+    def _revalidate_in_background(
+        self, url: str, entry: CacheEntry, send: Send, retries: int
+    ) -> None:
+        if url in self._refreshing:
+            return
+        self._refreshing.add(url)
+
+        async def refresh() -> None:
+            try:
+                upstream = await send(
+                    {"If-None-Match": entry.etag} if entry.etag else {}, retries
+                )
+                if upstream.status_code < 500:
+                    self.background_refreshes += 1
+                    await self._apply(url, entry, upstream)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("background refresh of %s failed: %r", url, exc)
+            finally:
+                self._refreshing.discard(url)
+
+        # Detached from the request: no deadline, no trace id, no timing collector.
+        task = asyncio.get_running_loop().create_task(refresh(), context=contextvars.Context())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _stale_windows(self, headers: Mapping[str, str]) -> Tuple[float, float]:
+        return (
+            stale_window(headers, "stale-while-revalidate", self.stale_while_revalidate),
+            stale_window(headers, "stale-if-error", self.stale_if_error),
+        )
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self.total_bytes -= entry.size
+            self.evictions += 1
+
+
+async def cached_get(
+    cache: Optional[ResponseCache],
+    client: httpx.AsyncClient,
+    url: str,
+    *,
+    retries: int,
+    headers: Optional[Mapping[str, str]] = None,
+    singleflight: Optional[SingleFlight] = None,
+    stale: bool = True,
+) -> httpx.Response:
+    """GET through ``cache`` when one is configured, straight upstream otherwise."""
+
+    if cache is None:
+        return await request_with_retry(
+            client,
+            "GET",
+            url,
+            headers=dict(headers or {}),
+            retries=retries,
+            singleflight=singleflight,
+        )
+    return await cache.fetch(
+        client, url, retries=retries, headers=headers, singleflight=singleflight, stale=stale
+    )
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Request
+
+import compression
+from circuit_breaker import UPSTREAMS
+from hedging import HEDGER
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/stats")
+async def stats(request: Request):
+    state = request.app.state
+    components = {
+        "singleflight": getattr(state, "singleflight", None),
+        "responseCache": getattr(state, "response_cache", None),
+        "searchCache": getattr(state, "search_cache", None),
+        "catalogIndex": getattr(state, "catalog_replica", None),
+        "jobPoller": getattr(state, "job_poller", None),
+        "fkNegativeCache": getattr(state, "fk_negative_cache", None),
+        "idempotency": getattr(state, "idempotency_store", None),
+        "compression": compression.VARIANTS,
+    }
+    return {
+        name: component.stats() if component is not None else None
+        for name, component in components.items()
+    }
+
+
+@router.get("/upstreams")
+async def upstreams():
+    return {
+        "enabled": UPSTREAMS.enabled,
+        "upstreams": UPSTREAMS.snapshot(),
+        "hedging": HEDGER.stats(),
+    }
@@ -1,4 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+
+from deps import get_warmer
 
 router = APIRouter(tags=["health"])
 
@@ -9,5 +12,9 @@ async def healthz():
 
 
 @router.get("/readyz")
-async def readyz():
-    return {"ready": True}
+async def readyz(warmer=Depends(get_warmer)):
+    # Reads the warmer's cached probe results; never calls an upstream itself.
+    if warmer is None:
+        return {"ready": True}
+    report = warmer.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
@@ -1,12 +1,28 @@
-from typing import Optional
+from typing import AsyncIterator, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
-from httpx import AsyncClient
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from httpx._decoders import SUPPORTED_DECODERS
+from httpx import AsyncClient, Response as HTTPXResponse
+from starlette.background import BackgroundTask
 
+from batch import batch_get, unique_ids
+from conditional import check_not_modified, conditional_headers, not_modified
 from config import Settings
-from deps import get_http_client, get_settings_from_app
+from deps import (
+    get_http_client,
+    get_negative_cache,
+    get_response_cache,
+    get_settings_from_app,
+    get_singleflight,
+)
 from etag import strong_etag_bytes
-from http_client import copy_headers, request_with_retry
+from fields import parse_fields, projected_response, upstream_url
+from http_client import copy_headers, open_stream, request_with_retry
+from models.batch_models import BatchGetRequest
+from negative_cache import NegativeCache
+from response_cache import ResponseCache, cached_get
+from singleflight import SingleFlight
 
 router = APIRouter(prefix="/items", tags=["items"])
 
@@ -16,24 +32,86 @@ async def list_items(
     request: Request,
     page_size: Optional[int] = Query(default=None, alias="pageSize"),
     page_token: Optional[str] = Query(default=None, alias="pageToken"),
+    fields: Optional[str] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None),
     client: AsyncClient = Depends(get_http_client),
+    singleflight: Optional[SingleFlight] = Depends(get_singleflight),
     settings: Settings = Depends(get_settings_from_app),
 ):
     size = settings.clamp_page_size(page_size)
+    fieldset = parse_fields(fields)
     params = dict(request.query_params)
+    params.pop("fields", None)
     params["pageSize"] = size
     if page_token:
         params["pageToken"] = page_token
 
-    upstream = await request_with_retry(
-        client,
-        "GET",
-        f"{settings.catalog_svc_base}/catalog/items",
-        params=params,
-        retries=settings.http_retries,
-    )
+    url = upstream_url(f"{settings.catalog_svc_base}/catalog/items", fieldset, settings, "catalog")
+    if fieldset is not None:
+        # Projection needs the decoded page, so the raw stream cannot be relayed.
+        upstream = await request_with_retry(
+            client,
+            "GET",
+            url,
+            params=params,
+            retries=settings.http_retries,
+            singleflight=singleflight,
+        )
+        upstream.raise_for_status()
+        etag = upstream.headers.get("etag") or strong_etag_bytes(upstream.content)
+        return projected_response(
+            upstream,
+            etag,
+            fieldset,
+            if_none_match,
+            rows="items",
+            allow=["Cache-Control", "Next-Page-Token"],
+        )
+    if settings.items_stream_passthrough:
+        # Ask for whatever encoding our caller accepts so raw bytes can be relayed,
+        # limited to ones httpx can decode should the body have to be buffered.
+        # A streamed body has a single reader, so this path is not coalesced;
+        # singleflight only covers the buffered paths below and above.
+        upstream = await open_stream(
+            client,
+            "GET",
+            url,
+            params=params,
+            headers={
+                "Accept-Encoding": _decodable_encodings(request.headers.get("accept-encoding")),
+                **conditional_headers(if_none_match),
+            },
+            retries=settings.http_retries,
+        )
+        etag = upstream.headers.get("etag")
+        if upstream.status_code == 304 or (
+            upstream.is_success and check_not_modified(if_none_match, etag)
+        ):
+            await upstream.aclose()
+            return not_modified(etag, upstream.headers)
+        if upstream.is_success and (etag or settings.items_stream_etag_fallback == "none"):
+            return _stream_passthrough(upstream, etag)
+        # No upstream validator: buffer once so the ETag can be precomputed.
+        try:
+            await upstream.aread()
+        finally:
+            await upstream.aclose()
+    else:
+        upstream = await request_with_retry(
+            client,
+            "GET",
+            url,
+            params=params,
+            headers=conditional_headers(if_none_match),
+            retries=settings.http_retries,
+            singleflight=singleflight,
+        )
+    if upstream.status_code == 304:
+        return not_modified(upstream.headers.get("etag"), upstream.headers)
     upstream.raise_for_status()
     etag = upstream.headers.get("etag") or strong_etag_bytes(upstream.content)
+    if unchanged := check_not_modified(if_none_match, etag, upstream.headers):
+        return unchanged
     response = Response(
         content=upstream.content,
         media_type=upstream.headers.get("content-type", "application/json"),
@@ -44,27 +122,127 @@ async def list_items(
     return response
 
 
+def _decodable_encodings(accept_encoding: Optional[str]) -> str:
+    """The caller's ``Accept-Encoding`` without codings httpx cannot decode."""
+    codings = [
+        coding.strip()
+        for coding in (accept_encoding or "").split(",")
+        if coding.split(";", 1)[0].strip().lower() in SUPPORTED_DECODERS
+    ]
+    return ", ".join(codings) or "identity"
+
+
+async def _relay(upstream: HTTPXResponse) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in upstream.aiter_raw():
+            yield chunk
+    finally:
+        await upstream.aclose()
+
+
+def _stream_passthrough(upstream: HTTPXResponse, etag: Optional[str]) -> StreamingResponse:
+    response = StreamingResponse(
+        _relay(upstream),
+        status_code=upstream.status_code,
+        media_type=upstream.headers.get("content-type", "application/json"),
+        background=BackgroundTask(upstream.aclose),
+    )
+    if etag:
+        response.headers["ETag"] = etag
+    copy_headers(
+        upstream.headers,
+        response.headers,
+        allow=["Cache-Control", "Next-Page-Token", "Content-Encoding", "Content-Length"],
+    )
+    return response
+
+
+@router.post(":batchGet")
+async def batch_get_items(
+    body: BatchGetRequest,
+    fields: Optional[str] = Query(default=None),
+    client: AsyncClient = Depends(get_http_client),
+    cache: Optional[ResponseCache] = Depends(get_response_cache),
+    singleflight: Optional[SingleFlight] = Depends(get_singleflight),
+    negative: Optional[NegativeCache] = Depends(get_negative_cache),
+    settings: Settings = Depends(get_settings_from_app),
+):
+    fieldset = parse_fields(fields)
+    results, errors = await batch_get(
+        unique_ids(body.ids, settings.batch_get_max_ids),
+        lambda item_id: cached_get(
+            cache,
+            client,
+            upstream_url(
+                f"{settings.catalog_svc_base}/catalog/items/{item_id}",
+                fieldset,
+                settings,
+                "catalog",
+            ),
+            retries=settings.http_retries,
+            singleflight=singleflight,
+        ),
+        concurrency=settings.batch_get_concurrency,
+        not_found_code="ITEM_NOT_FOUND",
+        not_found_message="Item not found",
+    )
+    if negative is not None:
+        negative.observe_batch("items", results, errors)
+    if fieldset is not None:
+        fieldset.project_results(results)
+    return {"results": results, "errors": errors}
+
+
 @router.get("/{item_id}")
 async def get_item(
     item_id: str,
+    fields: Optional[str] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None),
     client: AsyncClient = Depends(get_http_client),
+    cache: Optional[ResponseCache] = Depends(get_response_cache),
+    singleflight: Optional[SingleFlight] = Depends(get_singleflight),
+    negative: Optional[NegativeCache] = Depends(get_negative_cache),
     settings: Settings = Depends(get_settings_from_app),
 ):
-    upstream = await request_with_retry(
+    fieldset = parse_fields(fields)
+    upstream = await cached_get(
+        cache,
         client,
-        "GET",
-        f"{settings.catalog_svc_base}/catalog/items/{item_id}",
+        upstream_url(
+            f"{settings.catalog_svc_base}/catalog/items/{item_id}", fieldset, settings, "catalog"
+        ),
+        # A projection's validator is ours, not the catalog's.
+        headers=None if fieldset else conditional_headers(if_none_match),
         retries=settings.http_retries,
+        singleflight=singleflight,
     )
+    if negative is not None:
+        negative.observe("items", item_id, upstream.status_code)
+    if upstream.status_code == 304:
+        return not_modified(upstream.headers.get("etag"), upstream.headers)
     if upstream.status_code == 404:
         raise HTTPException(status_code=404, detail="Item not found")
     upstream.raise_for_status()
     etag = upstream.headers.get("etag") or strong_etag_bytes(upstream.content)
+    if fieldset is not None:
+        return projected_response(
+            upstream,
+            etag,
+            fieldset,
+            if_none_match,
+            allow=["Cache-Control", "Last-Modified", "Age", "X-Cache", "Warning"],
+        )
+    if unchanged := check_not_modified(if_none_match, etag, upstream.headers):
+        return unchanged
     response = Response(
         content=upstream.content,
         media_type=upstream.headers.get("content-type", "application/json"),
         status_code=upstream.status_code,
     )
     response.headers["ETag"] = etag
-    copy_headers(upstream.headers, response.headers, allow=["Cache-Control", "Last-Modified"])
+    copy_headers(
+        upstream.headers,
+        response.headers,
+        allow=["Cache-Control", "Last-Modified", "Age", "X-Cache", "Warning"],
+    )
     return response
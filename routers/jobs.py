@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
+import json
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from httpx import AsyncClient
 
+from conditional import check_not_modified
 from config import Settings
-from deps import get_http_client, get_settings_from_app
+from deps import get_http_client, get_job_poller, get_settings_from_app
 from http_client import request_with_retry
+from job_poller import JobPoller, JobSnapshot, parse_wait
 
 router = APIRouter(tags=["jobs"])
 
@@ -33,9 +39,22 @@ async def confirm_order(
 @router.get("/jobs/{job_id}")
 async def get_job_status(
     job_id: str,
+    wait: Optional[str] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None),
     client: AsyncClient = Depends(get_http_client),
+    poller: Optional[JobPoller] = Depends(get_job_poller),
     settings: Settings = Depends(get_settings_from_app),
 ):
+    if poller is not None:
+        timeout = parse_wait(wait, settings.job_wait_max_seconds)
+        if timeout:
+            snapshot = await poller.wait(job_id, if_none_match, timeout)
+        else:
+            snapshot = await poller.current(job_id)
+        if unchanged := check_not_modified(if_none_match, snapshot.etag):
+            return unchanged
+        return JSONResponse(snapshot.body, headers={"ETag": snapshot.etag})
+
     upstream = await request_with_retry(
         client,
         "GET",
@@ -46,3 +65,33 @@ async def get_job_status(
         raise HTTPException(status_code=404, detail="Job not found")
     upstream.raise_for_status()
     return upstream.json()
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_status(
+    job_id: str,
+    last_event_id: Optional[str] = Header(default=None),
+    poller: Optional[JobPoller] = Depends(get_job_poller),
+):
+    if poller is None:
+        raise HTTPException(status_code=404, detail="Job streaming is disabled")
+    try:
+        last_version = int(last_event_id or 0)
+    except ValueError:
+        last_version = 0
+    # Resolve the first snapshot up front so a missing job is a plain 404.
+    await poller.current(job_id)
+    return StreamingResponse(
+        _events(poller.subscribe(job_id, last_version)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+async def _events(snapshots: AsyncIterator[Optional[JobSnapshot]]) -> AsyncIterator[bytes]:
+    async for snapshot in snapshots:
+        if snapshot is None:
+            yield b": keep-alive\n\n"
+            continue
+        data = json.dumps(snapshot.body, separators=(",", ":"))
+        yield f"id: {snapshot.version}\nevent: status\ndata: {data}\n\n".encode("utf-8")
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Request, Response
+
+import metrics
+
+router = APIRouter(tags=["metrics"])
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    state = request.app.state
+    pools = {"shared": getattr(state, "http_client", None)}
+    fanout = getattr(state, "fanout", None)
+    if fanout is not None and fanout.sync_client is not None:
+        pools["fanout"] = fanout.sync_client
+    body = metrics.REGISTRY.render() + "\n".join(metrics.pool_lines(pools)) + "\n"
+    return Response(content=body, media_type=CONTENT_TYPE)
@@ -1,110 +1,217 @@
 from __future__ import annotations
 
-import asyncio
-import time
+from dataclasses import dataclass
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, Header, Query, Response
 from httpx import AsyncClient, Response as HTTPXResponse
 
+import server_timing
+from aggregate.search_cache import SearchCache
+from batch import batch_get, unique_ids
+from conditional import check_not_modified, conditional_headers, not_modified
 from config import Settings
-from deps import get_http_client, get_settings_from_app
+from dag import Step, run_dag
+from deps import (
+    get_fanout_engine,
+    get_http_client,
+    get_idempotency_store,
+    get_negative_cache,
+    get_response_cache,
+    get_search_cache,
+    get_settings_from_app,
+    get_singleflight,
+)
 from error_model import http_error
+from expand import expand_orders, parse_expand, reference_fields
 from etag import combined_etag, strong_etag_bytes
-from http_client import (
-    create_sync_client,
-    request_with_retry,
-    request_with_retry_sync,
+from fanout import FanoutEngine
+from fields import Fieldset, parse_fields, upstream_url
+from http_client import copy_headers, request_with_retry
+from idempotency import (
+    IDEMPOTENCY_HEADER,
+    IdempotencyStore,
+    StoredResponse,
+    request_fingerprint,
 )
+from models.batch_models import BatchGetRequest
 from models.order_models import OrderCreate
+from negative_cache import NegativeCache
+from response_cache import ResponseCache, cached_get
+from singleflight import SingleFlight
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 
-async def _fetch_in_thread(url: str, settings: Settings) -> HTTPXResponse:
-    def _call() -> HTTPXResponse:
-        client = create_sync_client(settings)
-        try:
-            return request_with_retry_sync(
-                client, "GET", url, retries=settings.http_retries
-            )
-        finally:
-            client.close()
-
-    return await asyncio.to_thread(_call)
+@dataclass
+class _CreateAttempt:
+    posted: bool = False
+    rejected: bool = False
 
 
 @router.post("", status_code=201)
 async def create_order(
     order: OrderCreate,
     response: Response,
+    idempotency_key: Optional[str] = Header(default=None),
     client: AsyncClient = Depends(get_http_client),
+    fanout: FanoutEngine = Depends(get_fanout_engine),
+    search_cache: Optional[SearchCache] = Depends(get_search_cache),
+    negative: Optional[NegativeCache] = Depends(get_negative_cache),
+    idempotency: Optional[IdempotencyStore] = Depends(get_idempotency_store),
     settings: Settings = Depends(get_settings_from_app),
 ):
-    if not order.userId or not order.itemId:
-        raise http_error(
-            422, code="FK_VALIDATION_FAILED", message="userId and itemId are required"
+    attempt = _CreateAttempt()
+
+    def run():
+        return _create_order(
+            order,
+            response,
+            client,
+            fanout,
+            search_cache,
+            negative,
+            settings,
+            idempotency_key,
+            attempt,
         )
 
-    fanout_start = time.perf_counter()
-    user_resp, item_resp = await asyncio.gather(
-        _fetch_in_thread(f"{settings.user_svc_base}/users/{order.userId}", settings),
-        _fetch_in_thread(f"{settings.catalog_svc_base}/catalog/items/{order.itemId}", settings),
+    if idempotency is None or idempotency_key is None:
+        return await run()
+    # Duplicates get the first attempt's stored response without any fan-out.
+    stored = await idempotency.acquire(
+        idempotency_key, request_fingerprint(order.model_dump(exclude_none=True))
+    )
+    if stored is not None:
+        return stored.to_response()
+    try:
+        # The pipeline has no deadline by default, so keep the claim alive for
+        # however long it takes; an expired lease would let a retry re-run it.
+        async with idempotency.hold(idempotency_key):
+            payload = await run()
+    except BaseException as exc:
+        if attempt.posted and not attempt.rejected:
+            # The order may exist upstream: replay this outcome instead of re-running.
+            await idempotency.complete(idempotency_key, StoredResponse.from_exception(exc))
+        else:
+            await idempotency.release(idempotency_key)
+        raise
+    result = server_timing.TimedJSONResponse(
+        payload, status_code=201, headers=dict(response.headers)
     )
-    fanout_elapsed_ms = int((time.perf_counter() - fanout_start) * 1000)
+    await idempotency.complete(idempotency_key, StoredResponse.capture(result))
+    return result
 
-    if user_resp.status_code == 404:
-        raise http_error(
-            422, code="FK_USER_NOT_FOUND", message="Referenced user does not exist"
-        )
-    if item_resp.status_code == 404:
+
+async def _create_order(
+    order: OrderCreate,
+    response: Response,
+    client: AsyncClient,
+    fanout: FanoutEngine,
+    search_cache: Optional[SearchCache],
+    negative: Optional[NegativeCache],
+    settings: Settings,
+    idempotency_key: Optional[str],
+    attempt: _CreateAttempt,
+):
+    if not order.userId or not order.itemId:
         raise http_error(
-            422, code="FK_ITEM_NOT_FOUND", message="Referenced item does not exist"
+            422, code="FK_VALIDATION_FAILED", message="userId and itemId are required"
         )
-    user_resp.raise_for_status()
-    item_resp.raise_for_status()
+    # IDs confirmed missing moments ago are rejected without any upstream call.
+    if negative is not None and negative.is_missing("users", order.userId):
+        raise _user_not_found()
+    if negative is not None and negative.is_missing("items", order.itemId):
+        raise _item_not_found()
 
-    # Extract SKU from item response for availability check
-    item_data = item_resp.json()
-    item_sku = item_data.get("sku") or item_data.get("id")  # Fallback to id if sku not present
+    user_url = f"{settings.user_svc_base}/users/{order.userId}"
+    item_url = f"{settings.catalog_svc_base}/catalog/items/{order.itemId}"
 
-    availability_params = {
-        "sku": item_sku,
-        "start_date": order.startDate,
-        "end_date": order.endDate,
-    }
-    availability_params = {k: v for k, v in availability_params.items() if v}
+    async def lookup_user(_):
+        resp = await fanout.get(user_url)
+        if negative is not None:
+            negative.observe("users", order.userId, resp.status_code)
+        if resp.status_code == 404:
+            raise _user_not_found()
+        resp.raise_for_status()
+        return resp
 
-    availability_resp = await request_with_retry(
-        client,
-        "GET",
-        f"{settings.catalog_svc_base}/availability",
-        params=availability_params,
-        retries=settings.http_retries,
-    )
-    if availability_resp.status_code == 409:
-        raise http_error(
-            409,
-            code="ITEM_UNAVAILABLE",
-            message="Item is not available for the requested window",
-        )
-    availability_resp.raise_for_status()
+    async def lookup_item(_):
+        resp = await fanout.get(item_url)
+        if negative is not None:
+            negative.observe("items", order.itemId, resp.status_code)
+        if resp.status_code == 404:
+            raise _item_not_found()
+        resp.raise_for_status()
+        return resp
 
-    create_resp = await request_with_retry(
-        client,
-        "POST",
-        f"{settings.order_svc_base}/orders",
-        json=order.model_dump(exclude_none=True),
-        retries=settings.http_retries,
-    )
-    if create_resp.status_code >= 400:
-        if create_resp.status_code == 409:
+    async def check_availability(deps):
+        # Extract SKU from item response for availability check
+        item_data = server_timing.json_body(deps["item"])
+        item_sku = item_data.get("sku") or item_data.get("id")  # Fallback to id if sku not present
+
+        availability_params = {
+            "sku": item_sku,
+            "start_date": order.startDate,
+            "end_date": order.endDate,
+        }
+        availability_params = {k: v for k, v in availability_params.items() if v}
+
+        availability_resp = await request_with_retry(
+            client,
+            "GET",
+            f"{settings.catalog_svc_base}/availability",
+            params=availability_params,
+            retries=settings.http_retries,
+        )
+        if availability_resp.status_code == 409:
             raise http_error(
                 409,
-                code="ORDER_CONFLICT",
-                message="Order service rejected the request",
-                details=create_resp.json(),
+                code="ITEM_UNAVAILABLE",
+                message="Item is not available for the requested window",
             )
-        create_resp.raise_for_status()
+        availability_resp.raise_for_status()
+        return availability_resp
+
+    async def place_order(_):
+        attempt.posted = True
+        create_resp = await request_with_retry(
+            client,
+            "POST",
+            f"{settings.order_svc_base}/orders",
+            json=order.model_dump(exclude_none=True),
+            # Lets an order service that honours the key dedupe our own 5xx retries.
+            headers={IDEMPOTENCY_HEADER: idempotency_key} if idempotency_key else None,
+            retries=settings.http_retries,
+        )
+        # A 4xx answer means the order service created nothing.
+        attempt.rejected = 400 <= create_resp.status_code < 500
+        if create_resp.status_code >= 400:
+            if create_resp.status_code == 409:
+                raise http_error(
+                    409,
+                    code="ORDER_CONFLICT",
+                    message="Order service rejected the request",
+                    details=create_resp.json(),
+                )
+            create_resp.raise_for_status()
+        return create_resp
+
+    # Availability only needs the item, so it starts while the user lookup runs.
+    steps = [
+        Step("user", lookup_user),
+        Step("item", lookup_item),
+        Step("availability", check_availability, after=("item",)),
+        Step("order", place_order, after=("user", "availability")),
+    ]
+    dag = await run_dag(steps)
+    for name, timing in dag.timings.items():
+        server_timing.record(f"step-{name}", timing.finished - timing.started)
+    user_resp = dag.results["user"]
+    item_resp = dag.results["item"]
+    create_resp = dag.results["order"]
+    if search_cache is not None:
+        search_cache.invalidate("orders")
 
     composite_etag = combined_etag(
         [
@@ -116,38 +223,198 @@ async def create_order(
     if not composite_etag:
         composite_etag = strong_etag_bytes(create_resp.content)
 
-    payload = create_resp.json()
+    payload = server_timing.json_body(create_resp)
     response.headers["Location"] = create_resp.headers.get(
         "Location", f"/orders/{payload.get('id', '')}"
     )
     response.headers["ETag"] = composite_etag
-    response.headers["X-Composite-Parallel-Ms"] = str(fanout_elapsed_ms)
-    response.headers["X-Composite-Fanout"] = "user,item,availability,order"
-    response.headers["X-Composite-Threaded"] = "true"
+    response.headers["X-Composite-Parallel-Ms"] = str(dag.finished_ms(("user", "item")))
+    response.headers["X-Composite-Fanout"] = ",".join(dag.critical_path(steps))
+    response.headers["X-Composite-Timings"] = ",".join(
+        f"{name}={timing.duration_ms}" for name, timing in dag.timings.items()
+    )
+    response.headers["X-Composite-Threaded"] = "true" if fanout.threaded else "false"
     response.status_code = 201
     return payload
 
 
+def _user_not_found():
+    return http_error(422, code="FK_USER_NOT_FOUND", message="Referenced user does not exist")
+
+
+def _item_not_found():
+    return http_error(422, code="FK_ITEM_NOT_FOUND", message="Referenced item does not exist")
+
+
+def _reference_fetchers(
+    client: AsyncClient,
+    cache: Optional[ResponseCache],
+    singleflight: Optional[SingleFlight],
+    settings: Settings,
+):
+    def fetcher(base: str):
+        return lambda entity_id: cached_get(
+            cache,
+            client,
+            f"{base}/{entity_id}",
+            retries=settings.http_retries,
+            singleflight=singleflight,
+        )
+
+    return {
+        "user": fetcher(f"{settings.user_svc_base}/users"),
+        "item": fetcher(f"{settings.catalog_svc_base}/catalog/items"),
+    }
+
+
+@router.post(":batchGet")
+async def batch_get_orders(
+    body: BatchGetRequest,
+    expand: Optional[str] = Query(default=None),
+    fields: Optional[str] = Query(default=None),
+    client: AsyncClient = Depends(get_http_client),
+    cache: Optional[ResponseCache] = Depends(get_response_cache),
+    singleflight: Optional[SingleFlight] = Depends(get_singleflight),
+    negative: Optional[NegativeCache] = Depends(get_negative_cache),
+    settings: Settings = Depends(get_settings_from_app),
+):
+    names = parse_expand(expand)
+    fieldset = parse_fields(fields)
+    results, errors = await batch_get(
+        unique_ids(body.ids, settings.batch_get_max_ids),
+        lambda order_id: cached_get(
+            cache,
+            client,
+            upstream_url(
+                f"{settings.order_svc_base}/orders/{order_id}",
+                fieldset,
+                settings,
+                "orders",
+                required=reference_fields(names),
+            ),
+            retries=settings.http_retries,
+            singleflight=singleflight,
+            stale=False,
+        ),
+        concurrency=settings.batch_get_concurrency,
+        not_found_code="ORDER_NOT_FOUND",
+        not_found_message="Order not found",
+    )
+    if names and results:
+        # References shared by several orders are fetched once for the batch.
+        entries = list(results.values())
+        parts = await expand_orders(
+            [entry["data"] for entry in entries],
+            names,
+            _reference_fetchers(client, cache, singleflight, settings),
+            concurrency=settings.batch_get_concurrency,
+            negative=negative,
+        )
+        for entry, entry_parts in zip(entries, parts):
+            entry["etag"] = combined_etag([entry["etag"], *entry_parts])
+    if fieldset is not None:
+        fieldset.project_results(results)
+    return {"results": results, "errors": errors}
+
+
 @router.get("/{order_id}")
 async def get_order(
     order_id: str,
+    expand: Optional[str] = Query(default=None),
+    fields: Optional[str] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None),
     client: AsyncClient = Depends(get_http_client),
+    cache: Optional[ResponseCache] = Depends(get_response_cache),
+    singleflight: Optional[SingleFlight] = Depends(get_singleflight),
+    negative: Optional[NegativeCache] = Depends(get_negative_cache),
     settings: Settings = Depends(get_settings_from_app),
 ):
-    upstream = await request_with_retry(
+    names = parse_expand(expand)
+    fieldset = parse_fields(fields)
+    upstream = await cached_get(
+        cache,
         client,
-        "GET",
-        f"{settings.order_svc_base}/orders/{order_id}",
+        upstream_url(
+            f"{settings.order_svc_base}/orders/{order_id}",
+            fieldset,
+            settings,
+            "orders",
+            required=reference_fields(names),
+        ),
+        # The client's validator is for the expanded or projected
+        # representation, which the order service has never seen.
+        headers=None if names or fieldset else conditional_headers(if_none_match),
         retries=settings.http_retries,
+        singleflight=singleflight,
+        # Order status changes (confirm, jobs) must never be hidden behind a
+        # stale copy; catalog and user reads keep stale serving.
+        stale=False,
     )
+    if upstream.status_code == 304:
+        return not_modified(upstream.headers.get("etag"), upstream.headers)
     if upstream.status_code == 404:
         raise http_error(404, code="ORDER_NOT_FOUND", message="Order not found")
     upstream.raise_for_status()
+    etag = upstream.headers.get("etag") or strong_etag_bytes(upstream.content)
+    if names or fieldset:
+        return await _shaped_order(
+            upstream,
+            etag,
+            names,
+            fieldset,
+            if_none_match,
+            client,
+            cache,
+            singleflight,
+            negative,
+            settings,
+        )
+    if unchanged := check_not_modified(if_none_match, etag, upstream.headers):
+        return unchanged
     response = Response(
         content=upstream.content,
         media_type=upstream.headers.get("content-type", "application/json"),
         status_code=upstream.status_code,
     )
-    etag = upstream.headers.get("etag") or strong_etag_bytes(upstream.content)
     response.headers["ETag"] = etag
+    copy_headers(
+        upstream.headers,
+        response.headers,
+        allow=["Cache-Control", "Last-Modified", "Age", "X-Cache", "Warning"],
+    )
     return response
+
+
+async def _shaped_order(
+    upstream: HTTPXResponse,
+    etag: str,
+    names: List[str],
+    fieldset: Optional[Fieldset],
+    if_none_match: Optional[str],
+    client: AsyncClient,
+    cache: Optional[ResponseCache],
+    singleflight: Optional[SingleFlight],
+    negative: Optional[NegativeCache],
+    settings: Settings,
+):
+    payload = server_timing.json_body(upstream)
+    if names:
+        (parts,) = await expand_orders(
+            [payload],
+            names,
+            _reference_fetchers(client, cache, singleflight, settings),
+            concurrency=settings.batch_get_concurrency,
+            negative=negative,
+        )
+        etag = combined_etag([etag, *parts])
+    partial = "expandErrors" in payload
+    if fieldset is not None:
+        payload = fieldset.project(payload)
+        etag = fieldset.etag(etag)
+    if unchanged := check_not_modified(if_none_match, etag):
+        return unchanged
+    headers = {"ETag": etag}
+    if partial:
+        # Partial representations must not be reused once the reference recovers.
+        headers["Cache-Control"] = "no-store"
+    return server_timing.TimedJSONResponse(payload, headers=headers)
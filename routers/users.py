@@ -1,38 +1,87 @@
 from typing import Optional
 
-from fastapi import APIRouter, Depends, Header, Response
+from fastapi import APIRouter, Depends, Header, Query, Response
 from httpx import AsyncClient
 
+from batch import batch_get, unique_ids
+from conditional import check_not_modified, conditional_headers, not_modified
 from config import Settings
-from deps import get_http_client, get_settings_from_app
+from deps import (
+    get_http_client,
+    get_negative_cache,
+    get_response_cache,
+    get_settings_from_app,
+    get_singleflight,
+)
 from error_model import http_error
 from etag import strong_etag_bytes
-from http_client import copy_headers, request_with_retry
+from fields import parse_fields, projected_response, upstream_url
+from http_client import copy_headers
+from models.batch_models import BatchGetRequest
+from negative_cache import NegativeCache
+from response_cache import ResponseCache, cached_get
+from singleflight import SingleFlight
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
+@router.post(":batchGet")
+async def batch_get_users(
+    body: BatchGetRequest,
+    fields: Optional[str] = Query(default=None),
+    client: AsyncClient = Depends(get_http_client),
+    cache: Optional[ResponseCache] = Depends(get_response_cache),
+    singleflight: Optional[SingleFlight] = Depends(get_singleflight),
+    negative: Optional[NegativeCache] = Depends(get_negative_cache),
+    settings: Settings = Depends(get_settings_from_app),
+):
+    fieldset = parse_fields(fields)
+    results, errors = await batch_get(
+        unique_ids(body.ids, settings.batch_get_max_ids),
+        lambda user_id: cached_get(
+            cache,
+            client,
+            upstream_url(f"{settings.user_svc_base}/users/{user_id}", fieldset, settings, "users"),
+            retries=settings.http_retries,
+            singleflight=singleflight,
+        ),
+        concurrency=settings.batch_get_concurrency,
+        not_found_code="USER_NOT_FOUND",
+        not_found_message="User not found",
+    )
+    if negative is not None:
+        negative.observe_batch("users", results, errors)
+    if fieldset is not None:
+        fieldset.project_results(results)
+    return {"results": results, "errors": errors}
+
+
 @router.get("/{user_id}")
 async def get_user(
     user_id: str,
-    if_none_match: Optional[str] = Header(default=None, convert_underscores=False),
+    fields: Optional[str] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None),
     client: AsyncClient = Depends(get_http_client),
+    cache: Optional[ResponseCache] = Depends(get_response_cache),
+    singleflight: Optional[SingleFlight] = Depends(get_singleflight),
+    negative: Optional[NegativeCache] = Depends(get_negative_cache),
     settings: Settings = Depends(get_settings_from_app),
 ):
-    headers = {}
-    if if_none_match:
-        headers["If-None-Match"] = if_none_match
-
-    upstream = await request_with_retry(
+    fieldset = parse_fields(fields)
+    upstream = await cached_get(
+        cache,
         client,
-        "GET",
-        f"{settings.user_svc_base}/users/{user_id}",
-        headers=headers,
+        upstream_url(f"{settings.user_svc_base}/users/{user_id}", fieldset, settings, "users"),
+        # A projection's validator is ours, not the user service's.
+        headers=None if fieldset else conditional_headers(if_none_match),
         retries=settings.http_retries,
+        singleflight=singleflight,
     )
+    if negative is not None:
+        negative.observe("users", user_id, upstream.status_code)
 
     if upstream.status_code == 304:
-        return Response(status_code=304)
+        return not_modified(upstream.headers.get("etag"), upstream.headers)
 
     if upstream.status_code == 404:
         raise http_error(404, code="USER_NOT_FOUND", message="User not found")
@@ -40,6 +89,16 @@ async def get_user(
     upstream.raise_for_status()
 
     etag = upstream.headers.get("etag") or strong_etag_bytes(upstream.content)
+    if fieldset is not None:
+        return projected_response(
+            upstream,
+            etag,
+            fieldset,
+            if_none_match,
+            allow=["Cache-Control", "Last-Modified", "Age", "X-Cache", "Warning"],
+        )
+    if unchanged := check_not_modified(if_none_match, etag, upstream.headers):
+        return unchanged
 
     response = Response(
         content=upstream.content,
@@ -50,6 +109,6 @@ async def get_user(
     copy_headers(
         upstream.headers,
         response.headers,
-        allow=["Cache-Control", "Last-Modified"],
+        allow=["Cache-Control", "Last-Modified", "Age", "X-Cache", "Warning"],
     )
     return response
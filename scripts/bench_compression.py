@@ -0,0 +1,92 @@
+"""CPU time per response against bytes saved, per encoding and level.
+
+Builds representative composite bodies (an ``/items`` page and a ``/search``
+page of synthetic catalog rows) and, for every encoding importable here,
+reports compressed size, ratio and the CPU microseconds spent per response
+both when compressing on every request and when serving the cached variant
+(``compression.VARIANTS``, keyed by ETag).
+
+Usage: python scripts/bench_compression.py [--rows 50] [--iterations 200]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import compression  # noqa: E402
+
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 5, 9), "zstd": (1, 3, 9)}
+BRANDS = ("Valentino", "Dior", "Chanel", "Prada", "Gucci", "Armani")
+
+
+def _rows(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"i-{n}",
+            "sku": f"SKU-{rng.randrange(10**6):06d}",
+            "name": f"{rng.choice(BRANDS)} gown {n}",
+            "brand": rng.choice(BRANDS),
+            "pricePerDay": round(rng.uniform(40, 400), 2),
+            "sizes": rng.sample(["XS", "S", "M", "L", "XL"], 3),
+            "description": "Hand-finished silk evening gown with a fitted bodice. " * 3,
+        }
+        for n in range(count)
+    ]
+
+
+def _bodies(rows):
+    items = {"items": _rows(rows), "nextPageToken": "eyJvIjoxMH0"}
+    search = {
+        "results": [
+            {"source": "catalog", "score": round(1 / (n + 1), 4), "item": row}
+            for n, row in enumerate(_rows(rows, seed=11))
+        ],
+        "nextPageToken": "eyJ0IjpbXX0",
+    }
+    return {
+        "items page": json.dumps(items).encode(),
+        "search page": json.dumps(search).encode(),
+    }
+
+
+def _cpu_us(fn, iterations):
+    started = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - started) / iterations * 1e6
+
+
+def main(args):
+    encodings = compression.available_encodings("gzip,br,zstd")
+    print(f"encodings available: {', '.join(encodings)}")
+    print(f"{'body':<12} {'enc':<5} {'lvl':>3} {'bytes':>8} {'saved':>7} {'cpu us/req':>11} {'cached us/req':>14}")
+    for label, body in _bodies(args.rows).items():
+        print(f"{label:<12} {'-':<5} {'-':>3} {len(body):>8} {'0%':>7} {0:>11.1f} {0:>14.1f}")
+        for encoding in encodings:
+            for level in LEVELS[encoding]:
+                compressed = compression.VariantCache().compress(body, encoding, level)
+                cold = _cpu_us(
+                    lambda: compression.VariantCache().compress(body, encoding, level),
+                    args.iterations,
+                )
+                cache = compression.VariantCache()
+                key = ("/bench", '"etag"', len(body), encoding)
+                cache.compress(body, encoding, level, key)
+                warm = _cpu_us(lambda: cache.compress(body, encoding, level, key), args.iterations)
+                saved = 1 - len(compressed) / len(body)
+                print(
+                    f"{label:<12} {encoding:<5} {level:>3} {len(compressed):>8}"
+                    f" {saved:>7.0%} {cold:>11.1f} {warm:>14.1f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,96 @@
+"""Benchmark hedged reads against a local latency-injecting stub.
+
+The stub answers most requests in a few milliseconds but stalls a fraction of
+them (``--slow-rate``) for ``--slow-ms``, mimicking an occasionally slow Cloud
+Run instance. The same GET workload runs with hedging off and on.
+
+Usage: python scripts/bench_hedging.py [--requests 2000] [--slow-rate 0.03]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx  # noqa: E402
+
+from hedging import Hedger  # noqa: E402
+
+
+async def _serve(reader, writer, slow_rate, slow_ms):
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            if not head:
+                break
+            if random.random() < slow_rate:
+                await asyncio.sleep(slow_ms / 1000)
+            else:
+                await asyncio.sleep(random.uniform(0.002, 0.006))
+            body = b'{"id":"o-1","status":"pending"}'
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+def _pct(samples, pct):
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+async def _run(label, hedger, url, requests, concurrency):
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient() as client:
+
+        async def one():
+            async with gate:
+                started = time.perf_counter()
+                await hedger.request(client, "GET", url)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        await asyncio.gather(*(one() for _ in range(requests)))
+
+    latencies.sort()
+    extra = requests + hedger.hedged
+    print(
+        f"{label:>11}: p50={_pct(latencies, 50):6.1f}ms p95={_pct(latencies, 95):6.1f}ms "
+        f"p99={_pct(latencies, 99):6.1f}ms p99.9={_pct(latencies, 99.9):6.1f}ms "
+        f"hedged={hedger.hedged} wins={hedger.hedge_wins} "
+        f"upstream_load={extra / requests:.3f}x"
+    )
+
+
+async def main(args):
+    server = await asyncio.start_server(
+        lambda r, w: _serve(r, w, args.slow_rate, args.slow_ms), "127.0.0.1", 0
+    )
+    url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/orders/o-1"
+    async with server:
+        await _run("no hedging", Hedger(enabled=False), url, args.requests, args.concurrency)
+        await _run(
+            "hedged p95",
+            Hedger(enabled=True, percentile=95, budget_ratio=args.budget),
+            url,
+            args.requests,
+            args.concurrency,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-ms", type=float, default=250)
+    parser.add_argument("--budget", type=float, default=0.1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,57 @@
+"""Requests per second on /healthz through the composite middleware stack.
+
+Drives the ASGI app in-process (no sockets), so the number reflects
+middleware and routing overhead only. Run it on two checkouts to compare
+middleware stacks.
+
+Usage: python scripts/bench_middleware.py [--requests 5000] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+for name, value in (
+    ("USER_SVC_BASE", "http://users.invalid"),
+    ("CAT_SVC_BASE", "http://catalog.invalid"),
+    ("ORD_SVC_BASE", "http://orders.invalid"),
+):
+    os.environ.setdefault(name, value)
+
+import httpx  # noqa: E402
+
+from app import app  # noqa: E402
+
+
+async def _run(requests, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    gate = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one():
+            async with gate:
+                resp = await client.get("/healthz", headers={"X-Trace-Id": "bench"})
+                assert resp.status_code == 200
+
+        for _ in range(200):
+            await one()
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return requests / (time.perf_counter() - started)
+
+
+def main(args):
+    rates = [asyncio.run(_run(args.requests, args.concurrency)) for _ in range(args.rounds)]
+    print(f"/healthz: best {max(rates):,.0f} req/s, median {sorted(rates)[len(rates) // 2]:,.0f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=5)
+    main(parser.parse_args())
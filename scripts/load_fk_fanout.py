@@ -0,0 +1,126 @@
+"""Load test for the FK validation fan-out.
+
+Starts a local keep-alive HTTP stub that counts accepted TCP connections, then
+drives N concurrent user+item lookups through:
+
+* ``legacy``   - a fresh sync client per lookup on ``asyncio.to_thread``
+                 (the pre-FanoutEngine behaviour of ``POST /orders``)
+* ``threaded`` - ``FanoutEngine`` with its long-lived pool and executor
+* ``async``    - ``FanoutEngine`` over the shared AsyncClient
+
+Usage: python scripts/load_fk_fanout.py [--orders 200] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from config import get_settings  # noqa: E402
+from fanout import FanoutEngine  # noqa: E402
+from http_client import (  # noqa: E402
+    create_async_client,
+    create_sync_client,
+    request_with_retry_sync,
+)
+
+
+class _Stub(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+    connections = 0
+    lock = threading.Lock()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        body = json.dumps({"id": self.path.rsplit("/", 1)[-1]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def _legacy_get(url, settings):
+    def _call():
+        client = create_sync_client(settings)
+        try:
+            return request_with_retry_sync(client, "GET", url, retries=0)
+        finally:
+            client.close()
+
+    return await asyncio.to_thread(_call)
+
+
+async def _drive(label, get, base, orders, concurrency, server):
+    server.connections = 0
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one_order(n):
+        async with gate:
+            start = time.perf_counter()
+            await asyncio.gather(
+                get(f"{base}/users/u-{n}"), get(f"{base}/catalog/items/i-{n}")
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_order(n) for n in range(orders)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(
+        f"{label:>9}: {orders / elapsed:8.1f} orders/s  "
+        f"p50={statistics.median(latencies):6.2f}ms  "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1]:6.2f}ms  "
+        f"tcp_connections={server.connections}"
+    )
+
+
+async def main(orders, concurrency):
+    server = _Stub(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    settings = get_settings().model_copy(update={"http_retries": 0})
+
+    await _drive(
+        "legacy",
+        lambda url: _legacy_get(url, settings),
+        base,
+        orders,
+        concurrency,
+        server,
+    )
+    async with create_async_client(settings) as shared:
+        for mode in ("threaded", "async"):
+            engine = FanoutEngine(settings, shared, mode=mode)
+            try:
+                await _drive(mode, engine.get, base, orders, concurrency, server)
+            finally:
+                engine.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args.orders, args.concurrency))
@@ -0,0 +1,175 @@
+"""Per-request ``Server-Timing`` collection.
+
+When timing is enabled for a request (``SERVER_TIMING_ENABLED`` or the
+``X-Server-Timing: 1`` request header) a collector is placed in a contextvar;
+``request_with_retry``, routers and the JSON response class append phases to
+it and the middleware emits them as one ``Server-Timing`` header. With no
+collector every hook is a single contextvar lookup.
+"""
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from fastapi.responses import JSONResponse
+
+REQUEST_HEADER = b"x-server-timing"
+
+# Metric names must be HTTP tokens; unnamed upstreams are "host:port".
+_NON_TOKEN = re.compile(r"[^!#$%&'*+.^_`|~0-9A-Za-z-]")
+
+_collector: ContextVar[Optional["TimingCollector"]] = ContextVar(
+    "composite_server_timing", default=None
+)
+
+
+class TimingCollector:
+    __slots__ = ("entries", "started")
+
+    def __init__(self) -> None:
+        self.entries: List[Tuple[str, float, Optional[str]]] = []
+        self.started = time.perf_counter()
+
+    def add(self, name: str, seconds: float, desc: Optional[str] = None) -> None:
+        self.entries.append((name, seconds, desc))
+
+    def header(self) -> str:
+        parts = []
+        for name, seconds, desc in self.entries + [
+            ("total", time.perf_counter() - self.started, None)
+        ]:
+            part = f"{_NON_TOKEN.sub('_', name)};dur={seconds * 1000:.1f}"
+            if desc:
+                part += f';desc="{desc}"'
+            parts.append(part)
+        return ", ".join(parts)
+
+
+def current() -> Optional[TimingCollector]:
+    return _collector.get()
+
+
+def record(name: str, seconds: float, desc: Optional[str] = None) -> None:
+    collector = _collector.get()
+    if collector is not None:
+        collector.add(name, seconds, desc)
+
+
+@contextmanager
+def phase(name: str, desc: Optional[str] = None) -> Iterator[None]:
+    collector = _collector.get()
+    if collector is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        collector.add(name, time.perf_counter() - started, desc)
+
+
+def record_upstream(
+    upstream: str, method: str, status: Optional[int], attempt: int, elapsed: float
+) -> None:
+    collector = _collector.get()
+    if collector is not None:
+        collector.add(upstream, elapsed, f"{method} #{attempt} {status or 'error'}")
+
+
+def json_body(response: httpx.Response, name: str = "decode") -> Any:
+    """``response.json()`` recorded as a decode phase."""
+    with phase(name):
+        return response.json()
+
+
+class UpstreamTrace:
+    """httpx ``trace`` extension hook splitting one attempt into connect/TLS/TTFB.
+
+    httpcore resolves DNS inside ``connect_tcp``, so DNS is part of connect.
+    """
+
+    __slots__ = ("prefix", "_started")
+
+    STARTS = {
+        "connection.connect_tcp.started": "connect",
+        "connection.start_tls.started": "tls",
+        "http11.send_request_headers.started": "ttfb",
+        "http2.send_request_headers.started": "ttfb",
+    }
+    ENDS = {
+        "connection.connect_tcp.complete": "connect",
+        "connection.start_tls.complete": "tls",
+        "http11.receive_response_headers.complete": "ttfb",
+        "http2.receive_response_headers.complete": "ttfb",
+    }
+
+    def __init__(self, prefix: str) -> None:
+        self.prefix = prefix
+        self._started: Dict[str, float] = {}
+
+    def __call__(self, event: str, info: Dict[str, Any]) -> None:
+        phase_name = self.STARTS.get(event)
+        if phase_name is not None:
+            self._started[phase_name] = time.perf_counter()
+            return
+        phase_name = self.ENDS.get(event)
+        started = self._started.pop(phase_name, None) if phase_name else None
+        if started is not None:
+            record(f"{self.prefix}-{phase_name}", time.perf_counter() - started)
+
+    async def async_hook(self, event: str, info: Dict[str, Any]) -> None:
+        self(event, info)
+
+
+def trace_kwargs(kwargs: Dict[str, Any], prefix: str, *, is_async: bool) -> Dict[str, Any]:
+    """``kwargs`` with a phase-recording ``trace`` extension when timing is on."""
+    if _collector.get() is None:
+        return kwargs
+    tracer = UpstreamTrace(prefix)
+    extensions = dict(kwargs.get("extensions") or {})
+    extensions["trace"] = tracer.async_hook if is_async else tracer
+    return {**kwargs, "extensions": extensions}
+
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        with phase("serialize"):
+            return super().render(content)
+
+
+class ServerTimingMiddleware:
+    """Pure ASGI middleware installing a collector and emitting ``Server-Timing``."""
+
+    def __init__(self, app: Callable, *, enabled: Callable[[], bool]) -> None:
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        collector = TimingCollector()
+        token = _collector.set(collector)
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", collector.header().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _collector.reset(token)
+
+    def _wanted(self, scope: Dict[str, Any]) -> bool:
+        if self.enabled():
+            return True
+        for name, value in scope.get("headers", ()):
+            if name == REQUEST_HEADER:
+                return value.strip().lower() in (b"1", b"true", b"on")
+        return False
@@ -0,0 +1,96 @@
+"""Coalesce identical concurrent upstream reads into one in-flight call."""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Mapping, Optional, Tuple
+
+import httpx
+
+import deadline
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD"})
+
+# Request headers that change the upstream representation and so must be part
+# of the coalescing key.
+KEY_HEADERS = (
+    "accept",
+    "accept-encoding",
+    "accept-language",
+    "authorization",
+    "if-modified-since",
+    "if-none-match",
+    "x-fields",
+)
+
+
+def request_key(
+    method: str,
+    url: str,
+    *,
+    params: Any = None,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Tuple[str, str, Tuple[Tuple[str, str], ...]]:
+    full_url = str(httpx.URL(url, params=params)) if params else url
+    lowered = {k.lower(): v for k, v in (headers or {}).items()}
+    relevant = tuple((name, lowered[name]) for name in KEY_HEADERS if name in lowered)
+    return method.upper(), full_url, relevant
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Future[Any]") -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Share one upstream call between every concurrent caller with the same key.
+
+    The call runs in its own task, without the leader's deadline, so a leader
+    whose client disconnects or whose deadline is short does not cut it off for
+    the followers; it is only cancelled once every waiter is gone.
+    Callers must treat the shared result as read-only.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+
+    def clear(self) -> None:
+        self.leaders = self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._inflight.get(key)
+        if flight is None:
+            # The call serves every waiter, so it must not inherit the leader's
+            # deadline; each caller still bounds its own wait.
+            task = asyncio.get_running_loop().create_task(
+                call(), context=deadline.without_deadline()
+            )
+            flight = _Flight(task)
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Everyone waiting on this call went away; stop paying for it.
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
@@ -11,7 +11,10 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
+import compression
 from app import app
+from circuit_breaker import UPSTREAMS
+from hedging import HEDGER
 
 
 @pytest.fixture(scope="session")
@@ -19,3 +22,33 @@ def client() -> Generator[TestClient, None, None]:
     """Return a FastAPI TestClient backed by the real application instance."""
     with TestClient(app) as test_client:
         yield test_client
+
+
+async def _reset() -> None:
+    # Runs on the app's loop: cancelling background polls and refreshes is loop-local.
+    for name in ("job_poller", "response_cache"):
+        component = getattr(app.state, name, None)
+        if component is not None:
+            await component.close()
+    for name in (
+        "singleflight",
+        "search_overflow",
+        "search_cache",
+        "fk_negative_cache",
+        "idempotency_store",
+    ):
+        component = getattr(app.state, name, None)
+        if component is not None:
+            component.clear()
+    UPSTREAMS.clear()
+    HEDGER.clear()
+    compression.VARIANTS.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_caches(client: TestClient) -> Generator[None, None, None]:
+    """Drop in-process state so tests do not depend on execution order."""
+    client.portal.call(_reset)
+    yield
+    # Background job polls must not outlive the test's upstream mocks.
+    client.portal.call(_reset)
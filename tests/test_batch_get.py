@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app import app
+
+
+def test_batch_get_dedupes_and_keeps_entry_etags(client, respx_mock):
+    route = respx_mock.get("https://users.service.test/users/u-1").mock(
+        return_value=httpx.Response(200, json={"id": "u-1"}, headers={"ETag": '"u1"'})
+    )
+    respx_mock.get("https://users.service.test/users/u-2").mock(
+        return_value=httpx.Response(200, json={"id": "u-2"})
+    )
+    respx_mock.get("https://users.service.test/users/u-404").mock(
+        return_value=httpx.Response(404)
+    )
+
+    resp = client.post("/users:batchGet", json={"ids": ["u-1", "u-2", "u-1", "u-404"]})
+
+    body = resp.json()
+    assert resp.status_code == 200
+    assert list(body["results"]) == ["u-1", "u-2"]
+    assert body["results"]["u-1"] == {"etag": '"u1"', "data": {"id": "u-1"}}
+    assert body["results"]["u-2"]["etag"].startswith('"')
+    assert body["errors"] == {
+        "u-404": {"code": "USER_NOT_FOUND", "message": "User not found", "details": {"status": 404}}
+    }
+    assert route.call_count == 1
+
+
+def test_upstream_failures_are_reported_per_id(client, respx_mock):
+    respx_mock.get("https://catalog.service.test/catalog/items/i-1").mock(
+        return_value=httpx.Response(200, json={"id": "i-1"})
+    )
+    respx_mock.get("https://catalog.service.test/catalog/items/i-2").mock(
+        return_value=httpx.Response(500)
+    )
+
+    body = client.post("/items:batchGet", json={"ids": ["i-1", "i-2"]}).json()
+
+    assert list(body["results"]) == ["i-1"]
+    assert body["errors"]["i-2"]["code"] == "UPSTREAM_500"
+
+
+def test_concurrency_is_bounded(client, respx_mock, monkeypatch):
+    monkeypatch.setattr(app.state.settings, "batch_get_concurrency", 3)
+    in_flight = {"now": 0, "peak": 0}
+
+    async def slow_order(request):
+        in_flight["now"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        await asyncio.sleep(0.02)
+        in_flight["now"] -= 1
+        return httpx.Response(200, json={"id": request.url.path.rsplit("/", 1)[-1]})
+
+    respx_mock.get(url__regex=r"https://orders\.service\.test/orders/o-\d+").mock(
+        side_effect=slow_order
+    )
+
+    ids = [f"o-{n}" for n in range(10)]
+    body = client.post("/orders:batchGet", json={"ids": ids}).json()
+
+    assert sorted(body["results"]) == sorted(ids)
+    assert in_flight["peak"] == 3
+
+
+def test_oversized_batch_rejected(client: TestClient, monkeypatch):
+    monkeypatch.setattr(app.state.settings, "batch_get_max_ids", 2)
+
+    resp = client.post("/users:batchGet", json={"ids": ["a", "b", "c"]})
+
+    assert resp.status_code == 422
+    assert resp.json()["detail"]["code"] == "BATCH_TOO_LARGE"
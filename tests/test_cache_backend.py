@@ -0,0 +1,174 @@
+import asyncio
+import time
+
+import httpx
+
+from cache_backend import (
+    InProcessBackend,
+    RedisBackend,
+    SqliteBackend,
+    encode_command,
+    read_reply,
+)
+from response_cache import ResponseCache
+
+URL = "https://catalog.service.test/catalog/items/i-1"
+
+
+def _cache(backend):
+    return ResponseCache(max_entries=10, max_bytes=10_000, backend=backend)
+
+
+def _counting_send(calls):
+    async def send(headers, retries):
+        calls.append(headers)
+        return httpx.Response(
+            200,
+            json={"id": "i-1"},
+            headers={"ETag": '"i1"', "Cache-Control": "max-age=60"},
+        )
+
+    return send
+
+
+async def _share_between_workers(make_backend):
+    calls = []
+    worker_a, worker_b = _cache(make_backend()), _cache(make_backend())
+    try:
+        first = await worker_a.fetch_with(URL, _counting_send(calls), retries=0)
+        second = await worker_b.fetch_with(URL, _counting_send(calls), retries=0)
+    finally:
+        await worker_a.backend.close()
+        await worker_b.backend.close()
+    return calls, first, second, worker_b
+
+
+def _assert_shared(calls, first, second, worker_b):
+    assert len(calls) == 1
+    assert first.headers["x-cache"] == "MISS"
+    assert second.headers["x-cache"] == "HIT"
+    assert second.headers["etag"] == '"i1"'
+    assert second.json() == {"id": "i-1"}
+    assert worker_b.stats()["sharedHits"] == 1
+
+
+def test_sqlite_backend_shares_entries_between_workers(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    _assert_shared(*asyncio.run(_share_between_workers(lambda: SqliteBackend(path))))
+
+
+def test_sqlite_backend_trims_expired_then_oldest_rows(tmp_path):
+    backend = SqliteBackend(str(tmp_path / "cache.sqlite3"), max_entries=3, max_bytes=24)
+    backend.TRIM_EVERY = 1
+
+    async def scenario():
+        await backend.set("expired", b"x", 0.01)
+        await asyncio.sleep(0.02)
+        for n in range(5):
+            await backend.set(f"k{n}", b"v", 60)
+        kept = [await backend.get(f"k{n}") for n in range(5)]
+        await backend.set("big", b"b" * 24, 60)
+        return kept, await backend.get("k4"), await backend.get("big")
+
+    try:
+        kept, small, big = asyncio.run(scenario())
+    finally:
+        asyncio.run(backend.close())
+
+    assert kept == [None, None, b"v", b"v", b"v"]
+    assert (small, big) == (None, b"b" * 24)
+    assert backend.stats()["trimmed"] == 6
+
+
+def test_in_process_backend_expires_entries():
+    backend = InProcessBackend()
+
+    async def scenario():
+        await backend.set("k", b"v", 0.05)
+        hit = await backend.get("k")
+        await asyncio.sleep(0.06)
+        return hit, await backend.get("k")
+
+    assert asyncio.run(scenario()) == (b"v", None)
+
+
+class _RespStandIn:
+    """Just enough of a Redis server for GET/SET PX/DEL."""
+
+    def __init__(self):
+        self.values = {}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                command = await read_reply(reader)
+                name, args = command[0].upper(), command[1:]
+                if name == b"GET":
+                    value, expires_at = self.values.get(args[0], (None, 0))
+                    if value is None or time.monotonic() >= expires_at:
+                        writer.write(b"$-1\r\n")
+                    else:
+                        writer.write(b"$%d\r\n%s\r\n" % (len(value), value))
+                elif name == b"SET":
+                    ttl = int(args[3]) / 1000 if len(args) > 3 else 3600
+                    self.values[args[0]] = (args[1], time.monotonic() + ttl)
+                    writer.write(b"+OK\r\n")
+                elif name == b"DEL":
+                    writer.write(b":%d\r\n" % int(self.values.pop(args[0], None) is not None))
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+
+
+def test_redis_backend_against_stand_in():
+    stand_in = _RespStandIn()
+
+    async def scenario():
+        server = await asyncio.start_server(stand_in.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await _share_between_workers(
+                lambda: RedisBackend(f"redis://127.0.0.1:{port}/0", prefix="t:")
+            )
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    _assert_shared(*asyncio.run(scenario()))
+    assert list(stand_in.values) == [b"t:" + URL.encode()]
+
+
+def test_unreachable_backend_degrades_to_upstream():
+    calls = []
+
+    async def scenario():
+        cache = _cache(RedisBackend("redis://127.0.0.1:1/0", timeout=0.2))
+        resp = await cache.fetch_with(URL, _counting_send(calls), retries=0)
+        return resp, cache.backend.stats()
+
+    resp, stats = asyncio.run(scenario())
+
+    assert resp.status_code == 200 and len(calls) == 1
+    assert stats["errors"] == 2
+
+
+def test_encode_command():
+    assert encode_command(b"GET", "k") == b"*2\r\n$3\r\nGET\r\n$1\r\nk\r\n"
+
+
+def test_order_reads_go_through_response_cache(client, respx_mock):
+    route = respx_mock.get("https://orders.service.test/orders/o-5").mock(
+        return_value=httpx.Response(
+            200, json={"id": "o-5"}, headers={"ETag": '"o5"', "Cache-Control": "max-age=60"}
+        )
+    )
+
+    client.get("/orders/o-5")
+    resp = client.get("/orders/o-5")
+
+    assert route.call_count == 1
+    assert resp.headers["X-Cache"] == "HIT"
+    assert resp.headers["ETag"] == '"o5"'
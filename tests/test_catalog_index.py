@@ -0,0 +1,121 @@
+import asyncio
+
+import httpx
+import pytest
+
+from aggregate.catalog_index import CatalogIndex, CatalogReplica
+from app import app
+
+ITEMS_URL = "https://catalog.service.test/catalog/items"
+ORDERS_URL = "https://orders.service.test/orders"
+
+CATALOG = [
+    {"id": "i-1", "name": "Silk Dress", "brand": "Valentino"},
+    {"id": "i-2", "name": "Linen Shirt", "brand": "Silken Lines"},
+    {"id": "i-3", "name": "Silk Scarf", "brand": "Hermes"},
+]
+
+
+def _replica(**overrides):
+    options = dict(
+        base_url="https://catalog.service.test",
+        page_size=2,
+        retries=0,
+        sync_interval=30,
+        max_staleness=60,
+    )
+    options.update(overrides)
+    return CatalogReplica(**options)
+
+
+def _mock_catalog(respx_mock, catalog):
+    pages = {None: (catalog[:2], "p2"), "p2": (catalog[2:], None)}
+
+    def respond(request):
+        token = request.url.params.get("pageToken")
+        rows, next_token = pages[token]
+        etag = f'"{token}-{[row["id"] for row in rows]}"'
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(
+            200, json={"items": rows, "nextPageToken": next_token}, headers={"ETag": etag}
+        )
+
+    return respx_mock.get(ITEMS_URL).mock(side_effect=respond)
+
+
+def test_index_ranks_name_over_brand_and_exact_over_prefix():
+    index = CatalogIndex()
+    for item in CATALOG:
+        index.upsert(item)
+
+    ranked = index.search("silk")
+    assert [item["id"] for _, item in ranked] == ["i-1", "i-3", "i-2"]
+    assert ranked[0][0] == 1.0
+    assert [item["id"] for _, item in index.search("sil sca")] == ["i-3"]
+    assert index.search("wool") == []
+
+    index.remove("i-3")
+    assert "scarf" not in index.vocabulary
+    assert [item["id"] for _, item in index.search("silk")] == ["i-1", "i-2"]
+
+
+def test_incremental_sync_skips_unchanged_pages_and_drops_removed_items(respx_mock):
+    route = _mock_catalog(respx_mock, CATALOG)
+    replica = _replica()
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            await replica.sync(client)
+            version = replica.index.version
+            await replica.sync(client)
+            assert replica.index.version == version
+            _mock_catalog(respx_mock, CATALOG[:1] + CATALOG[2:])
+            await replica.sync(client)
+
+    asyncio.run(run())
+    assert route.call_count == 6
+    assert (replica.pages_fetched, replica.pages_not_modified) == (4, 2)
+    assert sorted(replica.index.items) == ["i-1", "i-3"]
+    assert replica.stats()["ready"] is True
+
+
+@pytest.fixture
+def synced_replica(respx_mock, monkeypatch):
+    _mock_catalog(respx_mock, CATALOG)
+    replica = _replica()
+
+    async def build():
+        async with httpx.AsyncClient() as client:
+            await replica.sync(client)
+
+    asyncio.run(build())
+    respx_mock.reset()
+    monkeypatch.setattr(app.state, "catalog_replica", replica, raising=False)
+    return replica
+
+
+def test_search_answers_catalog_half_from_replica(client, respx_mock, synced_replica):
+    items = respx_mock.get(ITEMS_URL).mock(return_value=httpx.Response(500))
+    respx_mock.get(ORDERS_URL).mock(return_value=httpx.Response(200, json={"orders": []}))
+
+    first = client.get("/search?q=silk&pageSize=2").json()
+    second = client.get(f"/search?q=silk&pageSize=2&pageToken={first['nextPageToken']}").json()
+
+    assert [row["id"] for row in first["results"] + second["results"]] == ["i-1", "i-3", "i-2"]
+    assert first["results"][0]["source"] == "catalog"
+    assert items.call_count == 0
+    assert synced_replica.local_queries >= 1
+
+
+def test_stale_replica_falls_back_to_upstream(client, respx_mock, synced_replica):
+    synced_replica.max_staleness = 0
+    items = respx_mock.get(ITEMS_URL).mock(
+        return_value=httpx.Response(200, json={"items": [{"id": "i-9"}]})
+    )
+    respx_mock.get(ORDERS_URL).mock(return_value=httpx.Response(200, json={"orders": []}))
+
+    body = client.get("/search?q=silk").json()
+
+    assert body["results"] == [{"source": "catalog", "id": "i-9"}]
+    assert items.call_count == 1
@@ -0,0 +1,129 @@
+import asyncio
+
+import httpx
+import pytest
+
+from circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    UPSTREAMS,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryBudget,
+)
+from http_client import request_with_retry
+
+
+def _clock():
+    now = [0.0]
+    return now, lambda: now[0]
+
+
+def test_breaker_opens_then_recovers_through_half_open():
+    now, clock = _clock()
+    breaker = CircuitBreaker(
+        "orders", window_size=4, minimum_calls=4, open_seconds=10, half_open_calls=2, clock=clock
+    )
+    for failed in (False, True, True, False):
+        breaker.before_call()
+        breaker.record(failed=failed, elapsed=0.01)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    now[0] = 11.0
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    breaker.record(failed=False, elapsed=0.01)
+    breaker.before_call()
+    breaker.record(failed=False, elapsed=0.01)
+    assert breaker.state == CLOSED
+
+
+def test_slow_calls_trip_breaker_and_failed_probe_reopens():
+    now, clock = _clock()
+    breaker = CircuitBreaker(
+        "users", window_size=3, minimum_calls=3, slow_call_seconds=1.0, clock=clock
+    )
+    for _ in range(3):
+        breaker.record(failed=False, elapsed=1.5)
+    assert breaker.state == OPEN
+
+    now[0] = 100.0
+    breaker.before_call()
+    breaker.record(failed=True, elapsed=0.01)
+    assert breaker.state == OPEN
+
+
+def test_cancelled_probes_hand_their_slots_back(respx_mock):
+    now, clock = _clock()
+    breaker = CircuitBreaker(
+        "users.service.test", window_size=2, minimum_calls=2, half_open_calls=3, clock=clock
+    )
+    for _ in range(2):
+        breaker.record(failed=True, elapsed=0.01)
+    UPSTREAMS.for_url("https://users.service.test").breaker = breaker
+    now[0] = 100.0
+
+    async def hang(request):
+        await asyncio.sleep(10)
+
+    url = "https://users.service.test/users/u-1"
+    respx_mock.get(url).mock(side_effect=hang)
+
+    async def cancelled_probes():
+        async with httpx.AsyncClient() as client:
+            probes = [
+                asyncio.create_task(request_with_retry(client, "GET", url, retries=0))
+                for _ in range(3)
+            ]
+            await asyncio.sleep(0.01)
+            for probe in probes:
+                probe.cancel()
+            await asyncio.gather(*probes, return_exceptions=True)
+
+    asyncio.run(cancelled_probes())
+
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+
+
+def test_retry_budget_tracks_recent_successes():
+    now, clock = _clock()
+    budget = RetryBudget(ratio=0.5, min_retries=1, window_seconds=2, clock=clock)
+    assert budget.try_retry()
+    assert not budget.try_retry()
+
+    for _ in range(4):
+        budget.record_success()
+    assert budget.try_retry() and budget.try_retry()
+    assert not budget.try_retry()
+
+    now[0] = 5.0
+    assert budget.try_retry()
+    assert budget.snapshot() == {"successes": 0, "retries": 1, "exhausted": 2}
+
+
+def test_open_circuit_fails_fast_with_error_envelope(client, respx_mock):
+    route = respx_mock.get("https://orders.service.test/orders/o-down").mock(
+        return_value=httpx.Response(503)
+    )
+
+    for _ in range(6):
+        try:
+            client.get("/orders/o-down")
+        except httpx.HTTPStatusError:
+            continue
+        break
+    calls_when_open = route.call_count
+
+    resp = client.get("/orders/o-down")
+    assert resp.status_code == 503
+    assert resp.json()["detail"]["code"] == "UPSTREAM_CIRCUIT_OPEN"
+    assert "Retry-After" in resp.headers
+    assert route.call_count == calls_when_open
+
+    upstreams = client.get("/admin/upstreams").json()["upstreams"]
+    assert upstreams["orders.service.test"]["state"] == OPEN
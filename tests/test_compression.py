@@ -0,0 +1,156 @@
+import asyncio
+import gzip
+
+import httpx
+
+import compression
+from compression import negotiate
+
+BIG_ITEM = {"id": "i-big", "description": "velvet evening gown " * 200}
+
+
+def test_negotiate_honours_q_values():
+    offered = ["br", "zstd", "gzip"]
+
+    assert negotiate("gzip, deflate", offered) == "gzip"
+    assert negotiate("gzip;q=0.5, br", offered) == "br"
+    assert negotiate("br;q=0, gzip;q=0.1", offered) == "gzip"
+    assert negotiate("*;q=0.2, zstd;q=0", ["zstd", "gzip"]) == "gzip"
+    assert negotiate("identity", offered) is None
+    assert negotiate(None, offered) is None
+
+
+def test_large_body_compressed_once_per_etag(client, respx_mock):
+    respx_mock.get("https://catalog.service.test/catalog/items/i-big").mock(
+        return_value=httpx.Response(200, json=BIG_ITEM, headers={"ETag": '"big"'})
+    )
+
+    first = client.get("/items/i-big", headers={"Accept-Encoding": "gzip"})
+    second = client.get("/items/i-big", headers={"Accept-Encoding": "gzip"})
+
+    for resp in (first, second):
+        assert resp.headers["Content-Encoding"] == "gzip"
+        assert resp.headers["Vary"] == "Accept-Encoding"
+        assert resp.headers["ETag"] == '"big"'
+        assert resp.json() == BIG_ITEM
+    assert int(first.headers["Content-Length"]) < len(first.content) // 10
+    assert compression.VARIANTS.stats()["misses"] == 1
+    assert compression.VARIANTS.stats()["hits"] == 1
+
+
+def test_small_or_unaccepted_bodies_pass_through(client, respx_mock):
+    respx_mock.get("https://catalog.service.test/catalog/items/i-big").mock(
+        return_value=httpx.Response(200, json=BIG_ITEM, headers={"ETag": '"big"'})
+    )
+    respx_mock.get("https://catalog.service.test/catalog/items/i-small").mock(
+        return_value=httpx.Response(200, json={"id": "i-small"})
+    )
+
+    small = client.get("/items/i-small", headers={"Accept-Encoding": "gzip"})
+    identity = client.get("/items/i-big", headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in identity.headers
+    assert identity.json() == BIG_ITEM
+
+
+def test_upstream_compressed_stream_forwarded_as_is(client, respx_mock):
+    page = {"items": [BIG_ITEM], "nextPageToken": None}
+    raw = gzip.compress(httpx.Response(200, json=page).content)
+    route = respx_mock.get("https://catalog.service.test/catalog/items").mock(
+        return_value=httpx.Response(
+            200,
+            content=raw,
+            headers={
+                "Content-Encoding": "gzip",
+                "Content-Type": "application/json",
+                "ETag": '"page"',
+            },
+        )
+    )
+
+    with client.stream("GET", "/items", headers={"Accept-Encoding": "gzip"}) as resp:
+        body = b"".join(resp.iter_raw())
+
+    assert route.calls.last.request.headers["Accept-Encoding"] == "gzip"
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert body == raw
+    assert compression.VARIANTS.stats()["misses"] == 0
+
+
+def test_identity_items_stream_compressed_once_per_etag(client, respx_mock):
+    page = httpx.Response(200, json={"items": [BIG_ITEM], "nextPageToken": None}).content
+    respx_mock.get("https://catalog.service.test/catalog/items").mock(
+        return_value=httpx.Response(
+            200,
+            stream=httpx.ByteStream(page),
+            headers={"Content-Type": "application/json", "ETag": '"page"'},
+        )
+    )
+
+    responses = []
+    for _ in range(2):
+        with client.stream("GET", "/items", headers={"Accept-Encoding": "gzip"}) as resp:
+            raw = b"".join(resp.iter_raw())
+        assert resp.headers["Content-Encoding"] == "gzip"
+        assert resp.headers["Vary"] == "Accept-Encoding"
+        assert gzip.decompress(raw) == page
+        responses.append((resp, raw))
+
+    streamed, cached = responses
+    assert "content-length" not in streamed[0].headers
+    assert cached[0].headers["Content-Length"] == str(len(cached[1]))
+    assert compression.VARIANTS.stats()["misses"] == 1
+    assert compression.VARIANTS.stats()["hits"] == 1
+
+
+def test_untagged_stream_compressed_incrementally(client, respx_mock, monkeypatch):
+    monkeypatch.setattr(client.app.state.settings, "items_stream_etag_fallback", "none")
+    page = httpx.Response(200, json={"items": [BIG_ITEM]}).content
+    respx_mock.get("https://catalog.service.test/catalog/items").mock(
+        return_value=httpx.Response(
+            200, stream=httpx.ByteStream(page), headers={"Content-Type": "application/json"}
+        )
+    )
+
+    with client.stream("GET", "/items", headers={"Accept-Encoding": "gzip"}) as resp:
+        raw = b"".join(resp.iter_raw())
+
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "content-length" not in resp.headers
+    assert gzip.decompress(raw) == page
+    assert compression.VARIANTS.stats()["variants"] == 0
+
+
+def test_tagged_stream_is_relayed_before_it_ends(client):
+    sent = []
+
+    async def app(scope, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json"), (b"etag", b'"p"')],
+            }
+        )
+        await send({"type": "http.response.body", "body": b"[" * 2048, "more_body": True})
+        # The first compressed chunk is already out while the body is unfinished.
+        assert [m["type"] for m in sent] == ["http.response.start", "http.response.body"]
+        await send({"type": "http.response.body", "body": b"]" * 2048})
+
+    async def record(message):
+        sent.append(message)
+
+    middleware = compression.CompressionMiddleware(app, settings=lambda: client.app.state.settings)
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/items",
+        "query_string": b"",
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+    asyncio.run(middleware(scope, None, record))
+
+    body = b"".join(m["body"] for m in sent[1:])
+    assert gzip.decompress(body) == b"[" * 2048 + b"]" * 2048
+    assert compression.VARIANTS.stats()["variants"] == 1
@@ -0,0 +1,61 @@
+import httpx
+
+from etag import etag_matches
+
+
+def test_etag_matches_weak_multi_value_and_star():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches('W/"a"', 'W/"a"')
+    assert etag_matches("*", '"anything"')
+    assert not etag_matches('"a", "b"', '"c"')
+    assert not etag_matches(None, '"a"')
+
+
+def test_item_answers_304_for_weak_validator(client, respx_mock):
+    respx_mock.get("https://catalog.service.test/catalog/items/i-9").mock(
+        return_value=httpx.Response(
+            200, json={"id": "i-9"}, headers={"ETag": '"i9"', "Cache-Control": "max-age=30"}
+        )
+    )
+
+    resp = client.get("/items/i-9", headers={"If-None-Match": '"old", W/"i9"'})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == '"i9"'
+    assert resp.headers["Cache-Control"] == "max-age=30"
+    assert resp.content == b""
+
+
+def test_order_forwards_validator_upstream(client, respx_mock):
+    route = respx_mock.get("https://orders.service.test/orders/o-9").mock(
+        return_value=httpx.Response(304, headers={"ETag": '"o9"'})
+    )
+
+    resp = client.get("/orders/o-9", headers={"If-None-Match": '"o9"'})
+    assert resp.status_code == 304
+    assert route.calls.last.request.headers["If-None-Match"] == '"o9"'
+
+
+def test_item_list_stream_answers_304_without_body(client, respx_mock):
+    respx_mock.get("https://catalog.service.test/catalog/items").mock(
+        return_value=httpx.Response(200, json={"items": []}, headers={"ETag": '"p1"'})
+    )
+
+    resp = client.get("/items", headers={"If-None-Match": '"p1"'})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == '"p1"'
+
+
+def test_search_answers_304_on_combined_etag(client, respx_mock):
+    respx_mock.get("https://catalog.service.test/catalog/items").mock(
+        return_value=httpx.Response(200, json={"items": []}, headers={"ETag": '"i"'})
+    )
+    respx_mock.get("https://orders.service.test/orders").mock(
+        return_value=httpx.Response(200, json={"orders": []}, headers={"ETag": '"o"'})
+    )
+
+    first = client.get("/search?q=bag")
+    assert first.status_code == 200
+
+    resp = client.get("/search?q=bag", headers={"If-None-Match": first.headers["ETag"]})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == first.headers["ETag"]
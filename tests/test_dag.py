@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from dag import Step, run_dag
+
+
+def _sleeper(seconds, value, log=None, name=None):
+    async def run(deps):
+        if log is not None:
+            log.append(("start", name, sorted(deps)))
+        await asyncio.sleep(seconds)
+        return value
+
+    return run
+
+
+def test_steps_start_as_soon_as_their_dependencies_finish():
+    log = []
+    steps = [
+        Step("user", _sleeper(0.1, "u", log, "user")),
+        Step("item", _sleeper(0.01, "i", log, "item")),
+        Step("availability", _sleeper(0.01, "a", log, "availability"), after=("item",)),
+        Step("order", _sleeper(0.01, "o", log, "order"), after=("user", "availability")),
+    ]
+
+    result = asyncio.run(run_dag(steps))
+
+    assert log.index(("start", "availability", ["item"])) < len(log) - 1
+    assert result.timings["availability"].finished < result.timings["user"].finished
+    assert result.results == {"user": "u", "item": "i", "availability": "a", "order": "o"}
+    assert result.critical_path(steps) == ["user", "order"]
+
+
+def test_first_failure_cancels_siblings():
+    cancelled = []
+
+    async def slow(_):
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append("user")
+            raise
+
+    async def missing(_):
+        raise LookupError("item")
+
+    steps = [
+        Step("user", slow),
+        Step("item", missing),
+        Step("availability", _sleeper(0, None), after=("item",)),
+    ]
+
+    started = time.perf_counter()
+    with pytest.raises(LookupError):
+        asyncio.run(run_dag(steps))
+    assert cancelled == ["user"]
+    assert time.perf_counter() - started < 0.5
+
+
+def test_invalid_graphs_rejected():
+    cycle = [Step("a", _sleeper(0, 1), after=("b",)), Step("b", _sleeper(0, 1), after=("a",))]
+    with pytest.raises(ValueError):
+        asyncio.run(run_dag(cycle))
+    with pytest.raises(ValueError):
+        asyncio.run(run_dag([Step("a", _sleeper(0, 1), after=("missing",))]))
+
+
+def test_create_order_reports_critical_path(client, respx_mock):
+    def slow_user(request):
+        time.sleep(0.2)
+        return httpx.Response(200, json={"id": "u-1"})
+
+    respx_mock.get("https://users.service.test/users/u-1").mock(side_effect=slow_user)
+    respx_mock.get("https://catalog.service.test/catalog/items/i-1").mock(
+        return_value=httpx.Response(200, json={"id": "i-1", "sku": "SKU-1"})
+    )
+    respx_mock.get("https://catalog.service.test/availability").mock(
+        return_value=httpx.Response(200, json={"available": True})
+    )
+    respx_mock.post("https://orders.service.test/orders").mock(
+        return_value=httpx.Response(201, json={"id": "o-1"})
+    )
+
+    resp = client.post("/orders", json={"userId": "u-1", "itemId": "i-1"})
+
+    assert resp.status_code == 201
+    assert resp.headers["X-Composite-Fanout"] == "user,order"
+    timings = dict(part.split("=") for part in resp.headers["X-Composite-Timings"].split(","))
+    assert set(timings) == {"user", "item", "availability", "order"}
+    assert int(timings["user"]) >= 200
@@ -0,0 +1,100 @@
+import httpx
+
+ORDER = {"id": "o-1", "status": "CONFIRMED", "userId": "u-1", "itemId": "i-1"}
+
+
+def _mock_refs(respx_mock):
+    user = respx_mock.get("https://users.service.test/users/u-1").mock(
+        return_value=httpx.Response(200, json={"id": "u-1", "name": "Ada"}, headers={"ETag": '"u1"'})
+    )
+    item = respx_mock.get("https://catalog.service.test/catalog/items/i-1").mock(
+        return_value=httpx.Response(200, json={"id": "i-1", "sku": "SKU-1"}, headers={"ETag": '"i1"'})
+    )
+    return user, item
+
+
+def test_expand_embeds_user_and_item_with_combined_etag(client, respx_mock):
+    respx_mock.get("https://orders.service.test/orders/o-1").mock(
+        return_value=httpx.Response(200, json=ORDER, headers={"ETag": '"o1"'})
+    )
+    _mock_refs(respx_mock)
+
+    resp = client.get("/orders/o-1", params={"expand": "user,item"})
+
+    body = resp.json()
+    assert resp.status_code == 200
+    assert body["user"] == {"id": "u-1", "name": "Ada"}
+    assert body["item"] == {"id": "i-1", "sku": "SKU-1"}
+    assert resp.headers["etag"] not in ('"o1"', '"u1"', '"i1"')
+
+    again = client.get(
+        "/orders/o-1",
+        params={"expand": "user,item"},
+        headers={"If-None-Match": resp.headers["etag"]},
+    )
+    assert again.status_code == 304
+    assert again.headers["etag"] == resp.headers["etag"]
+
+
+def test_expanded_etag_changes_with_a_reference(client, respx_mock):
+    respx_mock.get("https://orders.service.test/orders/o-1").mock(
+        return_value=httpx.Response(200, json=ORDER, headers={"ETag": '"o1"'})
+    )
+    respx_mock.get("https://users.service.test/users/u-1").mock(
+        side_effect=[
+            httpx.Response(200, json={"id": "u-1"}, headers={"ETag": '"u1"'}),
+            httpx.Response(200, json={"id": "u-1", "name": "Ada"}, headers={"ETag": '"u2"'}),
+        ]
+    )
+
+    first = client.get("/orders/o-1", params={"expand": "user"})
+    client.app.state.response_cache.clear()
+    second = client.get(
+        "/orders/o-1", params={"expand": "user"}, headers={"If-None-Match": first.headers["etag"]}
+    )
+
+    assert second.status_code == 200
+    assert second.json()["user"]["name"] == "Ada"
+
+
+def test_batch_expand_fetches_shared_references_once(client, respx_mock):
+    for order_id in ("o-1", "o-2"):
+        respx_mock.get(f"https://orders.service.test/orders/{order_id}").mock(
+            return_value=httpx.Response(200, json={**ORDER, "id": order_id})
+        )
+    user, item = _mock_refs(respx_mock)
+
+    body = client.post(
+        "/orders:batchGet", params={"expand": "user,item"}, json={"ids": ["o-1", "o-2"]}
+    ).json()
+
+    assert [entry["data"]["user"]["id"] for entry in body["results"].values()] == ["u-1", "u-1"]
+    assert user.call_count == 1
+    assert item.call_count == 1
+
+
+def test_missing_reference_is_embedded_as_null(client, respx_mock):
+    respx_mock.get("https://orders.service.test/orders/o-1").mock(
+        return_value=httpx.Response(200, json=ORDER)
+    )
+    _mock_refs(respx_mock)
+    respx_mock.get("https://catalog.service.test/catalog/items/i-1").mock(
+        return_value=httpx.Response(404)
+    )
+
+    resp = client.get("/orders/o-1", params={"expand": "item"})
+
+    body = resp.json()
+    assert resp.status_code == 200
+    assert body["item"] is None
+    assert "user" not in body
+    assert body["expandErrors"]["item"]["code"] == "ITEM_NOT_FOUND"
+    assert resp.headers["cache-control"] == "no-store"
+
+
+def test_unknown_expansion_rejected(client):
+    resp = client.get("/orders/o-1", params={"expand": "user,payments"})
+
+    assert resp.status_code == 400
+    assert resp.json()["detail"]["code"] == "INVALID_EXPAND"
+    assert resp.json()["detail"]["details"] == {"unknown": ["payments"]}
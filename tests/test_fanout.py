@@ -0,0 +1,49 @@
+import asyncio
+
+import httpx
+import pytest
+
+from config import get_settings
+from fanout import FanoutEngine
+
+
+def test_threaded_engine_reuses_one_pool(respx_mock):
+    respx_mock.get("https://users.service.test/users/u-1").mock(
+        return_value=httpx.Response(200, json={"id": "u-1"})
+    )
+    engine = FanoutEngine(get_settings(), httpx.AsyncClient(), mode="threaded")
+
+    async def run():
+        return await asyncio.gather(
+            *(engine.get("https://users.service.test/users/u-1") for _ in range(8))
+        )
+
+    try:
+        pool = engine._sync_client
+        responses = asyncio.run(run())
+        assert [r.status_code for r in responses] == [200] * 8
+        assert engine._sync_client is pool
+        assert not pool.is_closed
+    finally:
+        engine.close()
+    assert pool.is_closed
+
+
+def test_async_engine_uses_shared_client(respx_mock):
+    respx_mock.get("https://users.service.test/users/u-1").mock(
+        return_value=httpx.Response(200, json={"id": "u-1"})
+    )
+
+    async def run():
+        async with httpx.AsyncClient() as shared:
+            engine = FanoutEngine(get_settings(), shared, mode="async")
+            assert not engine.threaded
+            assert engine._executor is None
+            return await engine.get("https://users.service.test/users/u-1")
+
+    assert asyncio.run(run()).json() == {"id": "u-1"}
+
+
+def test_unknown_mode_rejected():
+    with pytest.raises(ValueError):
+        FanoutEngine(get_settings(), httpx.AsyncClient(), mode="forked")
@@ -0,0 +1,151 @@
+import httpx
+
+from app import app
+from fields import parse_fields
+
+USER = {
+    "id": "u-1",
+    "email": "ada@example.com",
+    "tier": "gold",
+    "name": "Ada",
+    "address": {"city": "Oslo"},
+}
+
+
+def test_projection_keeps_id_and_nested_paths():
+    fieldset = parse_fields("address.city, user.email,user")
+
+    assert fieldset.paths == ("address.city", "id", "user", "user.email")
+    assert fieldset.project(
+        {"id": "o-1", "status": "NEW", "address": {"city": "Oslo", "zip": "0150"}, "user": {"a": 1}}
+    ) == {"id": "o-1", "address": {"city": "Oslo"}, "user": {"a": 1}}
+
+
+def test_user_fields_project_and_key_the_etag(client, respx_mock):
+    respx_mock.get("https://users.service.test/users/u-1").mock(
+        return_value=httpx.Response(200, json=USER, headers={"ETag": '"u1"'})
+    )
+
+    resp = client.get("/users/u-1", params={"fields": "email,tier"})
+
+    assert resp.json() == {"id": "u-1", "email": "ada@example.com", "tier": "gold"}
+    assert resp.headers["etag"] != '"u1"'
+    other = client.get("/users/u-1", params={"fields": "email"})
+    assert other.headers["etag"] != resp.headers["etag"]
+
+    again = client.get(
+        "/users/u-1",
+        params={"fields": "tier,email"},
+        headers={"If-None-Match": resp.headers["etag"]},
+    )
+    assert again.status_code == 304
+
+
+def test_projection_pushed_upstream_when_supported(client, respx_mock, monkeypatch):
+    monkeypatch.setattr(app.state.settings, "fields_pushdown", "catalog")
+    route = respx_mock.get(
+        "https://catalog.service.test/catalog/items/i-1", params={"fields": "id,name"}
+    ).mock(return_value=httpx.Response(200, json={"id": "i-1", "name": "Gown"}))
+
+    resp = client.get("/items/i-1", params={"fields": "name"})
+
+    assert resp.json() == {"id": "i-1", "name": "Gown"}
+    assert route.call_count == 1
+
+
+def test_item_list_projects_rows_and_keeps_paging(client, respx_mock):
+    respx_mock.get("https://catalog.service.test/catalog/items").mock(
+        return_value=httpx.Response(
+            200,
+            json={"items": [{"id": "i-1", "name": "Gown", "brand": "Dior"}], "nextPageToken": "t2"},
+        )
+    )
+
+    body = client.get("/items", params={"fields": "brand"}).json()
+
+    assert body == {"items": [{"id": "i-1", "brand": "Dior"}], "nextPageToken": "t2"}
+
+
+def test_order_fields_reach_into_expansions(client, respx_mock, monkeypatch):
+    monkeypatch.setattr(app.state.settings, "fields_pushdown", "orders")
+    order = respx_mock.get(
+        "https://orders.service.test/orders/o-1", params={"fields": "id,status,user,userId"}
+    ).mock(
+        return_value=httpx.Response(200, json={"id": "o-1", "status": "NEW", "userId": "u-1"})
+    )
+    respx_mock.get("https://users.service.test/users/u-1").mock(
+        return_value=httpx.Response(200, json=USER)
+    )
+
+    resp = client.get("/orders/o-1", params={"expand": "user", "fields": "status,user.email"})
+
+    assert resp.json() == {"id": "o-1", "status": "NEW", "user": {"email": "ada@example.com"}}
+    assert order.call_count == 1
+
+
+def test_batch_results_are_projected(client, respx_mock):
+    respx_mock.get("https://users.service.test/users/u-1").mock(
+        return_value=httpx.Response(200, json=USER, headers={"ETag": '"u1"'})
+    )
+
+    body = client.post("/users:batchGet", params={"fields": "tier"}, json={"ids": ["u-1"]}).json()
+
+    assert body["results"]["u-1"]["data"] == {"id": "u-1", "tier": "gold"}
+    assert body["results"]["u-1"]["etag"] != '"u1"'
+
+
+def test_search_rows_are_projected(client, respx_mock):
+    respx_mock.get("https://catalog.service.test/catalog/items").mock(
+        return_value=httpx.Response(
+            200,
+            json={"items": [{"id": "i-1", "name": "Gown", "brand": "Dior"}]},
+            headers={"ETag": '"i"'},
+        )
+    )
+    respx_mock.get("https://orders.service.test/orders").mock(
+        return_value=httpx.Response(200, json={"orders": [{"id": "o-1", "status": "NEW"}]})
+    )
+
+    full = client.get("/search", params={"q": "gown"})
+    slim = client.get("/search", params={"q": "gown", "fields": "name"})
+
+    assert slim.json()["results"] == [
+        {"source": "catalog", "id": "i-1", "name": "Gown"},
+        {"source": "order", "id": "o-1"},
+    ]
+    assert slim.headers["etag"] != full.headers["etag"]
+
+
+def test_empty_fields_rejected(client):
+    resp = client.get("/users/u-1", params={"fields": " , "})
+
+    assert resp.status_code == 400
+    assert resp.json()["detail"]["code"] == "INVALID_FIELDS"
+
+
+def test_projected_search_pages_are_not_replayed_to_full_requests(
+    client, respx_mock, monkeypatch
+):
+    monkeypatch.setattr(app.state.settings, "fields_pushdown", "catalog,orders")
+    rows = [
+        {"id": f"i-{n}", "name": "Dress", "brand": "Dior", "score": 10 - n} for n in range(3)
+    ]
+
+    def catalog(request):
+        fields = request.url.params.get("fields")
+        keep = fields.split(",") if fields else None
+        page = [{k: v for k, v in row.items() if keep is None or k in keep} for row in rows]
+        return httpx.Response(200, json={"items": page})
+
+    items = respx_mock.get("https://catalog.service.test/catalog/items").mock(
+        side_effect=catalog
+    )
+    respx_mock.get("https://orders.service.test/orders").mock(
+        return_value=httpx.Response(200, json={"orders": []})
+    )
+
+    client.get("/search", params={"q": "dress", "fields": "name", "pageSize": 1})
+    full = client.get("/search", params={"q": "dress", "pageSize": 1})
+
+    assert full.json()["results"][0]["brand"] == "Dior"
+    assert items.call_count == 2
@@ -0,0 +1,71 @@
+import asyncio
+
+import httpx
+
+from hedging import Hedger
+
+URL = "https://orders.service.test/orders/o-1"
+
+
+def _handler(calls, slow_calls):
+    async def handler(request):
+        calls.append(request.method)
+        if len(calls) in slow_calls:
+            await asyncio.sleep(0.5)
+        return httpx.Response(200, json={"n": len(calls)})
+
+    return handler
+
+
+def _hedger():
+    return Hedger(enabled=True, min_samples=5, min_delay=0.02, budget_ratio=1.0)
+
+
+def test_slow_get_is_hedged_and_backup_wins(respx_mock):
+    calls = []
+    respx_mock.get(URL).mock(side_effect=_handler(calls, slow_calls={6}))
+    hedger = _hedger()
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            for _ in range(5):
+                await hedger.request(client, "GET", URL)
+            started = asyncio.get_running_loop().time()
+            response = await hedger.request(client, "GET", URL)
+            return response, asyncio.get_running_loop().time() - started
+
+    response, elapsed = asyncio.run(run())
+    assert response.json() == {"n": 7}
+    assert elapsed < 0.3
+    assert hedger.hedged == 1 and hedger.hedge_wins == 1
+
+
+def test_post_is_never_hedged(respx_mock):
+    calls = []
+    respx_mock.post(URL).mock(side_effect=_handler(calls, slow_calls={6}))
+    hedger = _hedger()
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            for _ in range(6):
+                await hedger.request(client, "POST", URL)
+
+    asyncio.run(run())
+    assert len(calls) == 6
+    assert hedger.hedged == 0
+
+
+def test_hedge_budget_limits_duplicates(respx_mock):
+    calls = []
+    respx_mock.get(URL).mock(side_effect=_handler(calls, slow_calls=set(range(6, 40))))
+    hedger = Hedger(enabled=True, min_samples=5, min_delay=0.02, budget_ratio=0.0, budget_cap=1.0)
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            for _ in range(5):
+                await hedger.request(client, "GET", URL)
+            await asyncio.gather(*(hedger.request(client, "GET", URL) for _ in range(3)))
+
+    asyncio.run(run())
+    assert hedger.hedged == 1
+    assert hedger.budget_denied == 2
@@ -0,0 +1,170 @@
+import asyncio
+import sqlite3
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from idempotency import MemoryIdempotencyStore, SqliteIdempotencyStore, StoredResponse
+
+ORDER = {"userId": "u-1", "itemId": "i-1"}
+
+
+def _mock_order_flow(respx_mock):
+    user = respx_mock.get("https://users.service.test/users/u-1").mock(
+        return_value=httpx.Response(200, json={"id": "u-1"})
+    )
+    respx_mock.get("https://catalog.service.test/catalog/items/i-1").mock(
+        return_value=httpx.Response(200, json={"id": "i-1", "sku": "SKU-1"})
+    )
+    respx_mock.get("https://catalog.service.test/availability").mock(
+        return_value=httpx.Response(200, json={"available": True})
+    )
+    create = respx_mock.post("https://orders.service.test/orders").mock(
+        return_value=httpx.Response(
+            201, json={"id": "o-1"}, headers={"Location": "/orders/o-1", "ETag": '"o1"'}
+        )
+    )
+    return user, create
+
+
+def test_retry_with_same_key_replays_stored_response(client, respx_mock):
+    user, create = _mock_order_flow(respx_mock)
+    headers = {"Idempotency-Key": "key-1"}
+
+    first = client.post("/orders", json=ORDER, headers=headers)
+    second = client.post("/orders", json=ORDER, headers=headers)
+
+    assert first.status_code == second.status_code == 201
+    assert second.json() == first.json() == {"id": "o-1"}
+    assert second.headers["Location"] == first.headers["Location"] == "/orders/o-1"
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert (user.call_count, create.call_count) == (1, 1)
+    assert create.calls.last.request.headers["Idempotency-Key"] == "key-1"
+
+
+def test_key_reused_with_different_body_is_rejected(client, respx_mock):
+    _mock_order_flow(respx_mock)
+    client.post("/orders", json=ORDER, headers={"Idempotency-Key": "key-2"})
+
+    resp = client.post(
+        "/orders", json={**ORDER, "notes": "changed"}, headers={"Idempotency-Key": "key-2"}
+    )
+
+    assert resp.status_code == 422
+    assert resp.json()["detail"]["code"] == "IDEMPOTENCY_KEY_REUSED"
+
+
+def test_failed_attempt_releases_key(client, respx_mock):
+    user, create = _mock_order_flow(respx_mock)
+    create.mock(return_value=httpx.Response(409, json={"reason": "busy"}))
+    headers = {"Idempotency-Key": "key-3"}
+
+    assert client.post("/orders", json=ORDER, headers=headers).status_code == 409
+    create.mock(return_value=httpx.Response(201, json={"id": "o-3"}))
+    retry = client.post("/orders", json=ORDER, headers=headers)
+
+    assert retry.status_code == 201
+    assert retry.json() == {"id": "o-3"}
+
+
+def _stored():
+    return StoredResponse(201, b'{"id":"o-1"}', {"Location": "/orders/o-1"})
+
+
+def test_concurrent_duplicate_waits_for_first_attempt():
+    store = MemoryIdempotencyStore(ttl=60, lease=5, wait=2)
+
+    async def scenario():
+        assert await store.acquire("k", "fp") is None
+        duplicate = asyncio.ensure_future(store.acquire("k", "fp"))
+        await asyncio.sleep(0.01)
+        assert not duplicate.done()
+        await store.complete("k", _stored())
+        return await duplicate
+
+    replayed = asyncio.run(scenario())
+
+    assert replayed.body == b'{"id":"o-1"}'
+    assert store.stats()["waits"] == 1
+
+
+def test_held_claim_outlives_its_lease():
+    now = [1000.0]
+    store = MemoryIdempotencyStore(ttl=60, lease=0.3, wait=0, clock=lambda: now[0])
+
+    async def scenario():
+        assert await store.acquire("k", "fp") is None
+        async with store.hold("k"):
+            now[0] += 0.2
+            await asyncio.sleep(0.15)  # one heartbeat
+            now[0] += 0.25  # past the original lease
+            with pytest.raises(HTTPException) as pending:
+                await store.acquire("k", "fp")
+        now[0] += 1  # renewals stop with the holder, e.g. a dead worker
+        return pending.value, await store.acquire("k", "fp")
+
+    pending, reclaimed = asyncio.run(scenario())
+
+    assert pending.detail["code"] == "IDEMPOTENCY_KEY_IN_PROGRESS"
+    assert reclaimed is None
+    assert store.stats()["claims"] == 2
+
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "keys.sqlite3")
+    worker_a = SqliteIdempotencyStore(path, ttl=60, lease=5, wait=0)
+    worker_b = SqliteIdempotencyStore(path, ttl=60, lease=5, wait=0)
+
+    async def scenario():
+        assert await worker_a.acquire("k", "fp") is None
+        with pytest.raises(HTTPException) as pending:
+            await worker_b.acquire("k", "fp")
+        assert pending.value.detail["code"] == "IDEMPOTENCY_KEY_IN_PROGRESS"
+        await worker_a.complete("k", _stored())
+        return await worker_b.acquire("k", "fp")
+
+    try:
+        replayed = asyncio.run(scenario())
+    finally:
+        worker_a.close()
+        worker_b.close()
+
+    assert replayed.status_code == 201
+    assert replayed.headers == {"Location": "/orders/o-1"}
+
+
+def test_sqlite_claim_surfaces_lock_timeout_not_rollback_error(tmp_path):
+    path = str(tmp_path / "keys.sqlite3")
+    store = SqliteIdempotencyStore(path, ttl=60, lease=5, wait=0)
+    holder = sqlite3.connect(path, isolation_level=None)
+    store._db.execute("PRAGMA busy_timeout = 0")
+    holder.execute("BEGIN IMMEDIATE")
+
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            asyncio.run(store.acquire("k", "fp"))
+        holder.execute("ROLLBACK")
+        assert asyncio.run(store.acquire("k", "fp")) is None
+    finally:
+        holder.close()
+        store.close()
+
+
+def test_unknown_outcome_after_post_is_replayed_not_rerun(client, respx_mock):
+    _, create = _mock_order_flow(respx_mock)
+    create.mock(side_effect=httpx.ReadTimeout("no answer"))
+    headers = {"Idempotency-Key": "key-timeout"}
+
+    with pytest.raises(httpx.ReadTimeout):
+        client.post("/orders", json=ORDER, headers=headers)
+    calls = create.call_count
+    create.mock(return_value=httpx.Response(201, json={"id": "o-dup"}))
+    retry = client.post("/orders", json=ORDER, headers=headers)
+
+    assert retry.status_code == 502
+    assert retry.json()["detail"]["code"] == "ORDER_OUTCOME_UNKNOWN"
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert create.call_count == calls
@@ -0,0 +1,63 @@
+import httpx
+
+from etag import strong_etag_bytes
+
+LIST_URL = "https://catalog.service.test/catalog/items"
+
+
+def _chunks(*parts):
+    return httpx.ByteStream(b"".join(parts))
+
+
+def test_list_streams_body_and_forwards_upstream_etag(client, respx_mock):
+    body = b'{"items":[' + b",".join(b'{"id":"i-%d"}' % n for n in range(500)) + b"]}"
+    respx_mock.get(LIST_URL).mock(
+        return_value=httpx.Response(
+            200,
+            stream=_chunks(body),
+            headers={
+                "Content-Type": "application/json",
+                "ETag": '"page-1"',
+                "Next-Page-Token": "abc",
+            },
+        )
+    )
+
+    resp = client.get("/items?pageSize=50")
+    assert resp.status_code == 200
+    assert resp.content == body
+    assert resp.headers["ETag"] == '"page-1"'
+    assert resp.headers["Next-Page-Token"] == "abc"
+
+
+def test_list_without_upstream_etag_precomputes_one(client, respx_mock):
+    body = b'{"items":[{"id":"i-1"}]}'
+    respx_mock.get(LIST_URL).mock(return_value=httpx.Response(200, content=body))
+
+    resp = client.get("/items")
+    assert resp.content == body
+    assert resp.headers["ETag"] == strong_etag_bytes(body)
+
+
+def test_list_without_upstream_etag_can_stream_untagged(client, respx_mock, monkeypatch):
+    monkeypatch.setattr(client.app.state.settings, "items_stream_etag_fallback", "none")
+    respx_mock.get(LIST_URL).mock(
+        return_value=httpx.Response(200, stream=_chunks(b'{"items":[]}'))
+    )
+
+    resp = client.get("/items")
+    assert resp.json() == {"items": []}
+    assert "ETag" not in resp.headers
+
+
+def test_list_only_asks_upstream_for_decodable_encodings(client, respx_mock):
+    body = b'{"items":[{"id":"i-1"}]}'
+    route = respx_mock.get(LIST_URL).mock(return_value=httpx.Response(200, content=body))
+
+    resp = client.get("/items", headers={"Accept-Encoding": "br, zstd;q=0.9, gzip;q=0.5"})
+
+    assert route.calls.last.request.headers["Accept-Encoding"] == "gzip;q=0.5"
+    assert resp.content == body
+    br_only = client.get("/items", headers={"Accept-Encoding": "br"})
+    assert route.calls.last.request.headers["Accept-Encoding"] == "identity"
+    assert br_only.json() == {"items": [{"id": "i-1"}]}
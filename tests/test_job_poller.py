@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from app import app
+from job_poller import parse_wait
+
+JOB_URL = "https://orders.service.test/jobs/job-7"
+
+
+@pytest.fixture
+def fast_poller(monkeypatch):
+    poller = app.state.job_poller
+    monkeypatch.setattr(poller, "min_interval", 0.01)
+    monkeypatch.setattr(poller, "max_interval", 0.02)
+    return poller
+
+
+def _statuses(respx_mock, *statuses):
+    responses = [httpx.Response(200, json={"jobId": "job-7", "status": s}) for s in statuses]
+
+    def respond(request):
+        return responses.pop(0) if len(responses) > 1 else responses[0]
+
+    return respx_mock.get(JOB_URL).mock(side_effect=respond)
+
+
+def test_long_polling_clients_share_one_upstream_loop(client, respx_mock, fast_poller):
+    route = _statuses(respx_mock, "PENDING", "PENDING", "RUNNING", "RUNNING", "SUCCEEDED")
+    first = client.get("/jobs/job-7")
+    etag = first.headers["ETag"]
+
+    def long_poll(_):
+        return client.get("/jobs/job-7?wait=5s", headers={"If-None-Match": etag}).json()
+
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        bodies = list(pool.map(long_poll, range(12)))
+
+    assert first.json()["status"] == "PENDING"
+    assert all(body["status"] in ("RUNNING", "SUCCEEDED") for body in bodies)
+    assert route.call_count <= 8
+
+
+def test_long_poll_times_out_with_304(client, respx_mock, fast_poller):
+    _statuses(respx_mock, "PENDING")
+    etag = client.get("/jobs/job-7").headers["ETag"]
+
+    resp = client.get("/jobs/job-7?wait=100ms", headers={"If-None-Match": etag})
+
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+
+
+def test_events_stream_until_terminal(client, respx_mock, fast_poller):
+    _statuses(respx_mock, "PENDING", "RUNNING", "SUCCEEDED")
+
+    with client.stream("GET", "/jobs/job-7/events") as resp:
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        events = [line for line in resp.iter_lines() if line.startswith("data:")]
+
+    statuses = [e.split('"status":"')[1].split('"')[0] for e in events]
+    assert statuses[0] == "PENDING" and statuses[-1] == "SUCCEEDED"
+    assert len(statuses) == len(set(statuses))
+
+
+def test_unknown_job_is_404(client, respx_mock):
+    respx_mock.get("https://orders.service.test/jobs/nope").mock(return_value=httpx.Response(404))
+
+    resp = client.get("/jobs/nope")
+
+    assert resp.status_code == 404
+    assert resp.json()["detail"]["code"] == "JOB_NOT_FOUND"
+
+
+def test_parse_wait():
+    assert parse_wait("30s", 60) == 30
+    assert parse_wait("250ms", 60) == 0.25
+    assert parse_wait("600", 60) == 60
+    assert parse_wait(None, 60) == 0
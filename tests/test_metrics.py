@@ -0,0 +1,71 @@
+import httpx
+
+from metrics import Histogram
+
+
+def _sample(client, line_prefix):
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(line_prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_route_and_upstream_histograms(client, respx_mock):
+    respx_mock.get("https://users.service.test/users/u-1").mock(
+        return_value=httpx.Response(200, json={"id": "u-1"})
+    )
+    route = (
+        'composite_request_duration_seconds_count'
+        '{method="GET",route="/users/{user_id}",status_class="2xx"}'
+    )
+    upstream = (
+        'composite_upstream_request_duration_seconds_count'
+        '{upstream="users",method="GET",status_class="2xx",attempt="0"}'
+    )
+    before = (_sample(client, route), _sample(client, upstream))
+
+    client.get("/users/u-1")
+
+    assert _sample(client, route) == before[0] + 1
+    assert _sample(client, upstream) == before[1] + 1
+
+
+def test_retries_are_counted_per_attempt(client, respx_mock):
+    respx_mock.get("https://orders.service.test/orders/o-1").mock(
+        side_effect=[httpx.Response(503), httpx.Response(200, json={"id": "o-1"})]
+    )
+    retries = 'composite_upstream_retries_total{upstream="orders",reason="5xx"}'
+    second = (
+        'composite_upstream_request_duration_seconds_count'
+        '{upstream="orders",method="GET",status_class="2xx",attempt="1"}'
+    )
+    before = (_sample(client, retries), _sample(client, second))
+
+    assert client.get("/orders/o-1").status_code == 200
+
+    assert _sample(client, retries) == before[0] + 1
+    assert _sample(client, second) == before[1] + 1
+
+
+def test_pool_and_in_flight_gauges_exposed(client):
+    resp = client.get("/metrics")
+
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'composite_http_pool_max_connections{pool="shared"} 100' in resp.text
+    assert 'composite_http_pool_connections{pool="shared",state="active"}' in resp.text
+    # The scrape itself is in flight while the body is rendered.
+    assert "composite_requests_in_flight 1" in resp.text
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo.", ("op",), buckets=(0.1, 1.0))
+    child = histogram.labels("read")
+    for value in (0.05, 0.5, 5.0):
+        child.observe(value)
+
+    lines = histogram.render()
+
+    assert 'demo_seconds_bucket{op="read",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{op="read",le="1"} 2' in lines
+    assert 'demo_seconds_bucket{op="read",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{op="read"} 3' in lines
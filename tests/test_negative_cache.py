@@ -0,0 +1,66 @@
+import httpx
+
+from negative_cache import NegativeCache
+
+
+def test_confirmed_missing_user_rejected_without_upstream_calls(client, respx_mock):
+    user = respx_mock.get("https://users.service.test/users/u-gone").mock(
+        return_value=httpx.Response(404)
+    )
+    item = respx_mock.get("https://catalog.service.test/catalog/items/i-1").mock(
+        return_value=httpx.Response(200, json={"id": "i-1", "sku": "SKU-1"})
+    )
+    respx_mock.get("https://catalog.service.test/availability").mock(
+        return_value=httpx.Response(200, json={"available": True})
+    )
+
+    first = client.post("/orders", json={"userId": "u-gone", "itemId": "i-1"})
+    calls = (user.call_count, item.call_count)
+    second = client.post("/orders", json={"userId": "u-gone", "itemId": "i-1"})
+
+    assert first.json()["detail"]["code"] == second.json()["detail"]["code"] == "FK_USER_NOT_FOUND"
+    assert second.status_code == 422
+    assert (user.call_count, item.call_count) == calls
+
+
+def test_successful_lookup_invalidates_entry(client, respx_mock):
+    route = respx_mock.get("https://users.service.test/users/u-new").mock(
+        return_value=httpx.Response(404)
+    )
+    respx_mock.get("https://catalog.service.test/catalog/items/i-1").mock(
+        return_value=httpx.Response(200, json={"id": "i-1", "sku": "SKU-1"})
+    )
+    respx_mock.get("https://catalog.service.test/availability").mock(
+        return_value=httpx.Response(200, json={"available": True})
+    )
+    respx_mock.post("https://orders.service.test/orders").mock(
+        return_value=httpx.Response(201, json={"id": "o-1"})
+    )
+
+    assert client.get("/users/u-new").status_code == 404
+    route.mock(return_value=httpx.Response(200, json={"id": "u-new"}))
+    assert client.get("/users/u-new").status_code == 200
+
+    resp = client.post("/orders", json={"userId": "u-new", "itemId": "i-1"})
+    assert resp.status_code == 201
+
+
+def test_entries_expire_and_stay_bounded():
+    now = [0.0]
+    cache = NegativeCache(ttl=30, max_entries=2, clock=lambda: now[0])
+
+    cache.observe("items", "a", 404)
+    cache.observe("items", "b", 410)
+    cache.observe("items", "c", 404)
+    assert not cache.is_missing("items", "a")
+    assert cache.is_missing("items", "b") and not cache.is_missing("users", "b")
+
+    cache.observe("items", "b", 200)
+    assert not cache.is_missing("items", "b")
+    # Upstream failures say nothing about existence.
+    cache.observe("items", "c", 503)
+    assert cache.is_missing("items", "c")
+
+    now[0] = 30.0
+    assert not cache.is_missing("items", "c")
+    assert cache.stats()["evictions"] == 1
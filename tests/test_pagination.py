@@ -1,3 +1,5 @@
+import base64
+
 from pagination import (
     decode_token,
     encode_token,
@@ -16,3 +18,17 @@ def test_extract_tokens_round_trip():
     payload = {"sources": {"items": "a", "orders": "b"}}
     token = encode_token(payload)
     assert extract_tokens(token) == payload["sources"]
+
+
+def test_malformed_search_page_tokens_are_rejected(client):
+    tampered = [
+        "garbage",
+        encode_token({"cursor": {"items": {"o": "abc"}}}),
+        encode_token({"cursor": {"items": {"t": 7}}}),
+        base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    ]
+
+    for token in tampered:
+        resp = client.get("/search", params={"q": "dress", "pageToken": token})
+        assert resp.status_code == 400, token
+        assert resp.json()["detail"]["code"] == "INVALID_PAGE_TOKEN"
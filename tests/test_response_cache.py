@@ -0,0 +1,178 @@
+import asyncio
+
+import httpx
+import pytest
+
+from response_cache import ResponseCache
+
+
+def test_fresh_item_served_from_cache(client, respx_mock):
+    route = respx_mock.get("https://catalog.service.test/catalog/items/i-7").mock(
+        return_value=httpx.Response(
+            200,
+            json={"id": "i-7"},
+            headers={"ETag": '"i7"', "Cache-Control": "max-age=60"},
+        )
+    )
+
+    first = client.get("/items/i-7")
+    second = client.get("/items/i-7")
+
+    assert route.call_count == 1
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.headers["ETag"] == '"i7"'
+    assert second.json() == {"id": "i-7"}
+
+
+def test_stale_user_revalidated_with_if_none_match(client, respx_mock):
+    def handler(request):
+        if request.headers.get("If-None-Match") == '"u7"':
+            return httpx.Response(304, headers={"ETag": '"u7"'})
+        return httpx.Response(200, json={"id": "u-7"}, headers={"ETag": '"u7"'})
+
+    route = respx_mock.get("https://users.service.test/users/u-7").mock(
+        side_effect=handler
+    )
+
+    client.get("/users/u-7")
+    resp = client.get("/users/u-7")
+
+    assert route.call_count == 2
+    assert resp.status_code == 200
+    assert resp.headers["X-Cache"] == "REVALIDATED"
+    assert resp.json() == {"id": "u-7"}
+
+    conditional = client.get("/users/u-7", headers={"If-None-Match": '"u7"'})
+    assert conditional.status_code == 304
+
+
+def _response(body: bytes, **headers: str) -> httpx.Response:
+    return httpx.Response(200, content=body, headers=headers)
+
+
+def test_lru_evicts_by_bytes_and_skips_no_store():
+    cache = ResponseCache(max_entries=10, max_bytes=250, default_ttl=30)
+    cache.store("a", _response(b"a" * 100))
+    cache.store("b", _response(b"b" * 100))
+    cache.get("a")
+    cache.store("c", _response(b"c" * 100))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.total_bytes <= 250
+    assert cache.evictions == 1
+
+    assert cache.store("d", _response(b"d", **{"cache-control": "no-store"})) is None
+    assert cache.get("d") is None
+
+
+def test_max_age_controls_freshness():
+    now = [0.0]
+    cache = ResponseCache(max_entries=10, max_bytes=1000, clock=lambda: now[0])
+    entry = cache.store("k", _response(b"x", **{"cache-control": "max-age=5", "etag": '"x"'}))
+
+    assert entry.is_fresh(now[0])
+    now[0] = 6.0
+    assert not entry.is_fresh(now[0])
+    cache.refresh("k", entry, httpx.Response(304, headers={"cache-control": "max-age=10"}))
+    assert entry.is_fresh(15.0) and not entry.is_fresh(16.0)
+
+
+def test_stale_while_revalidate_answers_at_once_and_refreshes_in_background():
+    now = [0.0]
+    cache = ResponseCache(
+        max_entries=10, max_bytes=1000, stale_while_revalidate=30, clock=lambda: now[0]
+    )
+    sent = []
+
+    async def send(headers, retries):
+        sent.append(headers)
+        version = "v2" if headers.get("If-None-Match") == '"v1"' else "v1"
+        return httpx.Response(
+            200,
+            content=version.encode(),
+            headers={"etag": f'"{version}"', "cache-control": "max-age=5"},
+        )
+
+    async def scenario():
+        await cache.fetch_with("k", send, retries=2)
+        now[0] = 10.0
+        stale = await cache.fetch_with("k", send, retries=2)
+        again = await cache.fetch_with("k", send, retries=2)
+        await asyncio.gather(*cache._background)
+        return stale, again, await cache.fetch_with("k", send, retries=2)
+
+    stale, again, refreshed = asyncio.run(scenario())
+
+    assert stale.content == b"v1" and stale.headers["x-cache"] == "STALE"
+    assert stale.headers["age"] == "10"
+    assert stale.headers["warning"].startswith("110")
+    # One background refresh per key, however many stale reads arrive meanwhile.
+    assert again.headers["x-cache"] == "STALE"
+    assert sent == [{}, {"If-None-Match": '"v1"'}]
+    assert refreshed.content == b"v2" and refreshed.headers["x-cache"] == "HIT"
+
+
+def test_stale_if_error_serves_last_good_copy(client, respx_mock):
+    route = respx_mock.get("https://catalog.service.test/catalog/items/i-8").mock(
+        return_value=httpx.Response(
+            200,
+            json={"id": "i-8"},
+            headers={"ETag": '"i8"', "Cache-Control": "max-age=0, stale-if-error=60"},
+        )
+    )
+    client.get("/items/i-8")
+    route.mock(return_value=httpx.Response(503))
+
+    resp = client.get("/items/i-8")
+
+    assert resp.status_code == 200
+    assert resp.json() == {"id": "i-8"}
+    assert resp.headers["X-Cache"] == "STALE-IF-ERROR"
+    assert resp.headers["Warning"].startswith("111")
+    assert "Age" in resp.headers
+    # With a fallback in hand the retry chain is skipped.
+    assert route.call_count == 2
+
+
+def test_order_reads_never_serve_stale_copies(client, respx_mock):
+    route = respx_mock.get("https://orders.service.test/orders/o-8").mock(
+        return_value=httpx.Response(
+            200,
+            json={"id": "o-8", "status": "PENDING"},
+            headers={
+                "ETag": '"p"',
+                "Cache-Control": "max-age=0, stale-while-revalidate=60, stale-if-error=60",
+            },
+        )
+    )
+    client.get("/orders/o-8")
+    route.mock(return_value=httpx.Response(200, json={"id": "o-8", "status": "CONFIRMED"}))
+
+    assert client.get("/orders/o-8").json()["status"] == "CONFIRMED"
+
+    route.mock(return_value=httpx.Response(503))
+    with pytest.raises(httpx.HTTPStatusError):
+        client.get("/orders/o-8")
+
+
+def test_stale_if_error_covers_fk_lookups(client, respx_mock):
+    user = respx_mock.get("https://users.service.test/users/u-9").mock(
+        return_value=httpx.Response(200, json={"id": "u-9"}, headers={"ETag": '"u9"'})
+    )
+    respx_mock.get("https://catalog.service.test/catalog/items/i-9").mock(
+        return_value=httpx.Response(200, json={"id": "i-9", "sku": "SKU-9"})
+    )
+    respx_mock.get("https://catalog.service.test/availability").mock(
+        return_value=httpx.Response(200, json={"available": True})
+    )
+    respx_mock.post("https://orders.service.test/orders").mock(
+        return_value=httpx.Response(201, json={"id": "o-9"})
+    )
+    client.get("/users/u-9")
+    user.mock(side_effect=httpx.ConnectError("restarting"))
+
+    resp = client.post("/orders", json={"userId": "u-9", "itemId": "i-9"})
+
+    assert resp.status_code == 201
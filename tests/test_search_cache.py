@@ -0,0 +1,107 @@
+import httpx
+
+from aggregate.search_cache import SearchCache, search_key
+
+ITEMS_URL = "https://catalog.service.test/catalog/items"
+ORDERS_URL = "https://orders.service.test/orders"
+
+
+def _mock_sources(respx_mock):
+    items = respx_mock.get(ITEMS_URL).mock(
+        return_value=httpx.Response(200, json={"items": [{"id": "i-1"}]}, headers={"ETag": '"i"'})
+    )
+    orders = respx_mock.get(ORDERS_URL).mock(
+        return_value=httpx.Response(200, json={"orders": [{"id": "o-1"}]}, headers={"ETag": '"o"'})
+    )
+    return items, orders
+
+
+def test_repeated_query_is_served_from_cache(client, respx_mock):
+    items, orders = _mock_sources(respx_mock)
+
+    first = client.get("/search?q=Silk%20Dress")
+    second = client.get("/search?q=%20silk%20%20dress")
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.headers["X-Search-Upstream-Calls"] == "0"
+    assert second.json() == first.json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert items.call_count == orders.call_count == 1
+
+
+def test_conditional_request_answered_from_cache(client, respx_mock):
+    items, _ = _mock_sources(respx_mock)
+    etag = client.get("/search?q=dress").headers["ETag"]
+
+    resp = client.get("/search?q=dress", headers={"If-None-Match": etag})
+
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    assert items.call_count == 1
+
+
+def test_partial_pages_are_not_cached(client, respx_mock):
+    items = respx_mock.get(ITEMS_URL).mock(return_value=httpx.Response(200, json={"items": []}))
+    respx_mock.get(ORDERS_URL).mock(return_value=httpx.Response(500))
+
+    client.get("/search?q=dress")
+    client.get("/search?q=dress")
+
+    assert items.call_count == 2
+
+
+def test_order_creation_invalidates_order_pages(client, respx_mock):
+    _, orders = _mock_sources(respx_mock)
+    respx_mock.get("https://users.service.test/users/u-1").mock(
+        return_value=httpx.Response(200, json={"id": "u-1"})
+    )
+    respx_mock.get("https://catalog.service.test/catalog/items/i-1").mock(
+        return_value=httpx.Response(200, json={"id": "i-1", "sku": "SKU"})
+    )
+    respx_mock.get("https://catalog.service.test/availability").mock(
+        return_value=httpx.Response(200, json={"available": True})
+    )
+    respx_mock.post(ORDERS_URL).mock(return_value=httpx.Response(201, json={"id": "o-2"}))
+
+    client.get("/search?q=dress")
+    created = client.post("/orders", json={"userId": "u-1", "itemId": "i-1"})
+    assert created.status_code == 201
+    resp = client.get("/search?q=dress")
+
+    assert resp.headers["X-Cache"] == "MISS"
+    assert orders.call_count == 2
+    assert client.get("/admin/stats").json()["searchCache"]["invalidations"] == 1
+
+
+def test_lru_eviction_and_memory_cap():
+    cache = SearchCache(ttl=30, max_entries=2, max_bytes=64)
+    cache.store(search_key("a", 10, None), b"x" * 10, '"a"', ["items"])
+    cache.store(search_key("b", 10, None), b"x" * 10, '"b"', ["items"])
+    assert cache.get(search_key("a", 10, None)) is not None
+    cache.store(search_key("c", 10, None), b"x" * 10, '"c"', ["orders"])
+
+    assert cache.get(search_key("b", 10, None)) is None
+    assert cache.get(search_key("A", 10, "")) is not None
+    assert cache.store(search_key("d", 10, None), b"x" * 100, '"d"', ["items"]) is None
+    assert cache.invalidate("orders") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl():
+    now = [0.0]
+    cache = SearchCache(ttl=5, max_entries=8, max_bytes=1024, clock=lambda: now[0])
+    key = search_key("dress", 10, None)
+    cache.store(key, b"{}", '"e"', ["items"])
+    now[0] = 5.0
+    assert cache.get(key) is None
+    assert len(cache) == 0
+
+
+def test_upstreams_receive_the_normalized_query(client, respx_mock):
+    items, orders = _mock_sources(respx_mock)
+
+    client.get("/search?q=%20Silk%20%20Dress")
+
+    assert items.calls.last.request.url.params["q"] == "silk dress"
+    assert orders.calls.last.request.url.params["q"] == "silk dress"
@@ -0,0 +1,71 @@
+import asyncio
+
+import httpx
+
+import deadline
+from http_client import request_with_retry
+from pagination import decode_token
+
+ITEMS_URL = "https://catalog.service.test/catalog/items"
+ORDERS_URL = "https://orders.service.test/orders"
+
+
+async def _slow_orders(request):
+    await asyncio.sleep(0.5)
+    return httpx.Response(200, json={"orders": [{"id": "o-1"}]})
+
+
+def test_search_returns_finished_sources_within_deadline(client, respx_mock):
+    respx_mock.get(ITEMS_URL).mock(
+        return_value=httpx.Response(
+            200, json={"items": [{"id": "i-1"}], "nextPageToken": "i-2"}, headers={"ETag": '"i"'}
+        )
+    )
+    respx_mock.get(ORDERS_URL).mock(side_effect=_slow_orders)
+
+    resp = client.get("/search?q=dress", headers={deadline.DEADLINE_HEADER: "150"})
+
+    body = resp.json()
+    assert resp.status_code == 200
+    assert body["partial"] is True
+    assert body["results"] == [{"source": "catalog", "id": "i-1"}]
+    # The items refill also ran out of time, so that lane cut the page short too.
+    assert body["missingSources"] == [
+        {"source": "items", "reason": "DEADLINE_EXCEEDED"},
+        {"source": "orders", "reason": "DEADLINE_EXCEEDED"},
+    ]
+    assert sorted(decode_token(body["resumeToken"])["only"]) == ["items", "orders"]
+    assert decode_token(body["nextPageToken"])["sources"] == {"items": "i-2"}
+    assert resp.headers["Cache-Control"] == "no-store"
+
+
+def test_resume_token_fetches_only_missing_sources(client, respx_mock):
+    items = respx_mock.get(ITEMS_URL).mock(return_value=httpx.Response(200, json={"items": []}))
+    respx_mock.get(ORDERS_URL).mock(
+        return_value=httpx.Response(500)
+    )
+
+    first = client.get("/search?q=dress").json()
+    assert first["missingSources"] == [{"source": "orders", "reason": "UPSTREAM_500"}]
+
+    respx_mock.get(ORDERS_URL).mock(
+        return_value=httpx.Response(200, json={"orders": [{"id": "o-1"}]})
+    )
+    resumed = client.get(f"/search?q=dress&pageToken={first['resumeToken']}")
+    assert resumed.json()["results"] == [{"source": "order", "id": "o-1"}]
+    assert "partial" not in resumed.json()
+    assert items.call_count == 1
+
+
+def test_retries_never_overrun_the_deadline(respx_mock):
+    route = respx_mock.get(ORDERS_URL).mock(return_value=httpx.Response(503))
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            with deadline.scope(0.1):
+                return await request_with_retry(
+                    client, "GET", ORDERS_URL, retries=3, backoff=0.2
+                )
+
+    assert asyncio.run(run()).status_code == 503
+    assert route.call_count == 1
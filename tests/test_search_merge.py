@@ -0,0 +1,113 @@
+import asyncio
+
+import httpx
+
+from aggregate.merge import KWayMerge, OverflowBuffer, SourceCursor, SourcePage
+from pagination import extract_cursor
+
+PAGES = {
+    "items": [{"id": "i-a", "score": 0.9}, {"id": "i-b", "score": 0.5}, {"id": "i-c", "score": 0.1}],
+    "orders": [{"id": "o-a", "score": 0.8}, {"id": "o-b", "score": 0.7}, {"id": "o-c", "score": 0.2}],
+}
+
+
+def _loader(calls):
+    async def load(name, token, size):
+        calls.append((name, token, size))
+        return SourcePage(rows=PAGES[name][:size], next_token=None)
+
+    return load
+
+
+def _page(merge, cursors):
+    result = asyncio.run(merge.page(cursors))
+    return [row["id"] for _, row in result.rows], result
+
+
+def _fresh():
+    return {"items": SourceCursor(), "orders": SourceCursor()}
+
+
+def test_ranked_merge_resumes_mid_page_from_overflow():
+    calls = []
+    merge = KWayMerge(_loader(calls), size=3, max_fetch_size=10, overflow=OverflowBuffer())
+
+    first, result = _page(merge, _fresh())
+    assert first == ["i-a", "o-a", "o-b"]
+    assert result.cursors["items"].offset == 1 and result.cursors["orders"].offset == 2
+
+    state = {name: SourceCursor.from_dict(c.to_dict()) for name, c in result.cursors.items()}
+    second, result = _page(KWayMerge(_loader(calls), size=3, max_fetch_size=10, overflow=merge.overflow), state)
+    assert second == ["i-b", "o-c", "i-c"]
+    assert len(calls) == 2
+    assert result.upstream_calls == 0
+    assert all(c.exhausted for c in result.cursors.values())
+
+
+def test_cursor_without_overflow_refetches_same_page_and_skips_emitted_rows():
+    calls = []
+    _, result = _page(KWayMerge(_loader(calls), size=3, max_fetch_size=10), _fresh())
+    state = {name: SourceCursor.from_dict(c.to_dict()) for name, c in result.cursors.items()}
+
+    second, _ = _page(KWayMerge(_loader(calls), size=3, max_fetch_size=10), state)
+    assert second == ["i-b", "o-c", "i-c"]
+    assert calls[2:] == [("items", None, 3), ("orders", None, 3)]
+
+
+def test_fetch_size_adapts_to_source_share():
+    merge = KWayMerge(_loader([]), size=10, max_fetch_size=50, overfetch=2.0)
+    assert merge.fetch_size(SourceCursor(), 2) == 10
+    assert merge.fetch_size(SourceCursor(share=0.9), 2) == 18
+    assert merge.fetch_size(SourceCursor(share=0.05), 2) == 10
+
+
+def test_search_pages_through_both_sources_without_dropping_rows(client, respx_mock):
+    respx_mock.get("https://catalog.service.test/catalog/items").mock(
+        return_value=httpx.Response(
+            200, json={"items": [{"id": f"i-{n}"} for n in range(5)]}, headers={"ETag": '"i"'}
+        )
+    )
+    respx_mock.get("https://orders.service.test/orders").mock(
+        return_value=httpx.Response(
+            200, json={"orders": [{"id": f"o-{n}"} for n in range(5)]}, headers={"ETag": '"o"'}
+        )
+    )
+
+    seen = []
+    token = None
+    calls = []
+    for _ in range(3):
+        url = "/search?q=tote&pageSize=4" + (f"&pageToken={token}" if token else "")
+        resp = client.get(url)
+        seen += [row["id"] for row in resp.json()["results"]]
+        calls.append(int(resp.headers["X-Search-Upstream-Calls"]))
+        token = resp.json()["nextPageToken"]
+        if token is None:
+            break
+
+    assert sorted(seen) == sorted([f"i-{n}" for n in range(5)] + [f"o-{n}" for n in range(5)])
+    assert len(seen) == len(set(seen))
+    assert seen[:4] == ["i-0", "o-0", "i-1", "o-1"]
+    assert calls[1:] == [0, 0]
+    assert token is None or not extract_cursor(token)
+
+
+def test_failed_refill_marks_page_partial_and_skips_cache(client, respx_mock):
+    def items(request):
+        if request.url.params.get("pageToken"):
+            return httpx.Response(500)
+        return httpx.Response(200, json={"items": [{"id": "i-0"}], "nextPageToken": "p2"})
+
+    respx_mock.get("https://catalog.service.test/catalog/items").mock(side_effect=items)
+    respx_mock.get("https://orders.service.test/orders").mock(
+        return_value=httpx.Response(200, json={"orders": [{"id": f"o-{n}"} for n in range(5)]})
+    )
+
+    first = client.get("/search?q=tote&pageSize=4")
+    second = client.get("/search?q=tote&pageSize=4")
+
+    body = first.json()
+    assert body["partial"] is True
+    assert body["missingSources"] == [{"source": "items", "reason": "UPSTREAM_500"}]
+    assert first.headers["Cache-Control"] == "no-store"
+    assert second.headers.get("X-Cache") != "HIT"
@@ -0,0 +1,75 @@
+import httpx
+
+import server_timing
+from app import app
+
+
+def _entries(header):
+    return [part.split(";")[0] for part in header.split(", ")]
+
+
+def _mock_order_flow(respx_mock):
+    respx_mock.get("https://users.service.test/users/u-1").mock(
+        return_value=httpx.Response(200, json={"id": "u-1"})
+    )
+    respx_mock.get("https://catalog.service.test/catalog/items/i-1").mock(
+        return_value=httpx.Response(200, json={"id": "i-1", "sku": "SKU-1"})
+    )
+    respx_mock.get("https://catalog.service.test/availability").mock(
+        return_value=httpx.Response(200, json={"available": True})
+    )
+    respx_mock.post("https://orders.service.test/orders").mock(
+        return_value=httpx.Response(201, json={"id": "o-1"})
+    )
+
+
+def test_header_only_when_requested(client, respx_mock):
+    _mock_order_flow(respx_mock)
+
+    plain = client.post("/orders", json={"userId": "u-1", "itemId": "i-1"})
+    timed = client.post(
+        "/orders", json={"userId": "u-1", "itemId": "i-1"}, headers={"X-Server-Timing": "1"}
+    )
+
+    assert "server-timing" not in plain.headers
+    entries = _entries(timed.headers["Server-Timing"])
+    # FK lookups run on fan-out threads and still report into the request's collector.
+    for name in ("users", "catalog", "orders", "step-user", "step-availability", "decode"):
+        assert name in entries
+    assert entries[-2:] == ["serialize", "total"]
+    assert 'users;dur=' in timed.headers["Server-Timing"]
+    assert 'desc="GET #0 200"' in timed.headers["Server-Timing"]
+
+
+def test_setting_enables_timing_for_every_request(client, respx_mock, monkeypatch):
+    monkeypatch.setattr(app.state.settings, "server_timing_enabled", True)
+
+    resp = client.get("/healthz")
+
+    assert _entries(resp.headers["Server-Timing"]) == ["serialize", "total"]
+
+
+def test_trace_hook_splits_connect_tls_and_ttfb():
+    collector = server_timing.TimingCollector()
+    token = server_timing._collector.set(collector)
+    try:
+        trace = server_timing.UpstreamTrace("catalog")
+        for event in (
+            "connection.connect_tcp.started",
+            "connection.connect_tcp.complete",
+            "connection.start_tls.started",
+            "connection.start_tls.complete",
+            "http11.send_request_headers.started",
+            "http11.send_request_headers.complete",
+            "http11.receive_response_headers.started",
+            "http11.receive_response_headers.complete",
+        ):
+            trace(event, {})
+    finally:
+        server_timing._collector.reset(token)
+
+    assert [name for name, _, _ in collector.entries] == [
+        "catalog-connect",
+        "catalog-tls",
+        "catalog-ttfb",
+    ]
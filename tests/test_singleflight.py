@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+
+import deadline
+from http_client import request_with_retry
+from singleflight import SingleFlight, request_key
+
+ITEM_URL = "https://catalog.service.test/catalog/items/i-hot"
+
+
+def _slow_item(calls):
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"id": "i-hot"})
+
+    return handler
+
+
+def test_concurrent_gets_share_one_upstream_call(respx_mock):
+    calls = []
+    respx_mock.get(ITEM_URL).mock(side_effect=_slow_item(calls))
+    group = SingleFlight()
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            return await asyncio.gather(
+                *(
+                    request_with_retry(client, "GET", ITEM_URL, retries=0, singleflight=group)
+                    for _ in range(10)
+                )
+            )
+
+    responses = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r.json() == {"id": "i-hot"} for r in responses)
+    assert group.stats() == {"leaders": 1, "coalesced": 9, "inflight": 0}
+
+
+def test_leader_cancellation_does_not_fail_followers(respx_mock):
+    calls = []
+    respx_mock.get(ITEM_URL).mock(side_effect=_slow_item(calls))
+    group = SingleFlight()
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            leader = asyncio.ensure_future(
+                request_with_retry(client, "GET", ITEM_URL, retries=0, singleflight=group)
+            )
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(
+                request_with_retry(client, "GET", ITEM_URL, retries=0, singleflight=group)
+            )
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return leader, await follower
+
+    leader, follower = asyncio.run(run())
+    assert leader.cancelled()
+    assert follower.status_code == 200
+    assert len(calls) == 1
+
+
+def test_follower_does_not_inherit_the_leader_deadline(respx_mock):
+    calls = []
+    respx_mock.get(ITEM_URL).mock(side_effect=_slow_item(calls))
+    group = SingleFlight()
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+
+            async def leader():
+                with deadline.scope(0.02):
+                    return await request_with_retry(
+                        client, "GET", ITEM_URL, retries=0, singleflight=group
+                    )
+
+            leading = asyncio.ensure_future(leader())
+            await asyncio.sleep(0)
+            follower = request_with_retry(client, "GET", ITEM_URL, retries=0, singleflight=group)
+            return await asyncio.gather(leading, follower, return_exceptions=True)
+
+    leader, follower = asyncio.run(run())
+    assert isinstance(leader, Exception)
+    assert follower.status_code == 200
+    assert len(calls) == 1
+
+
+def test_key_separates_validators_and_folds_params():
+    assert request_key("GET", ITEM_URL, headers={"If-None-Match": '"a"'}) != request_key(
+        "GET", ITEM_URL, headers={"If-None-Match": '"b"'}
+    )
+    assert request_key("GET", ITEM_URL, params={"q": "x"}) == request_key(
+        "GET", ITEM_URL + "?q=x"
+    )
@@ -0,0 +1,37 @@
+import httpx
+
+
+def test_trace_id_is_echoed_and_forwarded_upstream(client, respx_mock):
+    route = respx_mock.get("https://users.service.test/users/u-1").mock(
+        return_value=httpx.Response(200, json={"id": "u-1"})
+    )
+
+    resp = client.get("/users/u-1", headers={"X-Trace-Id": "trace-abc"})
+
+    assert resp.status_code == 200
+    assert resp.headers["X-Trace-Id"] == "trace-abc"
+    assert route.calls.last.request.headers["X-Trace-Id"] == "trace-abc"
+
+
+def test_trace_id_is_minted_when_missing(client, respx_mock):
+    route = respx_mock.get("https://users.service.test/users/u-1").mock(
+        return_value=httpx.Response(200, json={"id": "u-1"})
+    )
+
+    first = client.get("/users/u-1")
+    second = client.get("/users/u-1")
+
+    assert first.headers["X-Trace-Id"] != second.headers["X-Trace-Id"]
+    assert route.calls.last.request.headers["X-Trace-Id"] == second.headers["X-Trace-Id"]
+
+
+def test_error_envelope_carries_trace_id(client, respx_mock):
+    respx_mock.get("https://users.service.test/users/u-404").mock(
+        return_value=httpx.Response(404)
+    )
+
+    resp = client.get("/users/u-404", headers={"X-Trace-Id": "trace-404"})
+
+    assert resp.status_code == 404
+    assert resp.json()["detail"]["code"] == "USER_NOT_FOUND"
+    assert resp.json()["detail"]["traceId"] == "trace-404"
@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import app
+from warmup import UpstreamWarmer
+
+UPSTREAMS = {
+    "users": "https://users.service.test",
+    "catalog": "https://catalog.service.test",
+    "orders": "https://orders.service.test",
+}
+
+
+def _warmer(**kwargs):
+    return UpstreamWarmer(
+        UPSTREAMS,
+        {"async": httpx.AsyncClient(), "fanout": httpx.Client()},
+        connections=3,
+        probe_path="/healthz",
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def use_warmer():
+    previous = getattr(app.state, "warmer", None)
+    yield lambda warmer: setattr(app.state, "warmer", warmer)
+    app.state.warmer = previous
+
+
+def test_warm_round_probes_every_pool_and_host(respx_mock):
+    routes = {
+        name: respx_mock.get(f"{base}/healthz").mock(return_value=httpx.Response(200))
+        for name, base in UPSTREAMS.items()
+    }
+    warmer = _warmer()
+
+    assert not warmer.is_ready()
+    asyncio.run(warmer.warm())
+
+    assert warmer.is_ready()
+    for route in routes.values():
+        # Concurrent probes so each of the two pools opens three connections.
+        assert route.call_count == 6
+    report = warmer.report()
+    assert report["upstreams"]["users"]["async"]["connections"] == 3
+    assert report["upstreams"]["users"]["fanout"]["ok"] is True
+
+
+def test_readyz_serves_cached_probe_results(client, respx_mock, use_warmer):
+    respx_mock.get("https://users.service.test/healthz").mock(return_value=httpx.Response(404))
+    respx_mock.get("https://catalog.service.test/healthz").mock(return_value=httpx.Response(200))
+    orders = respx_mock.get("https://orders.service.test/healthz").mock(
+        return_value=httpx.Response(503)
+    )
+    warmer = _warmer()
+    asyncio.run(warmer.warm())
+    use_warmer(warmer)
+    calls = orders.call_count
+
+    resp = client.get("/readyz")
+
+    assert resp.status_code == 503
+    body = resp.json()
+    assert body["ready"] is False
+    # A 404 still proves the host answers; a 5xx does not.
+    assert body["upstreams"]["users"]["async"]["ok"] is True
+    assert body["upstreams"]["orders"]["async"]["ok"] is False
+    assert body["upstreams"]["orders"]["async"]["status"] == 503
+    assert orders.call_count == calls
+
+    orders.mock(return_value=httpx.Response(200))
+    asyncio.run(warmer.warm())
+    assert client.get("/readyz").status_code == 200
+
+
+def test_stale_results_are_not_ready(respx_mock):
+    respx_mock.get(url__regex=r"https://\w+\.service\.test/healthz").mock(
+        return_value=httpx.Response(200)
+    )
+    warmer = _warmer(max_age=0)
+
+    asyncio.run(warmer.warm())
+
+    assert not warmer.is_ready()
+
+
+def test_readyz_without_warmer(client, use_warmer):
+    use_warmer(None)
+
+    assert client.get("/readyz").json() == {"ready": True}
@@ -0,0 +1,66 @@
+"""Request trace ids.
+
+``TraceMiddleware`` takes ``X-Trace-Id`` from the request (or mints one),
+keeps it in a contextvar for the duration of the request and echoes it on the
+response. ``request_with_retry`` forwards it on every upstream call and
+``http_error`` stamps it into ``ErrorEnvelope.traceId``.
+"""
+import uuid
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+TRACE_HEADER = "X-Trace-Id"
+_TRACE_HEADER_KEY = b"x-trace-id"
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("composite_trace_id", default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def with_trace_header(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """``kwargs`` for an httpx call with the current trace id added to its headers."""
+    trace_id = _trace_id.get()
+    if trace_id is None:
+        return kwargs
+    headers = httpx.Headers(kwargs.get("headers"))
+    if TRACE_HEADER in headers:
+        return kwargs
+    headers[TRACE_HEADER] = trace_id
+    return {**kwargs, "headers": headers}
+
+
+class TraceMiddleware:
+    def __init__(self, app: Callable) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = None
+        for name, value in scope.get("headers", ()):
+            if name == _TRACE_HEADER_KEY:
+                trace_id = value.decode("latin-1")
+                break
+        if not trace_id:
+            trace_id = str(uuid.uuid4())
+        encoded = trace_id.encode("latin-1")
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", ()), (_TRACE_HEADER_KEY, encoded)],
+                }
+            await send(message)
+
+        token = _trace_id.set(trace_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _trace_id.reset(token)
@@ -0,0 +1,170 @@
+"""Upstream connection pre-warming and cached readiness.
+
+On startup ``UpstreamWarmer`` sends ``connections`` concurrent probes to every
+upstream host through each shared pool, so the pools already hold that many
+keep-alive connections (DNS, TCP and TLS paid) before traffic arrives. A
+background loop repeats the round every ``interval`` seconds, which keeps the
+connections from hitting the keep-alive expiry and refreshes the probe
+results. ``/readyz`` only reads those cached results and never calls an
+upstream itself.
+
+A probe counts as healthy when the upstream answers with anything below 500:
+a 404 on the probe path still proves the host is reachable and serving.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+import httpx
+
+from config import Settings
+
+logger = logging.getLogger(__name__)
+
+Pool = Union[httpx.AsyncClient, httpx.Client]
+
+
+@dataclass
+class ProbeResult:
+    ok: bool
+    status: Optional[int]
+    latency_ms: int
+    connections: int
+    checked_at: float
+    error: Optional[str] = None
+
+    def as_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "ok": self.ok,
+            "status": self.status,
+            "latencyMs": self.latency_ms,
+            "connections": self.connections,
+            "ageSeconds": round(now - self.checked_at, 3),
+            "error": self.error,
+        }
+
+
+class UpstreamWarmer:
+    def __init__(
+        self,
+        upstreams: Dict[str, str],
+        pools: Dict[str, Pool],
+        *,
+        connections: int = 4,
+        interval: float = 4.0,
+        probe_path: str = "/",
+        probe_timeout: float = 2.0,
+        max_age: float = 15.0,
+    ) -> None:
+        self.upstreams = upstreams
+        self.pools = {name: pool for name, pool in pools.items() if pool is not None}
+        self.connections = max(1, connections)
+        self.interval = interval
+        self.probe_path = probe_path
+        self.probe_timeout = probe_timeout
+        self.max_age = max_age
+        self.results: Dict[str, Dict[str, ProbeResult]] = {}
+        self.rounds = 0
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings, pools: Dict[str, Optional[Pool]]) -> "UpstreamWarmer":
+        return cls(
+            {
+                "users": settings.user_svc_base,
+                "catalog": settings.catalog_svc_base,
+                "orders": settings.order_svc_base,
+            },
+            pools,
+            connections=settings.warmup_connections,
+            interval=settings.warmup_interval_seconds,
+            probe_path=settings.warmup_probe_path,
+            probe_timeout=settings.warmup_probe_timeout_seconds,
+            max_age=settings.readiness_max_age_seconds,
+        )
+
+    def is_ready(self) -> bool:
+        now = time.monotonic()
+        for upstream in self.upstreams:
+            pools = self.results.get(upstream)
+            if not pools or len(pools) < len(self.pools):
+                return False
+            for result in pools.values():
+                if not result.ok or now - result.checked_at > self.max_age:
+                    return False
+        return True
+
+    def report(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "ready": self.is_ready(),
+            "rounds": self.rounds,
+            "upstreams": {
+                upstream: {
+                    pool: result.as_dict(now)
+                    for pool, result in sorted(self.results.get(upstream, {}).items())
+                }
+                for upstream in self.upstreams
+            },
+        }
+
+    async def warm(self) -> None:
+        """One round: ``connections`` concurrent probes per upstream and pool."""
+        await asyncio.gather(
+            *(
+                self._warm(upstream, base_url, name, pool)
+                for upstream, base_url in self.upstreams.items()
+                for name, pool in self.pools.items()
+            )
+        )
+        self.rounds += 1
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.warm()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("upstream warm-up round failed: %r", exc)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _warm(self, upstream: str, base_url: str, name: str, pool: Pool) -> None:
+        url = f"{base_url.rstrip('/')}{self.probe_path}"
+        started = time.perf_counter()
+        outcomes: List[Any] = await asyncio.gather(
+            *(self._probe(pool, url) for _ in range(self.connections)),
+            return_exceptions=True,
+        )
+        responses = [o for o in outcomes if isinstance(o, httpx.Response)]
+        errors = [o for o in outcomes if not isinstance(o, httpx.Response)]
+        healthy = [r for r in responses if r.status_code < 500]
+        status = responses[0].status_code if responses else None
+        self.results.setdefault(upstream, {})[name] = ProbeResult(
+            ok=bool(healthy),
+            status=status,
+            latency_ms=int((time.perf_counter() - started) * 1000),
+            connections=len(responses),
+            checked_at=time.monotonic(),
+            error=repr(errors[0]) if errors and not healthy else None,
+        )
+
+    async def _probe(self, pool: Pool, url: str) -> httpx.Response:
+        if isinstance(pool, httpx.AsyncClient):
+            return await pool.get(url, timeout=self.probe_timeout)
+        return await asyncio.to_thread(pool.get, url, timeout=self.probe_timeout)